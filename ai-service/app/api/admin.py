@@ -0,0 +1,63 @@
+"""Administrative endpoints for index maintenance"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional
+from pydantic import BaseModel
+from app.core.vector_index import vector_index, INDEX_TYPES
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+class RebuildIndexRequest(BaseModel):
+    index_type: Optional[str] = None
+    m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    lists: Optional[int] = None
+
+
+@router.get("/vector-index")
+async def get_vector_index():
+    """
+    Get the live vector index configuration and last build result
+    """
+    return vector_index.get_status()
+
+
+@router.post("/vector-index/rebuild", status_code=202)
+async def rebuild_vector_index(request: RebuildIndexRequest):
+    """
+    Rebuild the vector index concurrently (writes are not blocked)
+    
+    Unset parameters are sized from the current row count. Invalid
+    parameters are rejected with 422 before the build starts.
+    """
+    index_type = (request.index_type or '').lower() or None
+    if index_type is not None and index_type not in INDEX_TYPES:
+        raise HTTPException(status_code=400, detail=f"index_type must be one of {', '.join(INDEX_TYPES)}")
+    
+    build_params = {
+        key: value
+        for key, value in {
+            'm': request.m,
+            'ef_construction': request.ef_construction,
+            'lists': request.lists
+        }.items()
+        if value is not None
+    } or None
+    
+    try:
+        plan = await vector_index.plan_build(index_type, build_params)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if not vector_index.start_rebuild(index_type, build_params):
+        return JSONResponse(
+            status_code=409,
+            content={'detail': 'A vector index build is already running', **vector_index.get_status()}
+        )
+    
+    logger.info(f"Vector index rebuild started (type={plan['index_type']}, params={plan['params']})")
+    return vector_index.get_status()
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, List, AsyncIterator
 from pydantic import BaseModel
-from app.core.vector_store import search_similar
-from app.core.llm import query_ollama_with_context, generate_summary, generate_quiz_questions
+from app.core.config import settings
+from app.core.vector_store import search_similar, embed_query
+from app.core.answer_cache import answer_cache
+from app.core.llm_scheduler import LLMOverloadedError, llm_scheduler
+from app.core.single_flight import chat_single_flight, chat_flight_key
+from app.core.llm import (
+    query_ollama_with_context,
+    stream_ollama_with_context,
+    generate_quiz_questions
+)
+from app.core.summarizer import summarizer
+from app.core.file_artifacts import file_artifacts
+from app.core.quiz_batch import stream_course_quiz
 import logging
+import json
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the course materials to answer your question."
+
 
 class ChatRequest(BaseModel):
     query: str
@@ -18,16 +34,21 @@ class ChatRequest(BaseModel):
     file_ids: Optional[List[int]] = None
     limit: int = 5
     temperature: float = 0.7
+    retrieval_mode: Optional[str] = None  # vector or hybrid (default from settings)
 
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[dict]
     context_used: int
+    context_stats: Optional[dict] = None  # Token budget / tokens saved by context packing
+    cached: bool = False  # Served from the semantic answer cache
 
 
 class SummaryRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    file_id: Optional[int] = None  # Use the summary stored at ingest instead of `text`
+    user_id: Optional[int] = None
 
 
 class SummaryResponse(BaseModel):
@@ -35,58 +56,268 @@ class SummaryResponse(BaseModel):
 
 
 class QuizRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    file_id: Optional[int] = None  # Generate from the stored file summary instead of `text`
     num_questions: int = 5
+    user_id: Optional[int] = None
 
 
 class QuizResponse(BaseModel):
     questions: List[dict]
 
 
+class FileSearchRequest(BaseModel):
+    query: str
+    user_id: Optional[int] = None
+    course_id: Optional[int] = None
+    module_id: Optional[int] = None
+    limit: int = 5
+
+
+class FileSearchResponse(BaseModel):
+    files: List[dict]
+
+
+class CourseQuizRequest(BaseModel):
+    course_id: int
+    num_questions: int = 5  # Per module
+    user_id: Optional[int] = None
+
+
+def _overloaded(e: LLMOverloadedError) -> HTTPException:
+    """Map an LLM admission rejection to a 429/503 response"""
+    logger.warning(f"LLM request rejected: {str(e)}")
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={'Retry-After': str(e.retry_after)}
+    )
+
+
+def _answer_scope(request: ChatRequest) -> dict:
+    """Retrieval scope a cached answer is valid for"""
+    return {
+        'user_id': request.user_id,
+        'course_id': request.course_id,
+        'module_id': request.module_id,
+        'file_ids': set(request.file_ids) if request.file_ids else None,
+        'mode': (request.retrieval_mode or settings.RETRIEVAL_MODE).lower(),
+        'limit': request.limit
+    }
+
+
+async def _answer_query(request: ChatRequest) -> dict:
+    """Retrieve context and generate an answer for a chat request"""
+    # Paraphrases of an answered question in the same scope reuse its answer
+    query_embedding = await embed_query(request.query)
+    scope = _answer_scope(request)
+    cached = await answer_cache.get(query_embedding, scope)
+    if cached is not None:
+        return cached
+    corpus_version = await answer_cache.clock()
+    
+    # Search for similar content
+    context_chunks = await search_similar(
+        query=request.query,
+        limit=request.limit,
+        user_id=request.user_id,
+        course_id=request.course_id,
+        module_id=request.module_id,
+        file_ids=request.file_ids,
+        mode=request.retrieval_mode
+    )
+    
+    if not context_chunks:
+        return {
+            'answer': NO_CONTEXT_ANSWER,
+            'sources': [],
+            'context_used': 0
+        }
+    
+    # Generate answer with context
+    result = await query_ollama_with_context(
+        query=request.query,
+        context_chunks=context_chunks,
+        temperature=request.temperature,
+        user_id=request.user_id
+    )
+    answer_cache.put(query_embedding, scope, result, corpus_version)
+    return result
+
+
 @router.post("/query", response_model=ChatResponse)
 async def chat_query(request: ChatRequest):
     """
     Process a chat query with RAG (Retrieval-Augmented Generation)
+    
+    Identical concurrent queries (same normalized text, scope and options)
+    share one retrieval and one generation.
     """
     try:
-        # Search for similar content
-        context_chunks = await search_similar(
-            query=request.query,
+        if not settings.CHAT_COALESCING_ENABLED:
+            return ChatResponse(**await _answer_query(request))
+        
+        key = chat_flight_key(
+            request.query,
+            request.user_id,
+            request.course_id,
+            request.module_id,
+            request.file_ids,
             limit=request.limit,
-            user_id=request.user_id,
-            course_id=request.course_id,
-            module_id=request.module_id,
-            file_ids=request.file_ids
+            temperature=request.temperature,
+            retrieval_mode=request.retrieval_mode
         )
+        result = await chat_single_flight.do(key, lambda: _answer_query(request))
+        return ChatResponse(**result)
+    except LLMOverloadedError as e:
+        raise _overloaded(e)
+    except Exception as e:
+        logger.error(f"Error processing chat query: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/query/stream")
+async def chat_query_stream(request: ChatRequest, http_request: Request):
+    """
+    Process a chat query with RAG, streaming the answer as Server-Sent Events
+    
+    Events: `sources` (sent first), `token` (one per generated fragment),
+    `done`, or `error`. Generation is cancelled if the client disconnects.
+    An overloaded LLM is reported as 429/503 before the stream starts.
+    """
+    try:
+        query_embedding = await embed_query(request.query)
+        scope = _answer_scope(request)
+        cached = await answer_cache.get(query_embedding, scope)
         
-        if not context_chunks:
-            return ChatResponse(
-                answer="I couldn't find any relevant information in the course materials to answer your question.",
-                sources=[],
-                context_used=0
+        context_chunks = None
+        corpus_version = None
+        if cached is None:
+            corpus_version = await answer_cache.clock()
+            context_chunks = await search_similar(
+                query=request.query,
+                limit=request.limit,
+                user_id=request.user_id,
+                course_id=request.course_id,
+                module_id=request.module_id,
+                file_ids=request.file_ids,
+                mode=request.retrieval_mode
             )
+    except Exception as e:
+        logger.error(f"Error retrieving context for streaming query: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Admission happens before the 200 is sent, so an overloaded LLM is a plain 429/503
+    held = cached is None and bool(context_chunks)
+    if held:
+        try:
+            await llm_scheduler.acquire('chat', request.user_id)
+        except LLMOverloadedError as e:
+            raise _overloaded(e)
+    
+    async def release_slot() -> None:
+        # Called from the stream and again as a background task, in case the stream never started
+        nonlocal held
+        if held:
+            held = False
+            llm_scheduler.release()
+    
+    async def event_stream() -> AsyncIterator[str]:
+        if cached is not None:
+            yield format_sse('sources', {
+                'sources': cached['sources'],
+                'context_used': cached['context_used'],
+                'cached': True
+            })
+            yield format_sse('token', {'text': cached['answer']})
+            yield format_sse('done', {'tokens': 1, 'cached': True})
+            return
         
-        # Generate answer with context
-        result = await query_ollama_with_context(
+        if not context_chunks:
+            yield format_sse('sources', {'sources': [], 'context_used': 0})
+            yield format_sse('token', {'text': NO_CONTEXT_ANSWER})
+            yield format_sse('done', {'tokens': 1})
+            return
+        
+        events = stream_ollama_with_context(
             query=request.query,
             context_chunks=context_chunks,
-            temperature=request.temperature
+            temperature=request.temperature,
+            user_id=request.user_id,
+            slot_held=True
         )
-        
-        return ChatResponse(**result)
-    except Exception as e:
-        logger.error(f"Error processing chat query: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        result = {}
+        answer = []
+        try:
+            async for event in events:
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected, cancelling generation")
+                    break
+                name = event.pop('event')
+                if name == 'sources':
+                    result = dict(event)
+                elif name == 'token':
+                    answer.append(event['text'])
+                elif name == 'done':
+                    # Only complete answers are cached
+                    answer_cache.put(
+                        query_embedding, scope, dict(result, answer=''.join(answer)), corpus_version
+                    )
+                yield format_sse(name, event)
+        except Exception as e:
+            logger.error(f"Error streaming chat query: {str(e)}")
+            yield format_sse('error', {'detail': str(e)})
+        finally:
+            # Closes the Ollama stream so an abandoned generation stops
+            await events.aclose()
+            await release_slot()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        },
+        background=BackgroundTask(release_slot)
+    )
+
+
+async def _stored_artifacts(file_id: int) -> dict:
+    """Load precomputed artifacts for a file or fail with 404"""
+    artifacts = await file_artifacts.get(file_id)
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail=f"No stored summary for file_id={file_id}")
+    return artifacts
 
 
 @router.post("/summary", response_model=SummaryResponse)
 async def create_summary(request: SummaryRequest):
     """
-    Generate a summary of the provided text
+    Generate a summary of the provided text, or return the stored summary of a file
+    
+    Long text is summarized map-reduce: sections are summarized concurrently
+    and the partial summaries combined.
     """
+    if request.file_id is None and not request.text:
+        raise HTTPException(status_code=400, detail="Either text or file_id is required")
+    
     try:
-        summary = await generate_summary(request.text)
+        if request.file_id is not None:
+            artifacts = await _stored_artifacts(request.file_id)
+            return SummaryResponse(summary=artifacts['summary'])
+        
+        summary = await summarizer.summarize(request.text, user_id=request.user_id)
         return SummaryResponse(summary=summary)
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -95,19 +326,105 @@ async def create_summary(request: SummaryRequest):
 @router.post("/quiz", response_model=QuizResponse)
 async def create_quiz(request: QuizRequest):
     """
-    Generate quiz questions from the provided text
+    Generate quiz questions from the provided text or a file's stored summary
+    
+    Questions generated for a file are stored and reused until its content changes.
     """
+    if request.file_id is None and not request.text:
+        raise HTTPException(status_code=400, detail="Either text or file_id is required")
+    
     try:
+        if request.file_id is not None:
+            artifacts = await _stored_artifacts(request.file_id)
+            stored = artifacts['quiz'] or []
+            if len(stored) >= request.num_questions:
+                return QuizResponse(questions=stored[:request.num_questions])
+            
+            questions = await generate_quiz_questions(
+                text=artifacts['summary'],
+                num_questions=request.num_questions,
+                user_id=request.user_id
+            )
+            if questions:
+                await file_artifacts.store_quiz(request.file_id, artifacts['content_hash'], questions)
+            return QuizResponse(questions=questions)
+        
         questions = await generate_quiz_questions(
             text=request.text,
-            num_questions=request.num_questions
+            num_questions=request.num_questions,
+            user_id=request.user_id
         )
         return QuizResponse(questions=questions)
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"Error generating quiz: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/files", response_model=FileSearchResponse)
+async def search_files(request: FileSearchRequest):
+    """
+    Find the files most relevant to a query, with their stored summaries
+    
+    Files are ranked by the digest embedding (the embedding of the file
+    summary) built at ingest; files without stored artifacts are not listed.
+    """
+    try:
+        query_embedding = await embed_query(request.query)
+        files = await file_artifacts.search(
+            query_embedding,
+            limit=request.limit,
+            user_id=request.user_id,
+            course_id=request.course_id,
+            module_id=request.module_id
+        )
+        return FileSearchResponse(files=files)
+    except Exception as e:
+        logger.error(f"Error searching files: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/quiz/batch")
+async def create_course_quiz(request: CourseQuizRequest, http_request: Request):
+    """
+    Generate quiz questions for every module of a course, streamed as Server-Sent Events
+    
+    Modules are generated in parallel at batch priority; near-duplicate
+    questions across modules are dropped. Events: `question` (one per
+    question), `module_done` / `module_error` (one per module), `done`.
+    """
+    async def event_stream() -> AsyncIterator[str]:
+        events = stream_course_quiz(
+            request.course_id,
+            num_questions=request.num_questions,
+            user_id=request.user_id
+        )
+        try:
+            async for event in events:
+                if await http_request.is_disconnected():
+                    logger.info("Client disconnected, cancelling quiz generation")
+                    break
+                name = event.pop('event')
+                yield format_sse(name, event)
+        except Exception as e:
+            logger.error(f"Error generating course quiz: {str(e)}")
+            yield format_sse('error', {'detail': str(e)})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @router.get("/health")
 async def chat_health():
     """Health check for chat service"""
@@ -2,7 +2,7 @@
 import logging
 import os
 import tempfile
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -12,19 +12,22 @@ from minio import Minio
 from minio.error import S3Error
 
 from app.core.config import settings
-from app.core.embeddings import chunk_text
-from app.core.vector_store import store_embeddings
+from app.core.vector_store import delete_embeddings_by_file
+from app.core.ingest_pipeline import ingest_segments
+from app.core.file_artifacts import file_artifacts
+from app.core.job_queue import job_queue, Job, PermanentJobError
+from app.core.executors import run_io
+from app.core.http_client import http_client
 from app.processors import (
-    extract_text_from_pdf,
-    extract_text_from_docx,
-    extract_text_from_pptx,
-    extract_text_from_txt,
-    extract_text_from_xlsx,
-    process_video,
-    transcribe_audio,
-    extract_text_from_image,
+    stream_text_from_pdf,
+    stream_text_from_docx,
+    stream_text_from_pptx,
+    stream_text_from_txt,
+    stream_text_from_xlsx,
+    stream_video,
+    stream_audio,
+    stream_text_from_image,
 )
-import aiohttp
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,21 @@ router = APIRouter(prefix="/api/ai", tags=["files"])
 # Allowed callback URL domains for SSRF protection
 ALLOWED_CALLBACK_DOMAINS = ["localhost", "127.0.0.1", "backend"]
 
+PROCESS_FILE_JOB = "process_file"
+
+# Worker lane per file type; everything else runs in the 'text' lane
+FILE_TYPE_LANES = {
+    **{file_type: "ocr" for file_type in ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'gif']},
+    **{file_type: "media" for file_type in ['mp4', 'avi', 'mov', 'mkv', 'webm', 'mp3', 'wav', 'm4a', 'flac', 'ogg']}
+}
+
+# Job status -> file status reported to the backend callback
+JOB_FILE_STATUSES = {
+    "running": "processing",
+    "completed": "completed",
+    "failed": "failed"
+}
+
 
 # Request/Response models
 class ProcessFileRequest(BaseModel):
@@ -50,8 +68,9 @@ class ProcessFileResponse(BaseModel):
     success: bool
     message: str
     file_id: int
-    chunks_processed: int
-    embeddings_created: int
+    job_id: int
+    status: str
+    status_url: str
 
 
 # MinIO client
@@ -75,7 +94,7 @@ async def download_file_from_minio(minio_path: str, local_path: str) -> None:
     """
     try:
         client = get_minio_client()
-        client.fget_object(settings.MINIO_BUCKET, minio_path, local_path)
+        await run_io(client.fget_object, settings.MINIO_BUCKET, minio_path, local_path)
         logger.info(f"Downloaded file from MinIO: {minio_path} -> {local_path}")
     except S3Error as e:
         logger.error(f"MinIO error downloading file: {str(e)}")
@@ -104,22 +123,21 @@ async def update_file_status(callback_url: str, file_id: int, status: str, error
             logger.warning(f"Rejected callback to untrusted domain: {hostname}")
             return
         
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                "file_id": file_id,
-                "status": status,
-                "error": error
-            }
-            async with session.post(callback_url, json=payload, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                if response.status == 200:
-                    logger.info(f"Successfully updated file status for file_id={file_id}")
-                else:
-                    logger.warning(f"Failed to update file status: {response.status}")
+        payload = {
+            "file_id": file_id,
+            "status": status,
+            "error": error
+        }
+        async with http_client.post(callback_url, json=payload, timeout=10) as response:
+            if response.status == 200:
+                logger.info(f"Successfully updated file status for file_id={file_id}")
+            else:
+                logger.warning(f"Failed to update file status: {response.status}")
     except Exception as e:
         logger.error(f"Error sending callback to {callback_url}: {str(e)}")
 
 
-async def process_file_content(file_path: str, file_type: str) -> list:
+def stream_file_content(file_path: str, file_type: str) -> AsyncIterator[Dict[str, Any]]:
     """
     Route file to appropriate processor based on file type
     
@@ -128,50 +146,56 @@ async def process_file_content(file_path: str, file_type: str) -> list:
         file_type: File extension/type
         
     Returns:
-        List of extracted content dicts
+        Async iterator of extracted content dicts
     """
     file_type = file_type.lower().lstrip('.')
     
     # Document processors
     if file_type == 'pdf':
-        return await extract_text_from_pdf(file_path)
+        return stream_text_from_pdf(file_path)
     elif file_type in ['doc', 'docx']:
-        return await extract_text_from_docx(file_path)
+        return stream_text_from_docx(file_path)
     elif file_type in ['ppt', 'pptx']:
-        return await extract_text_from_pptx(file_path)
+        return stream_text_from_pptx(file_path)
     elif file_type == 'txt':
-        return await extract_text_from_txt(file_path)
+        return stream_text_from_txt(file_path)
     elif file_type in ['xls', 'xlsx']:
-        return await extract_text_from_xlsx(file_path)
+        return stream_text_from_xlsx(file_path)
     
     # Video processors
     elif file_type in ['mp4', 'avi', 'mov', 'mkv', 'webm']:
-        return await process_video(file_path)
+        return stream_video(file_path)
     
     # Audio processors
     elif file_type in ['mp3', 'wav', 'm4a', 'flac', 'ogg']:
-        return await transcribe_audio(file_path)
+        return stream_audio(file_path)
     
     # Image processors
     elif file_type in ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'gif']:
-        return await extract_text_from_image(file_path)
+        return stream_text_from_image(file_path)
     
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_type}")
 
 
-@router.post("/process-file", response_model=ProcessFileResponse)
-async def process_file(request: ProcessFileRequest):
+def file_lane(file_type: str) -> str:
+    """Worker lane for a file type (text, ocr or media)"""
+    return FILE_TYPE_LANES.get(file_type.lower().lstrip('.'), "text")
+
+
+async def run_process_file_job(job: Job) -> dict:
     """
-    Process uploaded file: download from MinIO, extract text, generate embeddings
+    Job handler: download from MinIO, then extract, chunk, embed and store
+    as a streaming pipeline
     
     Args:
-        request: File processing request
+        job: Claimed process_file job; its payload is a ProcessFileRequest
         
     Returns:
-        Processing result with success status and metrics
+        Processing metrics, stored as the job result
     """
-    logger.info(f"Processing file request: file_id={request.file_id}, type={request.file_type}")
+    request = ProcessFileRequest(**job.payload)
+    logger.info(f"Processing file job {job.id}: file_id={request.file_id}, type={request.file_type}")
     
     temp_file_path = None
     
@@ -181,78 +205,60 @@ async def process_file(request: ProcessFileRequest):
             temp_file_path = tmp_file.name
         
         # Download file from MinIO
+        await job.report(0.05, "downloading")
         await download_file_from_minio(request.minio_path, temp_file_path)
         
-        # Update status to processing
-        if request.callback_url:
-            await update_file_status(request.callback_url, request.file_id, "processing")
-        
-        # Process file content based on type
-        extracted_data = await process_file_content(temp_file_path, request.file_type)
-        
-        if not extracted_data:
-            raise HTTPException(status_code=400, detail="No content extracted from file")
-        
-        # Combine all text from extracted data
-        all_text = []
-        for item in extracted_data:
-            text = item.get('text', '')
-            if text:
-                # Add metadata to text for better context
-                metadata_str = ""
-                if 'page_number' in item:
-                    metadata_str = f"[Page {item['page_number']}] "
-                elif 'slide_number' in item:
-                    metadata_str = f"[Slide {item['slide_number']}] "
-                elif 'start_time' in item:
-                    metadata_str = f"[{item['start_time']:.1f}s - {item['end_time']:.1f}s] "
-                
-                all_text.append(metadata_str + text)
+        # A retried job may have stored part of its embeddings already
+        if job.attempts > 1:
+            await delete_embeddings_by_file(request.file_id)
         
-        combined_text = '\n\n'.join(all_text)
+        async def report_progress(segments: int, stored: int, extracted: Optional[float]) -> None:
+            # Ingesting spans 10%-95%; without a position hint, creep up as batches are stored
+            if extracted is None:
+                extracted = stored / (stored + 20 * settings.EMBEDDING_INSERT_BATCH_SIZE)
+            await job.report(0.1 + 0.85 * extracted, f"ingesting: {segments} segments, {stored} chunks stored")
         
-        # Chunk text for embeddings
-        chunks = chunk_text(combined_text)
-        logger.info(f"Created {len(chunks)} chunks from extracted text")
-        
-        # Generate and store embeddings
-        embeddings_count = await store_embeddings(
+        # Extract, chunk, embed and insert with the stages overlapping
+        await job.report(0.1, "extracting")
+        result = await ingest_segments(
+            stream_file_content(temp_file_path, request.file_type),
             file_id=request.file_id,
-            chunks=chunks,
             user_id=request.user_id,
             course_id=request.course_id,
             module_id=request.module_id,
             metadata={
                 'file_name': request.file_name,
-                'file_type': request.file_type,
-                'total_segments': len(extracted_data)
-            }
+                'file_type': request.file_type
+            },
+            on_progress=report_progress
         )
         
-        # Update status to completed
-        if request.callback_url:
-            await update_file_status(request.callback_url, request.file_id, "completed")
+        if not result['segments']:
+            raise HTTPException(status_code=400, detail="No content extracted from file")
         
-        logger.info(f"Successfully processed file_id={request.file_id}: {len(chunks)} chunks, {embeddings_count} embeddings")
+        # Precompute the file summary and digest in a follow-up job from the stored chunks
+        if settings.FILE_ARTIFACTS_ENABLED:
+            await file_artifacts.schedule(
+                request.file_id,
+                user_id=request.user_id,
+                course_id=request.course_id,
+                module_id=request.module_id
+            )
         
-        return ProcessFileResponse(
-            success=True,
-            message="File processed successfully",
-            file_id=request.file_id,
-            chunks_processed=len(chunks),
-            embeddings_created=embeddings_count
-        )
+        logger.info(f"Successfully processed file_id={request.file_id}: {result['chunks']} chunks, {result['embeddings_created']} embeddings")
         
-    except HTTPException:
-        # Re-raise HTTP exceptions
-        if request.callback_url:
-            await update_file_status(request.callback_url, request.file_id, "failed", "Processing failed")
-        raise
-    except Exception as e:
-        logger.error(f"Error processing file {request.file_id}: {str(e)}", exc_info=True)
-        if request.callback_url:
-            await update_file_status(request.callback_url, request.file_id, "failed", str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+        return {
+            'segments': result['segments'],
+            'chunks_processed': result['chunks'],
+            'embeddings_created': result['embeddings_created'],
+            'first_batch_seconds': result['first_batch_seconds']
+        }
+        
+    except HTTPException as e:
+        # Client errors (unsupported type, empty file) will not succeed on retry
+        if e.status_code < 500:
+            raise PermanentJobError(e.detail)
+        raise Exception(e.detail)
     finally:
         # Cleanup temporary file
         if temp_file_path and os.path.exists(temp_file_path):
@@ -263,6 +269,54 @@ async def process_file(request: ProcessFileRequest):
                 logger.warning(f"Failed to cleanup temporary file: {str(e)}")
 
 
+async def notify_file_status(job: Job, status: str, error: Optional[str] = None) -> None:
+    """Report process_file job transitions to the backend callback"""
+    callback_url = job.payload.get('callback_url')
+    if callback_url and status in JOB_FILE_STATUSES:
+        await update_file_status(callback_url, job.file_id, JOB_FILE_STATUSES[status], error)
+
+
+job_queue.register(PROCESS_FILE_JOB, run_process_file_job, on_transition=notify_file_status)
+
+
+@router.post("/process-file", response_model=ProcessFileResponse, status_code=202)
+async def process_file(request: ProcessFileRequest):
+    """
+    Queue an uploaded file for processing (download, extract, embed)
+    
+    Returns immediately; the file is processed by a background worker.
+    Progress is available at GET /api/ai/jobs/{job_id}, and the backend
+    callback (if given) receives processing / completed / failed updates.
+    
+    Args:
+        request: File processing request
+        
+    Returns:
+        The queued job
+    """
+    logger.info(f"Processing file request: file_id={request.file_id}, type={request.file_type}")
+    
+    try:
+        job = await job_queue.enqueue(
+            PROCESS_FILE_JOB,
+            request.model_dump(),
+            file_id=request.file_id,
+            lane=file_lane(request.file_type)
+        )
+        
+        return ProcessFileResponse(
+            success=True,
+            message="File queued for processing",
+            file_id=request.file_id,
+            job_id=job['id'],
+            status=job['status'],
+            status_url=f"/api/ai/jobs/{job['id']}"
+        )
+    except Exception as e:
+        logger.error(f"Error queueing file {request.file_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to queue file: {str(e)}")
+
+
 @router.get("/health")
 async def files_health_check():
     """Health check for file processing service"""
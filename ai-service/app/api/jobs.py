@@ -0,0 +1,36 @@
+"""Status endpoints for background ingestion jobs"""
+from fastapi import APIRouter, HTTPException, Query
+from app.core.job_queue import job_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/ai/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int):
+    """
+    Get a job's status, progress and result
+    """
+    try:
+        job = await job_queue.get(job_id)
+    except Exception as e:
+        logger.error(f"Error loading job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.get("")
+async def list_jobs(file_id: int = Query(...), limit: int = Query(20, ge=1, le=100)):
+    """
+    List the most recent jobs for a file
+    """
+    try:
+        return await job_queue.list_for_file(file_id, limit)
+    except Exception as e:
+        logger.error(f"Error listing jobs for file_id={file_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,46 @@
+"""Runtime metrics for the AI service subsystems"""
+from fastapi import APIRouter
+from app.core.embedding_batcher import embedding_batcher
+from app.core.embedding_cache import embedding_cache
+from app.core.query_cache import retrieval_cache
+from app.core.context_packer import context_packer
+from app.core.single_flight import chat_single_flight
+from app.core.answer_cache import answer_cache
+from app.core.llm_scheduler import llm_scheduler
+from app.core.summarizer import summarizer
+from app.core.file_artifacts import file_artifacts
+from app.core.job_queue import job_queue
+from app.core.whisper import transcription_stats
+from app.core.transcription import segmented_transcriber
+from app.core.executors import get_executor_stats
+from app.core.database import get_pool_stats
+from app.core.http_client import http_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("")
+async def get_metrics():
+    """
+    Return runtime statistics for each subsystem
+    """
+    return {
+        'embedding_batcher': embedding_batcher.get_stats(),
+        'embedding_cache': embedding_cache.get_stats(),
+        'retrieval_cache': retrieval_cache.get_stats(),
+        'context_packer': context_packer.get_stats(),
+        'chat_single_flight': chat_single_flight.get_stats(),
+        'answer_cache': answer_cache.get_stats(),
+        'llm_scheduler': llm_scheduler.get_stats(),
+        'summarizer': summarizer.get_stats(),
+        'file_artifacts': file_artifacts.get_stats(),
+        'job_queue': await job_queue.get_stats(),
+        'transcription': transcription_stats.get_stats(),
+        'segmented_transcription': segmented_transcriber.get_stats(),
+        'executors': get_executor_stats(),
+        'database_pool': get_pool_stats(),
+        'http_client': http_client.get_stats()
+    }
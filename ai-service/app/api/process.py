@@ -3,6 +3,8 @@ from typing import Optional
 from pydantic import BaseModel
 from app.core.embeddings import chunk_text, generate_embeddings
 from app.core.vector_store import store_embeddings, delete_embeddings_by_file
+from app.core.file_artifacts import file_artifacts
+from app.core.job_queue import job_queue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -40,13 +42,21 @@ async def process_text(request: ProcessRequest):
         chunks = chunk_text(request.text_content)
         
         # Store embeddings
-        count = await store_embeddings(
-            file_id=request.file_id,
-            chunks=chunks,
+        async with job_queue.stage("embedding"):
+            count = await store_embeddings(
+                file_id=request.file_id,
+                chunks=chunks,
+                user_id=request.user_id,
+                course_id=request.course_id,
+                module_id=request.module_id,
+                metadata=request.metadata
+            )
+        
+        await file_artifacts.schedule(
+            request.file_id,
             user_id=request.user_id,
             course_id=request.course_id,
-            module_id=request.module_id,
-            metadata=request.metadata
+            module_id=request.module_id
         )
         
         return ProcessResponse(
@@ -67,6 +77,7 @@ async def delete_embeddings(request: DeleteRequest):
     """
     try:
         count = await delete_embeddings_by_file(request.file_id)
+        await file_artifacts.delete(request.file_id)
         
         return {
             'success': True,
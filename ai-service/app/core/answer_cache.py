@@ -0,0 +1,256 @@
+"""Semantic cache of generated chat answers, matched by query-embedding similarity"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.database import acquire
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedAnswer:
+    """A generated answer plus what is needed to match and expire it"""
+    __slots__ = ('scope_key', 'scope', 'embedding', 'result', 'file_ids', 'version', 'expires_at')
+
+    def __init__(
+        self,
+        scope_key: Hashable,
+        scope: Dict[str, Any],
+        embedding: np.ndarray,
+        result: Dict[str, Any],
+        version: int
+    ):
+        self.scope_key = scope_key
+        self.scope = scope
+        self.embedding = embedding
+        self.result = result
+        # Files the answer cites; it is valid while none of them changed after `version`
+        self.file_ids: FrozenSet[int] = frozenset(
+            source['file_id'] for source in result.get('sources', []) if source.get('file_id') is not None
+        )
+        self.version = version
+        self.expires_at = time.monotonic() + settings.ANSWER_CACHE_TTL_SECONDS
+
+
+def _unit(embedding: np.ndarray) -> np.ndarray:
+    embedding = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by (retrieval scope, query embedding).
+
+    A query whose embedding is within ANSWER_CACHE_SIMILARITY_THRESHOLD
+    (cosine) of a cached query in the same scope gets the cached answer.
+
+    Each answer remembers the files it cites. Whichever process ingests or
+    deletes a file stamps it in Postgres (file_versions) with the next value
+    of a shared clock (corpus_version); a cached answer is served only while
+    none of its files was stamped after the clock value read before its
+    retrieval started. Every replica and the job workers therefore see
+    re-ingested and deleted files at once, answers generated while a cited
+    file changed are never served, and changes to other files leave the
+    cache alone. Answers still expire after ANSWER_CACHE_TTL_SECONDS, which
+    bounds how long a newly uploaded file can go unused by a cached answer.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, _CachedAnswer]" = OrderedDict()
+        self._by_scope: Dict[Hashable, Dict[int, _CachedAnswer]] = {}
+        self._next_id = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ANSWER_CACHE_ENABLED
+
+    @staticmethod
+    def _scope_key(scope: Dict[str, Any]) -> Hashable:
+        file_ids = tuple(sorted(scope['file_ids'])) if scope['file_ids'] else None
+        return (
+            scope['user_id'], scope['course_id'], scope['module_id'],
+            file_ids, scope.get('mode'), scope.get('limit')
+        )
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        scoped = self._by_scope[entry.scope_key]
+        del scoped[entry_id]
+        if not scoped:
+            del self._by_scope[entry.scope_key]
+
+    async def clock(self) -> Optional[int]:
+        """
+        Current corpus clock, read before retrieval and passed to put()
+
+        Returns:
+            The clock value, or None if it cannot be read (the answer is then not cached)
+        """
+        if not self.enabled:
+            return None
+        try:
+            async with acquire() as conn:
+                return await conn.fetchval("SELECT version FROM corpus_version WHERE id = 1")
+        except Exception as e:
+            self.version_errors += 1
+            logger.warning(f"Failed to read corpus clock: {str(e)}")
+            return None
+
+    async def bump_files(self, file_ids: Iterable[int]) -> None:
+        """Record that files were ingested or deleted, so answers citing them are dropped everywhere"""
+        file_ids = sorted(set(file_ids))
+        if not self.enabled or not file_ids:
+            return
+        try:
+            async with acquire() as conn:
+                await conn.execute(
+                    """
+                    WITH clock AS (
+                        UPDATE corpus_version SET version = version + 1, updated_at = NOW()
+                        WHERE id = 1
+                        RETURNING version
+                    )
+                    INSERT INTO file_versions (file_id, version, updated_at)
+                    SELECT file_id, clock.version, NOW() FROM clock, unnest($1::int[]) AS file_id
+                    ON CONFLICT (file_id) DO UPDATE SET version = EXCLUDED.version, updated_at = NOW()
+                    """,
+                    file_ids
+                )
+        except Exception as e:
+            # Entries still expire after ANSWER_CACHE_TTL_SECONDS
+            self.version_errors += 1
+            logger.warning(f"Failed to record changed files {file_ids}: {str(e)}")
+        self._drop_files(file_ids)
+
+    def _drop_files(self, file_ids: Iterable[int]) -> None:
+        """Drop local answers citing any of the files"""
+        changed = set(file_ids)
+        for entry_id in [entry_id for entry_id, entry in self._entries.items() if entry.file_ids & changed]:
+            self._remove(entry_id)
+            self.invalidations += 1
+
+    async def _is_current(self, entry: _CachedAnswer) -> bool:
+        async with acquire() as conn:
+            changed = await conn.fetchval(
+                "SELECT max(version) FROM file_versions WHERE file_id = ANY($1::int[])",
+                list(entry.file_ids)
+            )
+        return changed is None or changed <= entry.version
+
+    async def get(self, embedding: np.ndarray, scope: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a semantically equivalent query in the same scope
+
+        Args:
+            embedding: Query embedding
+            scope: Retrieval scope (user_id, course_id, module_id, file_ids, mode, limit)
+
+        Returns:
+            Copy of the cached result with 'cached' set, or None
+        """
+        if not self.enabled:
+            return None
+
+        scoped = self._by_scope.get(self._scope_key(scope))
+        if not scoped:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        for entry_id in [entry_id for entry_id, entry in scoped.items() if entry.expires_at < now]:
+            self._remove(entry_id)
+            self.invalidations += 1
+        scoped = self._by_scope.get(self._scope_key(scope))
+        if not scoped:
+            self.misses += 1
+            return None
+
+        entry_ids = list(scoped)
+        similarities = np.stack([scoped[entry_id].embedding for entry_id in entry_ids]) @ _unit(embedding)
+        # Most similar first; an entry whose files changed is dropped and the next one tried
+        for best in np.argsort(-similarities):
+            if similarities[best] < settings.ANSWER_CACHE_SIMILARITY_THRESHOLD:
+                break
+            entry_id = entry_ids[best]
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                # Dropped by a concurrent lookup or bump
+                continue
+            try:
+                current = await self._is_current(entry)
+            except Exception as e:
+                # Without the file versions a cached answer may be stale
+                self.version_errors += 1
+                logger.warning(f"Failed to read file versions: {str(e)}")
+                break
+            if entry_id not in self._entries:
+                continue
+            if not current:
+                self._remove(entry_id)
+                self.invalidations += 1
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return dict(entry.result, cached=True)
+
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        embedding: np.ndarray,
+        scope: Dict[str, Any],
+        result: Dict[str, Any],
+        version: Optional[int]
+    ) -> None:
+        """
+        Cache a generated answer
+
+        Args:
+            embedding: Query embedding
+            scope: Retrieval scope the answer was generated for
+            result: Answer dict (answer, sources, ...)
+            version: clock() read before retrieval started
+        """
+        if not self.enabled or not result.get('sources') or version is None:
+            return
+
+        entry_id = self._next_id
+        self._next_id += 1
+        entry = _CachedAnswer(self._scope_key(scope), scope, _unit(embedding), dict(result), version)
+        self._entries[entry_id] = entry
+        self._by_scope.setdefault(entry.scope_key, {})[entry_id] = entry
+
+        while len(self._entries) > settings.ANSWER_CACHE_MAX_ENTRIES:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'scopes': len(self._by_scope),
+            'maxsize': settings.ANSWER_CACHE_MAX_ENTRIES,
+            'similarity_threshold': settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'version_errors': self.version_errors
+        }
+
+
+# Global cache instance
+answer_cache = SemanticAnswerCache()
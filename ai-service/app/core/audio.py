@@ -0,0 +1,205 @@
+"""Audio decoding and silence detection for transcription"""
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+import ffmpeg
+import numpy as np
+from app.core.config import settings
+from app.core.executors import run_cpu, run_io
+
+logger = logging.getLogger(__name__)
+
+# Whisper models expect 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# 30 ms analysis frames for voice activity detection
+VAD_FRAME = SAMPLE_RATE * 30 // 1000
+
+# Pieces whose loudest frame is below this level (dBFS) hold no speech
+SILENCE_DBFS = -50.0
+
+# Frames below this level are digital silence and do not count toward the noise floor
+DIGITAL_SILENCE_DBFS = -90.0
+
+# float32 samples
+BYTES_PER_SAMPLE = 4
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Blocking ffprobe of a media file's duration in seconds (None if unknown)"""
+    try:
+        return float(ffmpeg.probe(path)['format']['duration'])
+    except Exception:
+        return None
+
+
+async def stream_pcm(path: str, block_seconds: float = None) -> AsyncIterator[np.ndarray]:
+    """
+    Decode any audio or video file to 16 kHz mono float32 samples, block by block
+
+    ffmpeg writes raw PCM to a pipe that is read as it is produced, so
+    nothing is written to disk and the caller can start on the first block
+    while the rest is still being decoded. ffmpeg blocks on the full pipe
+    while the caller is busy, which bounds the decoded audio held in memory.
+
+    Args:
+        path: Path to the audio or video file
+        block_seconds: Audio per yielded block (default PCM_BLOCK_SECONDS)
+
+    Yields:
+        float32 sample arrays
+    """
+    block_bytes = int((block_seconds or settings.PCM_BLOCK_SECONDS) * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    process = (
+        ffmpeg.input(path)
+        .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=SAMPLE_RATE)
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    # Drain stderr alongside stdout so ffmpeg can never block on it
+    stderr = asyncio.ensure_future(run_io(process.stderr.read))
+    try:
+        while True:
+            data = await run_io(process.stdout.read, block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % BYTES_PER_SAMPLE], dtype=np.float32)
+
+        if await run_io(process.wait) != 0:
+            error_msg = (await stderr).decode(errors='replace').strip()
+            raise Exception(f"Failed to decode audio: {error_msg}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            await run_io(process.wait)
+        process.stdout.close()
+        await asyncio.gather(stderr, return_exceptions=True)
+        process.stderr.close()
+
+
+def frame_levels(samples: np.ndarray) -> np.ndarray:
+    """Level of each 30 ms frame in dBFS"""
+    if len(samples) < VAD_FRAME:
+        samples = np.pad(samples, (0, VAD_FRAME - len(samples)))
+    frames = len(samples) // VAD_FRAME
+    rms = np.sqrt(np.mean(samples[:frames * VAD_FRAME].reshape(frames, VAD_FRAME) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def find_silences(levels: np.ndarray, min_silence_seconds: float = None) -> np.ndarray:
+    """
+    Sample positions in the middle of every pause of at least min_silence_seconds
+
+    A frame is silent when it is quieter than a quarter of the way from the
+    noise floor (10th percentile) to the speech level (90th percentile) of
+    the non-digitally-silent frames, so the detector adapts to the
+    recording's loudness and background noise.
+    """
+    min_silence_seconds = settings.VAD_MIN_SILENCE_SECONDS if min_silence_seconds is None else min_silence_seconds
+    audible = levels[levels > DIGITAL_SILENCE_DBFS]
+    if audible.size:
+        floor, speech = np.percentile(audible, 10), np.percentile(audible, 90)
+        silent = levels < floor + 0.25 * (speech - floor)
+    else:
+        silent = np.ones(len(levels), dtype=bool)
+
+    # Run boundaries of silent frames
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = max(1, int(min_silence_seconds * 1000 / 30))
+    long_runs = (ends - starts) >= min_frames
+    return ((starts[long_runs] + ends[long_runs]) // 2) * VAD_FRAME
+
+
+def _piece_limits(target_seconds: float = None, max_seconds: float = None) -> Tuple[int, int]:
+    """Target and maximum piece length in samples"""
+    target = int((target_seconds or settings.TRANSCRIBE_SEGMENT_SECONDS) * SAMPLE_RATE)
+    maximum = max(target, int((max_seconds or settings.TRANSCRIBE_MAX_SEGMENT_SECONDS) * SAMPLE_RATE))
+    return target, maximum
+
+
+def _split(samples: np.ndarray, target: int, maximum: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Cut samples at pauses; returns all pieces and the ones with speech"""
+    levels = frame_levels(samples)
+    silences = find_silences(levels)
+
+    pieces = []
+    start = 0
+    total = len(samples)
+    while total - start > maximum:
+        window = silences[(silences > start + target // 2) & (silences <= start + maximum)]
+        cut = int(window[np.argmin(np.abs(window - (start + target)))]) if len(window) else start + maximum
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, total))
+
+    def has_speech(start: int, end: int) -> bool:
+        piece_levels = levels[start // VAD_FRAME:max(start // VAD_FRAME + 1, end // VAD_FRAME)]
+        return piece_levels.size > 0 and piece_levels.max() > SILENCE_DBFS
+
+    return pieces, [(start, end) for start, end in pieces if has_speech(start, end)]
+
+
+def split_on_silence(
+    samples: np.ndarray,
+    target_seconds: float = None,
+    max_seconds: float = None
+) -> List[Tuple[int, int]]:
+    """
+    Split audio into pieces of about target_seconds, cutting in pauses
+
+    Each cut is the pause closest to the target length, taken between half
+    the target and max_seconds; without a pause in that window the piece is
+    cut at max_seconds. Pieces without speech are left out.
+
+    Returns:
+        (start, end) sample ranges in order
+    """
+    pieces, voiced = _split(samples, *_piece_limits(target_seconds, max_seconds))
+    if len(voiced) < len(pieces):
+        logger.info(f"Skipping {len(pieces) - len(voiced)} silent pieces")
+    return voiced
+
+
+async def stream_pieces(
+    blocks: AsyncIterator[np.ndarray],
+    target_seconds: float = None,
+    max_seconds: float = None
+) -> AsyncIterator[Tuple[int, np.ndarray]]:
+    """
+    Split a stream of sample blocks into pieces as it arrives
+
+    Same cuts as split_on_silence, but a piece is yielded as soon as the
+    audio after it reaches max_seconds, so only about one maximum-length
+    piece of undecided audio is buffered.
+
+    Yields:
+        (start sample, samples) of each piece with speech, in order
+    """
+    target, maximum = _piece_limits(target_seconds, max_seconds)
+    pending: List[np.ndarray] = []
+    pending_samples = 0
+    offset = 0
+
+    async for block in blocks:
+        pending.append(block)
+        pending_samples += len(block)
+        if pending_samples <= maximum:
+            continue
+
+        buffer = np.concatenate(pending)
+        pieces, voiced = await run_cpu(_split, buffer, target, maximum)
+        # The last piece may still grow; keep it for the next round
+        keep_from = pieces[-1][0]
+        for start, end in voiced:
+            if end <= keep_from:
+                yield offset + start, buffer[start:end]
+        pending = [buffer[keep_from:]]
+        pending_samples = len(pending[0])
+        offset += keep_from
+
+    buffer = np.concatenate(pending) if pending else np.zeros(0, dtype=np.float32)
+    _, voiced = await run_cpu(_split, buffer, target, maximum)
+    for start, end in voiced:
+        yield offset + start, buffer[start:end]
@@ -11,6 +11,11 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "elearning"
     POSTGRES_HOST: str = "postgres"
     POSTGRES_PORT: int = 5432
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_ACQUIRE_TIMEOUT: float = 10.0  # Seconds to wait for a free connection
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Prepared statements cached per connection
+    DB_COMMAND_TIMEOUT: float = 60.0
     
     # MinIO
     MINIO_ENDPOINT: str = "minio:9000"
@@ -22,6 +27,20 @@ class Settings(BaseSettings):
     # Ollama - support both formats: "http://ollama:11434" or "ollama"
     OLLAMA_HOST: str = "http://ollama:11434"
     OLLAMA_MODEL: str = "llama3"
+    OLLAMA_TIMEOUT: float = 300.0  # Seconds allowed for a single generation
+    LLM_MAX_CONCURRENCY: int = 2  # Concurrent generations sent to Ollama
+    LLM_MAX_QUEUE_DEPTH: int = 64  # Waiting generations beyond this are rejected with 503
+    LLM_MAX_QUEUED_PER_USER: int = 4  # Waiting generations per user beyond this are rejected with 429 (not applied without user_id)
+    LLM_QUEUE_TIMEOUT_SECONDS: dict = {"chat": 15, "summary": 60, "quiz": 120, "batch": 600}  # Max queue wait per priority
+    
+    # Shared HTTP client (Ollama, backend callbacks)
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 32
+    HTTP_KEEPALIVE_TIMEOUT: float = 60.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_DEFAULT_TIMEOUT: float = 60.0
+    HTTP_MAX_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF_SECONDS: float = 0.5
     
     # AI Service
     AI_SERVICE_HOST: str = "0.0.0.0"
@@ -32,9 +51,110 @@ class Settings(BaseSettings):
     EMBEDDING_DIMENSION: int = 384
     CHUNK_SIZE: int = 512
     CHUNK_OVERLAP: int = 50
+    EMBEDDING_BATCH_MAX_SIZE: int = 64  # Max texts per batched encode call
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0  # How long to wait for concurrent requests
+    EMBEDDING_INSERT_MODE: str = "copy"  # copy (binary COPY) or insert (multi-row INSERT)
+    EMBEDDING_INSERT_BATCH_SIZE: int = 256  # Rows embedded and written per round trip
+    INGEST_QUEUE_DEPTH: int = 2  # Batches buffered between the extract, embed and insert stages
+    EMBEDDING_CACHE_ENABLED: bool = True  # Persistent content-hash cache for chunk embeddings
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
+    EMBEDDING_CACHE_MAX_AGE_DAYS: int = 90  # Evict entries unused for this long
+    EMBEDDING_CACHE_EVICT_INTERVAL_SECONDS: int = 3600
+    
+    # Vector index (pgvector)
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw or ivfflat
+    HNSW_M: int = 0  # 0 = size from row count
+    HNSW_EF_CONSTRUCTION: int = 0  # 0 = size from m
+    HNSW_EF_SEARCH: int = 0  # 0 = derive from recall target
+    IVFFLAT_LISTS: int = 0  # 0 = size from row count
+    IVFFLAT_PROBES: int = 0  # 0 = derive from recall target and lists
+    VECTOR_SEARCH_RECALL_TARGET: float = 0.95  # Higher = better recall, slower queries
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM: str = "512MB"  # Memory for index builds
+    
+    # Retrieval
+    RETRIEVAL_MODE: str = "hybrid"  # vector or hybrid (vector + full-text with rank fusion)
+    HYBRID_TEXT_SEARCH_CONFIG: str = "simple"  # No stemming, keeps code identifiers and acronyms intact
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4  # Candidates per side = limit * multiplier
+    HYBRID_RRF_K: int = 60  # Reciprocal rank fusion constant
+    
+    # Query caches (in-process, in front of search_similar)
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: int = 3600
+    RETRIEVAL_CACHE_SIZE: int = 2048
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 300
+    
+    # RAG context packing
+    CONTEXT_PACKING_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 2048  # Context tokens per prompt (default for all models)
+    CONTEXT_TOKEN_BUDGETS: dict = {}  # Per-model overrides, e.g. {"llama3": 3000}
+    CONTEXT_SIMILARITY_FLOOR: float = 0.25  # Drop chunks below this similarity (best chunk is kept)
+    CONTEXT_MMR_LAMBDA: float = 0.7  # 1 = pure relevance, 0 = pure diversity
+    CHAT_COALESCING_ENABLED: bool = True  # Identical concurrent chat queries share one generation
+    
+    # Semantic answer cache (paraphrased questions in the same scope)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95  # Min cosine similarity between query embeddings
+    ANSWER_CACHE_MAX_ENTRIES: int = 2048
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    
+    # Summarization (map-reduce for long content)
+    SUMMARY_DIRECT_MAX_TOKENS: int = 3000  # Longer input is summarized section by section
+    SUMMARY_SECTION_SIZE: int = 1500  # Words per map section
+    SUMMARY_REDUCE_MAX_TOKENS: int = 3000  # Partial summaries combined per reduce prompt
+    SUMMARY_CACHE_ENABLED: bool = True  # Cache partial summaries by content hash
+    FILE_ARTIFACTS_ENABLED: bool = True  # Build per-file summary + digest embedding after ingestion
+    
+    # Quiz generation
+    QUIZ_SOURCE_MAX_TOKENS: int = 3000  # Source text per module in course-wide quizzes
+    QUIZ_DEDUPE_THRESHOLD: float = 0.9  # Drop questions this similar (cosine) to one already sent
+    
+    # Ingestion job queue (Postgres-backed, survives restarts)
+    JOB_LANE_WORKERS: dict = {"text": 2, "ocr": 1, "media": 1, "llm": 1, "embedding": 2}  # Workers per lane (embedding: concurrent embedding steps)
+    JOB_LANE_CPU_SLOTS: dict = {"text": 2, "ocr": 2, "media": 2, "llm": 1, "embedding": 2}  # CPU/process/transcription pool tasks per lane (0 = unlimited)
+    JOB_WORK_STEALING: bool = True  # Idle workers take jobs from other lanes (each lane keeps one dedicated worker)
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 10.0  # Doubles after every failed attempt
+    JOB_LEASE_SECONDS: int = 120  # Running jobs not renewed within this are re-claimed
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0  # Idle workers poll for jobs from other instances
+    
+    # PDF extraction
+    PDF_BACKEND: str = "auto"  # auto, pdfium (pypdfium2), mupdf (PyMuPDF) or pypdf2; auto = fastest installed
+    PDF_PAGES_PER_SHARD: int = 8  # Pages per process pool task
+    PDF_PARALLEL_SHARDS: int = 0  # Shards extracted at once (0 = CPU count)
+    PDF_OCR_ENABLED: bool = True  # OCR pages without a text layer (scanned pages)
+    PDF_OCR_MIN_CHARS: int = 1  # Pages with fewer extracted characters are OCRed
+    PDF_OCR_DPI: int = 200  # Rasterization resolution for OCR
+    
+    # Office extraction
+    OFFICE_UNITS_PER_SHARD: int = 16  # PPTX slides / XLSX sheets per process pool task
+    
+    # OCR (Tesseract)
+    OCR_MAX_DIMENSION: int = 5000  # Longer image sides are downscaled to this before OCR (0 = no limit); keeps 300-400 DPI pages intact
+    OCR_BINARIZE: bool = False  # Otsu-threshold images before OCR (helps noisy photos, hurts clean or anti-aliased scans)
+    OCR_MAX_FRAMES: int = 200  # Frames read from multi-page TIFFs / multi-frame GIFs
+    OCR_FRAMES_PER_TASK: int = 8  # Frames per process pool task in batch OCR
     
     # Whisper (audio/video transcription)
     WHISPER_MODEL: str = "base"  # tiny, base, small, medium, large
+    WHISPER_BACKEND: str = "auto"  # auto, faster-whisper (CTranslate2) or openai-whisper; auto = faster-whisper if installed
+    WHISPER_COMPUTE_TYPE: str = "int8"  # faster-whisper: int8, int8_float16, float16, float32
+    WHISPER_DEVICE: str = "auto"  # faster-whisper device: auto, cpu or cuda
+    WHISPER_CPU_THREADS: int = 0  # faster-whisper threads per transcription (0 = library default)
+    WHISPER_BEAM_SIZE: int = 1  # 1 = greedy decoding (fastest)
+    WHISPER_TIMESTAMPS: str = "segment"  # segment or word (word-level timings cost an extra alignment pass)
+    TRANSCRIBE_SEGMENTED: bool = True  # Split long recordings at pauses and transcribe the pieces in parallel
+    TRANSCRIBE_SEGMENT_SECONDS: float = 120.0  # Target piece length
+    TRANSCRIBE_MAX_SEGMENT_SECONDS: float = 300.0  # Pieces without a pause are cut hard at this length
+    TRANSCRIBE_PARALLEL_SEGMENTS: int = 2  # Transcription worker processes (each holds its own model)
+    VAD_MIN_SILENCE_SECONDS: float = 0.5  # Shortest pause that can be a cut point
+    TRANSCRIBE_CHECKPOINT_TTL_HOURS: int = 48  # Finished pieces are kept this long for resuming failed jobs
+    PCM_BLOCK_SECONDS: float = 10.0  # Audio read from the ffmpeg pipe per block
+    
+    # Executor pools (0 = size from CPU count)
+    IO_THREAD_POOL_SIZE: int = 0
+    CPU_THREAD_POOL_SIZE: int = 0
+    CPU_PROCESS_POOL_SIZE: int = 0
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:4000", "http://localhost:8000"]
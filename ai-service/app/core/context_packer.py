@@ -0,0 +1,212 @@
+"""Token-budgeted context assembly for RAG prompts"""
+import logging
+import math
+import re
+from typing import List, Dict, Any, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+')
+
+# Approximate prompt cost of each "[Source n - file_id: x, relevance: y]" header
+SOURCE_HEADER_TOKENS = 16
+
+# Overlaps shorter than this between non-adjacent chunks are treated as coincidence
+MIN_TEXT_OVERLAP_WORDS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Llama-family tokenizers)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def get_token_budget(model: Optional[str] = None) -> int:
+    """Context token budget for a model, falling back to the global default"""
+    model = model or settings.OLLAMA_MODEL
+    return settings.CONTEXT_TOKEN_BUDGETS.get(model, settings.CONTEXT_TOKEN_BUDGET)
+
+
+def _merge_text(first: str, second: str, min_overlap: int) -> Optional[str]:
+    """
+    Join two texts, removing the words the end of `first` shares with the start
+    of `second`. Returns None if they overlap by fewer than `min_overlap` words.
+    """
+    if second in first:
+        return first
+
+    first_words = first.split()
+    second_words = second.split()
+    max_overlap = min(len(first_words), len(second_words), 2 * settings.CHUNK_OVERLAP + MIN_TEXT_OVERLAP_WORDS)
+
+    for size in range(max_overlap, 0, -1):
+        if first_words[-size:] == second_words[:size]:
+            if size < min_overlap:
+                break
+            return ' '.join(first_words + second_words[size:])
+
+    if min_overlap == 0:
+        return first + '\n' + second
+    return None
+
+
+def _merge_file_chunks(chunks: List[Dict]) -> List[Dict]:
+    """Merge adjacent or overlapping chunks from the same file into single segments"""
+    by_file: Dict[Any, List[Dict]] = {}
+    for chunk in chunks:
+        by_file.setdefault(chunk.get('file_id'), []).append(chunk)
+
+    merged = []
+    for file_chunks in by_file.values():
+        # Rows of one file are inserted in chunk order, so ids follow the text
+        file_chunks.sort(key=lambda chunk: chunk.get('id') or 0)
+        current = dict(file_chunks[0], chunk_ids=[file_chunks[0].get('id')])
+        for chunk in file_chunks[1:]:
+            previous_id = current['chunk_ids'][-1]
+            adjacent = previous_id is not None and chunk.get('id') == previous_id + 1
+            joined = _merge_text(
+                current['chunk_text'],
+                chunk['chunk_text'],
+                0 if adjacent else MIN_TEXT_OVERLAP_WORDS
+            )
+            if joined is None:
+                merged.append(current)
+                current = dict(chunk, chunk_ids=[chunk.get('id')])
+                continue
+            current['chunk_text'] = joined
+            current['chunk_ids'].append(chunk.get('id'))
+            current['similarity'] = max(current.get('similarity', 0), chunk.get('similarity', 0))
+        merged.append(current)
+
+    return merged
+
+
+def _mmr_order(chunks: List[Dict], lambda_: float) -> List[Dict]:
+    """
+    Order chunks by maximal marginal relevance
+
+    Relevance is the retrieval similarity; redundancy is word-set Jaccard
+    similarity to the chunks already chosen.
+    """
+    word_sets = [set(word.lower() for word in _WORD.findall(chunk['chunk_text'])) for chunk in chunks]
+    remaining = list(range(len(chunks)))
+    selected: List[int] = []
+
+    while remaining:
+        def score(index: int) -> float:
+            redundancy = 0.0
+            for chosen in selected:
+                union = word_sets[index] | word_sets[chosen]
+                if union:
+                    redundancy = max(redundancy, len(word_sets[index] & word_sets[chosen]) / len(union))
+            return lambda_ * chunks[index].get('similarity', 0) - (1 - lambda_) * redundancy
+
+        best = max(remaining, key=score)
+        selected.append(best)
+        remaining.remove(best)
+
+    return [chunks[index] for index in selected]
+
+
+class ContextPacker:
+    """
+    Assembles retrieved chunks into the smallest context that covers the top evidence:
+    drop chunks below the similarity floor, merge adjacent/overlapping chunks
+    from the same file, order by MMR, and fill the model's token budget.
+    """
+
+    def __init__(self):
+        # Stats
+        self._packs = 0
+        self._tokens_in = 0
+        self._tokens_out = 0
+        self._chunks_in = 0
+        self._chunks_dropped = 0
+
+    def pack(self, chunks: List[Dict], model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pack retrieved chunks into a token-budgeted context
+
+        Args:
+            chunks: Chunks from vector search, best first
+            model: Model the prompt is for (selects the token budget)
+
+        Returns:
+            Dict with 'chunks' (packed segments, best first) and 'stats'
+        """
+        if not chunks:
+            return {'chunks': [], 'stats': {'tokens_before': 0, 'tokens_after': 0, 'tokens_saved': 0}}
+
+        tokens_before = sum(estimate_tokens(chunk['chunk_text']) + SOURCE_HEADER_TOKENS for chunk in chunks)
+
+        if not settings.CONTEXT_PACKING_ENABLED:
+            return {
+                'chunks': chunks,
+                'stats': {'tokens_before': tokens_before, 'tokens_after': tokens_before, 'tokens_saved': 0}
+            }
+
+        budget = get_token_budget(model)
+
+        # 1. Similarity floor (always keep the best chunk)
+        best = max(chunks, key=lambda chunk: chunk.get('similarity', 0))
+        kept = [
+            chunk for chunk in chunks
+            if chunk is best or chunk.get('similarity', 0) >= settings.CONTEXT_SIMILARITY_FLOOR
+        ]
+        dropped_low_similarity = len(chunks) - len(kept)
+
+        # 2. Merge adjacent / overlapping chunks of the same file
+        segments = _merge_file_chunks(kept)
+
+        # 3. Diversify
+        segments = _mmr_order(segments, settings.CONTEXT_MMR_LAMBDA)
+
+        # 4. Fill the token budget
+        packed = []
+        used = 0
+        for segment in segments:
+            cost = estimate_tokens(segment['chunk_text']) + SOURCE_HEADER_TOKENS
+            if used + cost <= budget:
+                packed.append(segment)
+                used += cost
+            elif not packed:
+                # Top evidence alone exceeds the budget: truncate it
+                max_chars = max(0, (budget - SOURCE_HEADER_TOKENS) * 4)
+                packed.append(dict(segment, chunk_text=segment['chunk_text'][:max_chars]))
+                used = budget
+
+        stats = {
+            'token_budget': budget,
+            'tokens_before': tokens_before,
+            'tokens_after': used,
+            'tokens_saved': tokens_before - used,
+            'chunks_in': len(chunks),
+            'segments_used': len(packed),
+            'dropped_low_similarity': dropped_low_similarity,
+            'merged_chunks': len(kept) - len(segments)
+        }
+
+        self._packs += 1
+        self._tokens_in += tokens_before
+        self._tokens_out += used
+        self._chunks_in += len(chunks)
+        self._chunks_dropped += len(chunks) - sum(len(segment.get('chunk_ids', [None])) for segment in packed)
+
+        logger.info(f"Packed {len(chunks)} chunks into {len(packed)} segments, saved {stats['tokens_saved']} tokens")
+        return {'chunks': packed, 'stats': stats}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cumulative token savings"""
+        return {
+            'enabled': settings.CONTEXT_PACKING_ENABLED,
+            'packs': self._packs,
+            'tokens_in': self._tokens_in,
+            'tokens_out': self._tokens_out,
+            'tokens_saved': self._tokens_in - self._tokens_out,
+            'chunks_in': self._chunks_in,
+            'chunks_not_used': self._chunks_dropped
+        }
+
+
+# Global packer instance
+context_packer = ContextPacker()
@@ -1,15 +1,24 @@
 from sqlalchemy import create_engine, text, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from contextlib import asynccontextmanager
+import asyncio
+from typing import AsyncIterator, Dict, Any, Optional
+import asyncpg
+from pgvector.asyncpg import register_vector
 from app.core.config import settings
 import logging
+import json
+import time
 
 logger = logging.getLogger(__name__)
 
+# Sync engine, used for schema setup and session-based access
 engine = create_engine(
     settings.database_url,
-    poolclass=NullPool,
+    pool_size=settings.DB_POOL_MIN_SIZE,
+    max_overflow=max(0, settings.DB_POOL_MAX_SIZE - settings.DB_POOL_MIN_SIZE),
+    pool_pre_ping=True,
     echo=False
 )
 
@@ -38,35 +47,31 @@ def init_db():
             table_exists = result.scalar()
             
             if not table_exists:
-                # Create embeddings table matching init-db.sql schema
+                # Create embeddings table matching init-db.sql schema and vector_store columns
                 conn.execute(text(f"""
                     CREATE TABLE embeddings (
                         id SERIAL PRIMARY KEY,
-                        vector vector({settings.EMBEDDING_DIMENSION}),
-                        content TEXT NOT NULL,
-                        course_id INTEGER,
-                        lesson_id INTEGER,
+                        embedding vector({settings.EMBEDDING_DIMENSION}),
+                        chunk_text TEXT NOT NULL,
                         file_id INTEGER,
-                        file_type VARCHAR(50),
-                        page_number INTEGER,
-                        timestamp_seconds FLOAT,
+                        user_id INTEGER,
+                        course_id INTEGER,
+                        module_id INTEGER,
                         metadata JSONB,
                         created_at TIMESTAMP DEFAULT NOW()
                     )
                 """))
                 conn.commit()
                 
-                # Create indexes
+                # Create filter indexes; the vector index is managed by app.core.vector_index
                 conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS embeddings_vector_idx 
-                    ON embeddings USING ivfflat (vector vector_cosine_ops)
-                    WITH (lists = 100)
+                    CREATE INDEX IF NOT EXISTS embeddings_course_id_idx ON embeddings(course_id)
                 """))
                 conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS embeddings_course_id_idx ON embeddings(course_id)
+                    CREATE INDEX IF NOT EXISTS embeddings_module_id_idx ON embeddings(module_id)
                 """))
                 conn.execute(text("""
-                    CREATE INDEX IF NOT EXISTS embeddings_lesson_id_idx ON embeddings(lesson_id)
+                    CREATE INDEX IF NOT EXISTS embeddings_user_id_idx ON embeddings(user_id)
                 """))
                 conn.execute(text("""
                     CREATE INDEX IF NOT EXISTS embeddings_file_id_idx ON embeddings(file_id)
@@ -76,6 +81,127 @@ def init_db():
             else:
                 logger.info("Embeddings table already exists")
             
+            # Full-text column for hybrid retrieval (rewrites the table once when first added)
+            conn.execute(text(f"""
+                ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS chunk_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('{settings.HYBRID_TEXT_SEARCH_CONFIG}'::regconfig, chunk_text)) STORED
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS embeddings_chunk_tsv_idx ON embeddings USING gin (chunk_tsv)
+            """))
+            conn.commit()
+            
+            # Content-hash embedding cache (see app.core.embedding_cache)
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model_name VARCHAR(255) NOT NULL,
+                    text_hash VARCHAR(64) NOT NULL,
+                    embedding vector({settings.EMBEDDING_DIMENSION}) NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    last_used_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (model_name, text_hash)
+                )
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS embedding_cache_last_used_idx ON embedding_cache(last_used_at)
+            """))
+            
+            # Partial summary cache for map-reduce summarization (see app.core.summarizer)
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS summary_cache (
+                    model_name VARCHAR(255) NOT NULL,
+                    content_hash VARCHAR(64) NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    last_used_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (model_name, content_hash)
+                )
+            """))
+            
+            # Per-file summaries and digests built at ingest (see app.core.file_artifacts)
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS file_artifacts (
+                    file_id INTEGER PRIMARY KEY,
+                    content_hash VARCHAR(64) NOT NULL,
+                    model_name VARCHAR(255) NOT NULL,
+                    user_id INTEGER,
+                    course_id INTEGER,
+                    module_id INTEGER,
+                    summary TEXT NOT NULL,
+                    digest_embedding vector({settings.EMBEDDING_DIMENSION}) NOT NULL,
+                    quiz JSONB,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """))
+            
+            # Durable ingestion job queue (see app.core.job_queue)
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    kind VARCHAR(64) NOT NULL,
+                    lane VARCHAR(16) NOT NULL DEFAULT 'text',
+                    file_id INTEGER,
+                    payload JSONB NOT NULL,
+                    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    progress REAL NOT NULL DEFAULT 0,
+                    stage VARCHAR(64),
+                    error TEXT,
+                    result JSONB,
+                    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+                    locked_by VARCHAR(255),
+                    locked_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    updated_at TIMESTAMP DEFAULT NOW(),
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ingest_jobs_runnable_idx ON ingest_jobs(lane, run_after, id)
+                WHERE status IN ('queued', 'running')
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ingest_jobs_file_id_idx ON ingest_jobs(file_id)
+            """))
+            
+            # Finished pieces of segmented transcriptions (see app.core.transcription)
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS transcription_checkpoints (
+                    piece_hash VARCHAR(64) NOT NULL,
+                    config_key VARCHAR(255) NOT NULL,
+                    result JSONB NOT NULL,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (piece_hash, config_key)
+                )
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS transcription_checkpoints_created_idx ON transcription_checkpoints(created_at)
+            """))
+            
+            # Corpus clock shared by all processes and the clock value each ingested/deleted
+            # file was last changed at (see app.core.answer_cache)
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS corpus_version (
+                    id SMALLINT PRIMARY KEY CHECK (id = 1),
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """))
+            conn.execute(text("""
+                INSERT INTO corpus_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS file_versions (
+                    file_id INTEGER PRIMARY KEY,
+                    version BIGINT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """))
+            conn.commit()
+            
             logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}")
@@ -89,3 +215,160 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Async connection pool used by vector_store
+_pool: Optional[asyncpg.Pool] = None
+
+
+class _PoolStats:
+    """Acquire counters for the async pool"""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.acquire_timeouts = 0
+        self.waited_acquisitions = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.in_use = 0
+        self.max_in_use = 0
+
+
+_pool_stats = _PoolStats()
+
+
+def _asyncpg_dsn() -> str:
+    """asyncpg only understands the plain postgresql:// scheme"""
+    url = settings.database_url
+    scheme, sep, rest = url.partition('://')
+    return f"{scheme.split('+')[0]}{sep}{rest}"
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    # Binary jsonb is a format version byte followed by the JSON text
+    return b'\x01' + json.dumps(value).encode('utf-8')
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    return json.loads(data[1:].decode('utf-8'))
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """
+    Register pgvector and jsonb codecs on each new pooled connection
+
+    Both codecs are binary, which copy_records_to_table requires.
+    """
+    await register_vector(conn)
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        schema='pg_catalog',
+        format='binary'
+    )
+
+
+async def init_pool() -> None:
+    """Create the async connection pool (call after init_db)"""
+    global _pool
+    if _pool is not None:
+        return
+    _pool = await asyncpg.create_pool(
+        _asyncpg_dsn(),
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        # Prepared statements are cached per connection, keyed by query text
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        command_timeout=settings.DB_COMMAND_TIMEOUT,
+        init=_init_connection
+    )
+    logger.info(
+        f"Database pool created (min_size={settings.DB_POOL_MIN_SIZE}, "
+        f"max_size={settings.DB_POOL_MAX_SIZE})"
+    )
+
+
+async def close_pool() -> None:
+    """Close the async connection pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Database pool closed")
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Get the async pool, creating it on first use"""
+    if _pool is None:
+        await init_pool()
+    return _pool
+
+
+@asynccontextmanager
+async def open_connection() -> AsyncIterator[asyncpg.Connection]:
+    """
+    Open a dedicated connection outside the pool, for long-running
+    maintenance work that should not hold a pooled connection
+    """
+    conn = await asyncpg.connect(_asyncpg_dsn(), command_timeout=None)
+    try:
+        await _init_connection(conn)
+        yield conn
+    finally:
+        await conn.close()
+
+
+@asynccontextmanager
+async def acquire() -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquire a pooled connection, recording wait time for saturation metrics
+    """
+    pool = await get_pool()
+    started = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _pool_stats.acquire_timeouts += 1
+        raise
+
+    waited = time.perf_counter() - started
+    _pool_stats.acquisitions += 1
+    _pool_stats.total_wait_seconds += waited
+    _pool_stats.max_wait_seconds = max(_pool_stats.max_wait_seconds, waited)
+    if waited > 0.001:
+        _pool_stats.waited_acquisitions += 1
+    _pool_stats.in_use += 1
+    _pool_stats.max_in_use = max(_pool_stats.max_in_use, _pool_stats.in_use)
+
+    try:
+        yield conn
+    finally:
+        _pool_stats.in_use -= 1
+        await pool.release(conn)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return pool size, utilisation and acquire wait statistics"""
+    size = _pool.get_size() if _pool is not None else 0
+    idle = _pool.get_idle_size() if _pool is not None else 0
+    max_size = settings.DB_POOL_MAX_SIZE
+
+    return {
+        'initialized': _pool is not None,
+        'min_size': settings.DB_POOL_MIN_SIZE,
+        'max_size': max_size,
+        'size': size,
+        'idle': idle,
+        'in_use': _pool_stats.in_use,
+        'max_in_use': _pool_stats.max_in_use,
+        'saturation': _pool_stats.in_use / max_size if max_size else 0.0,
+        'acquisitions': _pool_stats.acquisitions,
+        'waited_acquisitions': _pool_stats.waited_acquisitions,
+        'acquire_timeouts': _pool_stats.acquire_timeouts,
+        'avg_acquire_wait_ms': (
+            1000 * _pool_stats.total_wait_seconds / _pool_stats.acquisitions
+            if _pool_stats.acquisitions else 0.0
+        ),
+        'max_acquire_wait_ms': 1000 * _pool_stats.max_wait_seconds
+    }
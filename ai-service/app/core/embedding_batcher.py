@@ -0,0 +1,225 @@
+"""Cross-request micro-batching for embedding generation"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+from app.core.config import settings
+from app.core.embeddings import generate_embeddings
+from app.core.executors import run_cpu
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets (last bucket is open-ended)
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+class _PendingRequest:
+    """A slice of texts waiting to be encoded on behalf of one caller"""
+    __slots__ = ('texts', 'future', 'enqueued_at')
+
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    Gathers concurrent embedding requests into a single model call.
+
+    Callers await `embed()`; a background worker collects requests for up to
+    `window_ms` (or until `max_batch_size` texts are pending), encodes them in
+    one `SentenceTransformer.encode` call and hands each caller its own vectors.
+    """
+
+    def __init__(self, max_batch_size: int = None, window_ms: float = None):
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self.window_ms = window_ms if window_ms is not None else settings.EMBEDDING_BATCH_WINDOW_MS
+
+        self._pending: deque = deque()
+        self._pending_texts = 0
+        self._has_pending: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Stats
+        self._batches = 0
+        self._texts_encoded = 0
+        self._requests = 0
+        self._encode_seconds = 0.0
+        self._queue_wait_seconds = 0.0
+        self._slices_served = 0
+        self._max_queue_depth = 0
+        self._histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self._histogram_overflow = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        """Start the background batching worker"""
+        if self.running:
+            return
+        self._has_pending = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Embedding batcher started (max_batch_size={self.max_batch_size}, "
+            f"window_ms={self.window_ms})"
+        )
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any requests still waiting"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while self._pending:
+            request = self._pending.popleft()
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Embedding batcher stopped"))
+        self._pending_texts = 0
+        logger.info("Embedding batcher stopped")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for texts, sharing a model call with concurrent callers
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            List of embedding vectors, in the same order as `texts`
+        """
+        if not texts:
+            return []
+
+        if not self.running:
+            # Batcher not started (e.g. scripts, tests) - encode directly
+            return await run_cpu(generate_embeddings, texts)
+
+        # Split large requests so interactive queries can interleave with ingestion
+        loop = asyncio.get_running_loop()
+        requests = []
+        for start in range(0, len(texts), self.max_batch_size):
+            request = _PendingRequest(texts[start:start + self.max_batch_size], loop.create_future())
+            self._pending.append(request)
+            self._pending_texts += len(request.texts)
+            requests.append(request)
+
+        self._requests += 1
+        self._max_queue_depth = max(self._max_queue_depth, len(self._pending))
+        self._has_pending.set()
+
+        results = await asyncio.gather(*(request.future for request in requests))
+        return [vector for result in results for vector in result]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        window = self.window_ms / 1000.0
+
+        while True:
+            await self._has_pending.wait()
+
+            # Hold the batch open until the window closes or it is full
+            deadline = loop.time() + window
+            while self._pending_texts < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._has_pending.clear()
+                try:
+                    await asyncio.wait_for(self._has_pending.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if not self._pending:
+                self._has_pending.clear()
+            else:
+                self._has_pending.set()
+
+            if batch:
+                await self._flush(batch)
+
+    def _take_batch(self) -> List[_PendingRequest]:
+        batch = []
+        size = 0
+        while self._pending:
+            request = self._pending[0]
+            if batch and size + len(request.texts) > self.max_batch_size:
+                break
+            self._pending.popleft()
+            self._pending_texts -= len(request.texts)
+            if request.future.cancelled():
+                # Caller went away while waiting
+                continue
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    async def _flush(self, batch: List[_PendingRequest]) -> None:
+        texts = [text for request in batch for text in request.texts]
+
+        now = time.perf_counter()
+        for request in batch:
+            self._queue_wait_seconds += now - request.enqueued_at
+        self._slices_served += len(batch)
+
+        try:
+            vectors = await run_cpu(generate_embeddings, texts)
+        except Exception as e:
+            logger.error(f"Error encoding batch of {len(texts)} texts: {str(e)}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self._record_batch(len(texts), time.perf_counter() - now)
+
+        offset = 0
+        for request in batch:
+            count = len(request.texts)
+            if not request.future.done():
+                request.future.set_result(vectors[offset:offset + count])
+            offset += count
+
+    def _record_batch(self, size: int, encode_seconds: float) -> None:
+        self._batches += 1
+        self._texts_encoded += size
+        self._encode_seconds += encode_seconds
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self._histogram[bucket] += 1
+                return
+        self._histogram_overflow += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue depth, batch-size histogram and throughput counters"""
+        histogram = {f"le_{bucket}": count for bucket, count in self._histogram.items()}
+        histogram[f"gt_{BATCH_SIZE_BUCKETS[-1]}"] = self._histogram_overflow
+
+        return {
+            'running': self.running,
+            'max_batch_size': self.max_batch_size,
+            'window_ms': self.window_ms,
+            'queue_depth': len(self._pending),
+            'queued_texts': self._pending_texts,
+            'max_queue_depth': self._max_queue_depth,
+            'requests': self._requests,
+            'batches': self._batches,
+            'texts_encoded': self._texts_encoded,
+            'avg_batch_size': self._texts_encoded / self._batches if self._batches else 0.0,
+            'avg_encode_ms': 1000 * self._encode_seconds / self._batches if self._batches else 0.0,
+            'avg_queue_wait_ms': 1000 * self._queue_wait_seconds / self._slices_served if self._slices_served else 0.0,
+            'batch_size_histogram': histogram
+        }
+
+
+# Global batcher instance
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,206 @@
+"""Persistent content-hash cache for chunk embeddings"""
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.database import acquire
+from app.core.embedding_batcher import embedding_batcher
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode form and whitespace so trivially different copies share a key"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the normalized text"""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Postgres-backed cache of embeddings keyed by (model name, normalized text hash).
+
+    `embed()` looks up every text, encodes only the misses through the
+    embedding batcher and writes them back. A background task evicts entries
+    by age and keeps the table under a maximum size.
+    """
+
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self._evictor: Optional[asyncio.Task] = None
+
+        # Stats
+        self._lookups = 0
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._evicted = 0
+        self._errors = 0
+
+    async def start(self) -> None:
+        """Start the periodic eviction task"""
+        if not settings.EMBEDDING_CACHE_ENABLED or self._evictor is not None:
+            return
+        self._evictor = asyncio.create_task(self._evict_periodically())
+        logger.info("Embedding cache eviction task started")
+
+    async def stop(self) -> None:
+        """Stop the periodic eviction task"""
+        if self._evictor is None:
+            return
+        self._evictor.cancel()
+        try:
+            await self._evictor
+        except asyncio.CancelledError:
+            pass
+        self._evictor = None
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embeddings for texts, encoding only those not already cached
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            List of embedding vectors, in the same order as `texts`
+        """
+        if not texts:
+            return []
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return await embedding_batcher.embed(texts)
+
+        keys = [text_hash(text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        self._lookups += len(texts)
+
+        try:
+            found = await self._lookup(unique_keys)
+        except Exception as e:
+            # Cache trouble must never block ingestion
+            self._errors += 1
+            logger.warning(f"Embedding cache lookup failed, encoding all texts: {str(e)}")
+            return await embedding_batcher.embed(texts)
+
+        # Encode each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = await embedding_batcher.embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            found.update(computed)
+            try:
+                await self._store(computed)
+            except Exception as e:
+                self._errors += 1
+                logger.warning(f"Failed to write {len(computed)} embeddings to cache: {str(e)}")
+
+        hits = sum(1 for key in keys if key not in missing)
+        self._hits += hits
+        self._misses += len(texts) - hits
+
+        return [found[key] for key in keys]
+
+    async def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        # Touch last_used_at in the same round trip so eviction is LRU-by-age
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE embedding_cache
+                SET last_used_at = NOW()
+                WHERE model_name = $1 AND text_hash = ANY($2::text[])
+                RETURNING text_hash, embedding
+                """,
+                self.model_name,
+                keys
+            )
+        return {row['text_hash']: row['embedding'].tolist() for row in rows}
+
+    async def _store(self, vectors: Dict[str, List[float]]) -> None:
+        async with acquire() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO embedding_cache (model_name, text_hash, embedding)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (model_name, text_hash) DO NOTHING
+                """,
+                [
+                    (self.model_name, key, np.asarray(vector, dtype=np.float32))
+                    for key, vector in vectors.items()
+                ]
+            )
+        self._stored += len(vectors)
+
+    async def evict(self) -> int:
+        """
+        Delete entries unused for longer than the max age, then trim to the max size
+
+        Returns:
+            Number of entries evicted
+        """
+        async with acquire() as conn:
+            status = await conn.execute(
+                """
+                DELETE FROM embedding_cache
+                WHERE last_used_at < NOW() - make_interval(days => $1)
+                """,
+                settings.EMBEDDING_CACHE_MAX_AGE_DAYS
+            )
+            evicted = int(status.split()[-1])
+
+            status = await conn.execute(
+                """
+                DELETE FROM embedding_cache
+                WHERE (model_name, text_hash) IN (
+                    SELECT model_name, text_hash FROM embedding_cache
+                    ORDER BY last_used_at DESC
+                    OFFSET $1
+                )
+                """,
+                settings.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            evicted += int(status.split()[-1])
+
+        self._evicted += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from embedding cache")
+        return evicted
+
+    async def _evict_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.EMBEDDING_CACHE_EVICT_INTERVAL_SECONDS)
+            try:
+                await self.evict()
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Error evicting embedding cache entries: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit-rate and eviction counters"""
+        return {
+            'enabled': settings.EMBEDDING_CACHE_ENABLED,
+            'model_name': self.model_name,
+            'lookups': self._lookups,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / self._lookups if self._lookups else 0.0,
+            'stored': self._stored,
+            'evicted': self._evicted,
+            'errors': self._errors
+        }
+
+
+# Global cache instance
+embedding_cache = EmbeddingCache()
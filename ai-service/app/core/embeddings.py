@@ -104,3 +104,49 @@ def chunk_text_with_metadata(
         result.append((chunk, metadata))
     
     return result
+
+
+class IncrementalChunker:
+    """
+    Chunks text fed piece by piece, emitting each chunk as soon as it is complete
+    
+    Produces the same chunks as chunk_text() over the concatenated input
+    while holding at most one chunk's worth of words.
+    """
+    
+    def __init__(self, chunk_size: int = None, overlap: int = None):
+        self.chunk_size = chunk_size if chunk_size is not None else settings.CHUNK_SIZE
+        overlap = overlap if overlap is not None else settings.CHUNK_OVERLAP
+        self.step = max(1, self.chunk_size - overlap)
+        self._words: List[str] = []
+        self.emitted = 0
+    
+    def feed(self, text: str) -> List[str]:
+        """
+        Add text
+        
+        Returns:
+            Chunks completed by this text
+        """
+        self._words.extend(text.split())
+        chunks = []
+        while len(self._words) >= self.chunk_size:
+            chunks.append(' '.join(self._words[:self.chunk_size]))
+            del self._words[:self.step]
+        self.emitted += len(chunks)
+        return chunks
+    
+    def finish(self) -> List[str]:
+        """
+        Flush the remaining words
+        
+        Returns:
+            The final (shorter) chunks
+        """
+        chunks = [
+            ' '.join(self._words[start:start + self.chunk_size])
+            for start in range(0, len(self._words), self.step)
+        ]
+        self._words = []
+        self.emitted += len(chunks)
+        return chunks
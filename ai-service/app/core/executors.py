@@ -0,0 +1,247 @@
+"""Executor pools for running blocking work off the event loop"""
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pool names
+IO_POOL = 'io'              # MinIO transfers, database calls, file reads
+CPU_POOL = 'cpu'            # Native code that releases the GIL (torch, Whisper, Tesseract, ffmpeg)
+PROCESS_POOL = 'process'    # Pure-Python CPU work (PDF/Office parsing)
+TRANSCRIBE_POOL = 'transcribe'  # Speech-to-text worker processes (each loads its own model)
+
+# Pools whose work counts toward the submitting lane's JOB_LANE_CPU_SLOTS (IO is never limited)
+LANE_LIMITED_POOLS = (CPU_POOL, PROCESS_POOL, TRANSCRIBE_POOL)
+
+
+class _PoolStats:
+    """Submission counters for one pool"""
+    __slots__ = ('submitted', 'completed', 'failed', 'in_flight', 'max_in_flight', 'busy_seconds', 'restarts')
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.busy_seconds = 0.0
+        self.restarts = 0
+
+
+_pools: Dict[str, Executor] = {}
+_stats: Dict[str, _PoolStats] = {name: _PoolStats() for name in (IO_POOL, CPU_POOL, PROCESS_POOL, TRANSCRIBE_POOL)}
+_pools_lock = threading.Lock()
+
+# Ingestion lane of the current task; CPU, process and transcription pool work
+# it submits is limited to that lane's JOB_LANE_CPU_SLOTS
+cpu_lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('cpu_lane', default=None)
+_lane_slots: Dict[str, asyncio.Semaphore] = {}
+_lane_in_flight: Dict[str, int] = {}
+_lane_waits: Dict[str, int] = {}
+
+
+def _pool_size(configured: int, default: int) -> int:
+    return configured if configured and configured > 0 else default
+
+
+def _create_pool(name: str) -> Executor:
+    cpu_count = os.cpu_count() or 1
+
+    if name == IO_POOL:
+        size = _pool_size(settings.IO_THREAD_POOL_SIZE, min(32, cpu_count * 4))
+        return ThreadPoolExecutor(max_workers=size, thread_name_prefix='io-worker')
+    if name == CPU_POOL:
+        size = _pool_size(settings.CPU_THREAD_POOL_SIZE, cpu_count)
+        return ThreadPoolExecutor(max_workers=size, thread_name_prefix='cpu-worker')
+    if name == PROCESS_POOL:
+        size = _pool_size(settings.CPU_PROCESS_POOL_SIZE, max(1, cpu_count - 1))
+        # spawn avoids forking a parent that holds torch/OpenMP thread state
+        return ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context('spawn'))
+    if name == TRANSCRIBE_POOL:
+        # Sized by the transcription parallelism so at most that many models are loaded
+        size = max(1, settings.TRANSCRIBE_PARALLEL_SEGMENTS)
+        return ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context('spawn'))
+
+    raise ValueError(f"Unknown executor pool: {name}")
+
+
+def get_executor(name: str) -> Executor:
+    """
+    Get (or lazily create) an executor pool by name
+
+    Args:
+        name: One of IO_POOL, CPU_POOL, PROCESS_POOL, TRANSCRIBE_POOL
+
+    Returns:
+        Executor instance
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _create_pool(name)
+                _pools[name] = pool
+                logger.info(f"Created {name} executor pool with {pool._max_workers} workers")
+    return pool
+
+
+def _replace_broken_pool(name: str, pool: Executor) -> None:
+    """Swap a process pool whose worker died for a fresh one (once per broken pool)"""
+    with _pools_lock:
+        if _pools.get(name) is not pool:
+            return
+        _stats[name].restarts += 1
+        _pools[name] = _create_pool(name)
+    logger.error(f"A worker of the {name} executor pool died; replaced the pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_lane_slots(lane: str) -> Optional[asyncio.Semaphore]:
+    slots = _lane_slots.get(lane)
+    if slots is None:
+        limit = settings.JOB_LANE_CPU_SLOTS.get(lane, 0)
+        if limit <= 0:
+            return None
+        slots = _lane_slots[lane] = asyncio.Semaphore(limit)
+    return slots
+
+
+@asynccontextmanager
+async def lane_slot(lane: str) -> AsyncIterator[None]:
+    """
+    Hold one of a lane's CPU slots
+
+    For work done on a lane's behalf by a shared task that does not see
+    cpu_lane (e.g. the embedding batcher). Do not submit pool work under
+    cpu_lane = lane while holding it, or the lane can wait on itself.
+    """
+    slots = _get_lane_slots(lane)
+    if slots is None:
+        yield
+        return
+
+    if slots.locked():
+        _lane_waits[lane] = _lane_waits.get(lane, 0) + 1
+    async with slots:
+        _lane_in_flight[lane] = _lane_in_flight.get(lane, 0) + 1
+        try:
+            yield
+        finally:
+            _lane_in_flight[lane] -= 1
+
+
+async def run_in_pool(name: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking callable in the named pool and await its result
+
+    Args:
+        name: Pool name
+        func: Callable to run (must be picklable for the process pool)
+        *args, **kwargs: Arguments passed to func
+
+    Returns:
+        Result of func
+    """
+    lane = cpu_lane.get() if name in LANE_LIMITED_POOLS else None
+    if lane is None:
+        return await _submit(name, func, *args, **kwargs)
+
+    async with lane_slot(lane):
+        return await _submit(name, func, *args, **kwargs)
+
+
+async def _submit(name: str, func: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    executor = get_executor(name)
+    stats = _stats[name]
+
+    call = functools.partial(func, *args, **kwargs) if kwargs else func
+    call_args = () if kwargs else args
+
+    stats.submitted += 1
+    stats.in_flight += 1
+    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+    started = time.perf_counter()
+    try:
+        result = await loop.run_in_executor(executor, call, *call_args)
+        stats.completed += 1
+        return result
+    except BrokenProcessPool:
+        # A crashed worker (OOM kill, segfault) breaks the whole pool; later calls get a new one
+        stats.failed += 1
+        _replace_broken_pool(name, executor)
+        raise
+    except Exception:
+        stats.failed += 1
+        raise
+    finally:
+        stats.in_flight -= 1
+        stats.busy_seconds += time.perf_counter() - started
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking IO (network, database, disk) in the IO thread pool"""
+    return await run_in_pool(IO_POOL, func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Run CPU-heavy native code that releases the GIL in the CPU thread pool"""
+    return await run_in_pool(CPU_POOL, func, *args, **kwargs)
+
+
+async def run_in_process(func: Callable, *args, **kwargs) -> Any:
+    """Run pure-Python CPU work in the process pool (func and args must be picklable)"""
+    return await run_in_pool(PROCESS_POOL, func, *args, **kwargs)
+
+
+async def run_transcription(func: Callable, *args, **kwargs) -> Any:
+    """Run speech-to-text in the transcription worker processes (func and args must be picklable)"""
+    return await run_in_pool(TRANSCRIBE_POOL, func, *args, **kwargs)
+
+
+def get_executor_stats() -> Dict[str, Any]:
+    """Return per-pool sizes and submission counters"""
+    result = {}
+    for name, stats in _stats.items():
+        pool = _pools.get(name)
+        result[name] = {
+            'started': pool is not None,
+            'max_workers': pool._max_workers if pool is not None else None,
+            'submitted': stats.submitted,
+            'completed': stats.completed,
+            'failed': stats.failed,
+            'in_flight': stats.in_flight,
+            'max_in_flight': stats.max_in_flight,
+            'busy_seconds': round(stats.busy_seconds, 3),
+            'restarts': stats.restarts
+        }
+    result['lanes'] = {
+        lane: {
+            'cpu_slots': limit,
+            'in_flight': _lane_in_flight.get(lane, 0),
+            'waited': _lane_waits.get(lane, 0)
+        }
+        for lane, limit in settings.JOB_LANE_CPU_SLOTS.items()
+    }
+    return result
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shut down all created pools"""
+    with _pools_lock:
+        for name, pool in _pools.items():
+            logger.info(f"Shutting down {name} executor pool")
+            pool.shutdown(wait=wait, cancel_futures=True)
+        _pools.clear()
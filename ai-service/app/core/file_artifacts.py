@@ -0,0 +1,253 @@
+"""Per-file summaries, digest embeddings and quizzes precomputed at ingest time"""
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.database import acquire
+from app.core.embedding_batcher import embedding_batcher
+from app.core.embedding_cache import text_hash
+from app.core.job_queue import Job, job_queue
+from app.core.summarizer import summarizer
+
+logger = logging.getLogger(__name__)
+
+BUILD_ARTIFACTS_JOB = 'build_file_artifacts'
+
+
+class FileArtifacts:
+    """
+    Stores a summary and a digest embedding (the embedding of the summary)
+    per file, keyed by file_id and the hash of the file's extracted text.
+
+    Artifacts are built by a queued job after ingestion and rebuilt only
+    when the content hash (or the LLM model) changes. Quizzes generated from
+    a file are stored alongside and dropped whenever the summary is rebuilt.
+
+    Ingested files are rebuilt from their stored chunks, so the ingest
+    pipeline never has to hold a file's full text.
+    """
+
+    def __init__(self):
+        # Stats
+        self._built = 0
+        self._unchanged = 0
+
+    async def schedule(
+        self,
+        file_id: int,
+        user_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        module_id: Optional[int] = None
+    ) -> None:
+        """
+        Queue an artifact build for a file
+
+        Builds run as durable jobs in the llm lane, so they survive restarts
+        and are retried with backoff when the LLM is overloaded.
+        """
+        if not settings.FILE_ARTIFACTS_ENABLED:
+            return
+        try:
+            await job_queue.enqueue(
+                BUILD_ARTIFACTS_JOB,
+                {'file_id': file_id, 'user_id': user_id, 'course_id': course_id, 'module_id': module_id},
+                file_id=file_id,
+                lane='llm'
+            )
+        except Exception as e:
+            # Artifacts are optional; the file itself is already ingested
+            logger.error(f"Failed to queue artifacts for file_id={file_id}: {str(e)}")
+
+    async def load_text(self, file_id: int) -> str:
+        """
+        Rebuild a file's text from its stored chunks
+
+        Chunks are read in insert order and the words each chunk repeats
+        from the previous one (the chunk overlap) are dropped.
+        """
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT chunk_text FROM embeddings WHERE file_id = $1 ORDER BY id",
+                file_id
+            )
+        repeated = settings.CHUNK_SIZE - max(1, settings.CHUNK_SIZE - settings.CHUNK_OVERLAP)
+        words: List[str] = []
+        for index, row in enumerate(rows):
+            chunk_words = row['chunk_text'].split()
+            words.extend(chunk_words if index == 0 else chunk_words[repeated:])
+        return ' '.join(words)
+
+    async def build(
+        self,
+        file_id: int,
+        text: Optional[str] = None,
+        user_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        module_id: Optional[int] = None
+    ) -> bool:
+        """
+        Compute and store the summary and digest embedding for a file
+
+        Args:
+            file_id: ID of the file
+            text: Full extracted text of the file (default: rebuilt from its stored chunks)
+            user_id: Optional user ID
+            course_id: Optional course ID
+            module_id: Optional module ID
+
+        Returns:
+            False if stored artifacts already match the content
+        """
+        if text is None:
+            text = await self.load_text(file_id)
+        if not text:
+            logger.warning(f"No stored content for file_id={file_id}, skipping artifacts")
+            return False
+        content_hash = text_hash(text)
+        model_name = settings.OLLAMA_MODEL
+
+        async with acquire() as conn:
+            unchanged = await conn.fetchval(
+                """
+                SELECT 1 FROM file_artifacts
+                WHERE file_id = $1 AND content_hash = $2 AND model_name = $3
+                """,
+                file_id, content_hash, model_name
+            )
+        if unchanged:
+            self._unchanged += 1
+            logger.info(f"Artifacts for file_id={file_id} are up to date")
+            return False
+
+        # Ingest-time work yields to interactive requests in the LLM scheduler
+        summary = await summarizer.summarize(text, priority='batch', user_id=user_id)
+        digest = (await embedding_batcher.embed([summary]))[0]
+
+        async with acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO file_artifacts
+                    (file_id, content_hash, model_name, user_id, course_id, module_id, summary, digest_embedding)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                ON CONFLICT (file_id) DO UPDATE SET
+                    content_hash = EXCLUDED.content_hash,
+                    model_name = EXCLUDED.model_name,
+                    user_id = EXCLUDED.user_id,
+                    course_id = EXCLUDED.course_id,
+                    module_id = EXCLUDED.module_id,
+                    summary = EXCLUDED.summary,
+                    digest_embedding = EXCLUDED.digest_embedding,
+                    quiz = NULL,
+                    updated_at = NOW()
+                """,
+                file_id, content_hash, model_name, user_id, course_id, module_id,
+                summary, np.asarray(digest, dtype=np.float32)
+            )
+
+        self._built += 1
+        logger.info(f"Stored artifacts for file_id={file_id}")
+        return True
+
+    async def get(self, file_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Load stored artifacts for a file
+
+        Returns:
+            Dict with content_hash, summary, quiz, ... or None if not built yet
+        """
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT file_id, content_hash, model_name, user_id, course_id, module_id,
+                       summary, quiz, updated_at
+                FROM file_artifacts
+                WHERE file_id = $1
+                """,
+                file_id
+            )
+        return dict(row) if row else None
+
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        limit: int = 5,
+        user_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        module_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank files by the similarity of their digest embedding to a query
+
+        Args:
+            query_embedding: Embedding of the query
+            limit: Maximum number of files
+            user_id: Optional filter by user_id
+            course_id: Optional filter by course_id
+            module_id: Optional filter by module_id
+
+        Returns:
+            Files with summary and similarity, most similar first
+        """
+        args: List[Any] = [np.asarray(query_embedding, dtype=np.float32)]
+        where_clauses = []
+        for column, value in (('user_id', user_id), ('course_id', course_id), ('module_id', module_id)):
+            if value is not None:
+                args.append(value)
+                where_clauses.append(f"{column} = ${len(args)}")
+        where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+        args.append(limit)
+
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                f"""
+                SELECT file_id, user_id, course_id, module_id, summary,
+                       1 - (digest_embedding <=> $1) AS similarity
+                FROM file_artifacts
+                {where_sql}
+                ORDER BY digest_embedding <=> $1
+                LIMIT ${len(args)}
+                """,
+                *args
+            )
+        return [dict(row, similarity=float(row['similarity'])) for row in rows]
+
+    async def store_quiz(self, file_id: int, content_hash: str, questions: List[Dict]) -> None:
+        """Store quiz questions generated for the given content version"""
+        async with acquire() as conn:
+            await conn.execute(
+                "UPDATE file_artifacts SET quiz = $3 WHERE file_id = $1 AND content_hash = $2",
+                file_id, content_hash, questions
+            )
+
+    async def delete(self, file_id: int) -> None:
+        """Delete stored artifacts for a file"""
+        async with acquire() as conn:
+            await conn.execute("DELETE FROM file_artifacts WHERE file_id = $1", file_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return build counters (queued and failed builds are under job_queue)"""
+        return {
+            'enabled': settings.FILE_ARTIFACTS_ENABLED,
+            'built': self._built,
+            'unchanged': self._unchanged
+        }
+
+
+# Global artifacts instance
+file_artifacts = FileArtifacts()
+
+
+async def run_build_artifacts_job(job: Job) -> Dict[str, Any]:
+    """Job handler: build the summary and digest embedding of an ingested file"""
+    payload = job.payload
+    await job.report(0.1, "summarizing")
+    built = await file_artifacts.build(
+        payload['file_id'],
+        user_id=payload.get('user_id'),
+        course_id=payload.get('course_id'),
+        module_id=payload.get('module_id')
+    )
+    return {'built': built}
+
+
+job_queue.register(BUILD_ARTIFACTS_JOB, run_build_artifacts_job)
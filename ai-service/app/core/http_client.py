@@ -0,0 +1,202 @@
+"""Application-scoped HTTP client shared by the LLM client and callbacks"""
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlparse
+import aiohttp
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# Methods that are safe to resend after the request may have reached the server
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Failures to connect: nothing was sent, so any method can be retried
+CONNECT_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+class _HostStats:
+    __slots__ = ('requests', 'retries', 'failures', 'connections_created', 'connections_reused')
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+
+class HttpClient:
+    """
+    One pooled aiohttp session for the whole service.
+
+    Keeps connections alive per host, applies default timeouts and retries
+    connection errors and retryable statuses with exponential backoff.
+    Timeouts are never retried, and errors after the connection was made
+    are only retried for idempotent methods, so a slow or half-sent POST
+    (e.g. an LLM generation) is not run again.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self._hosts: Dict[str, _HostStats] = {}
+
+    def _host_stats(self, host: Optional[str]) -> _HostStats:
+        host = host or 'unknown'
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = _HostStats()
+        return stats
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self._host_stats(context.trace_request_ctx.get('host')).connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._host_stats(context.trace_request_ctx.get('host')).connections_reused += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def start(self) -> None:
+        """Create the shared session"""
+        async with self._lock:
+            if self._session is not None and not self._session.closed:
+                return
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_LIMIT,
+                limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.HTTP_DEFAULT_TIMEOUT,
+                    sock_connect=settings.HTTP_CONNECT_TIMEOUT
+                ),
+                trace_configs=[self._trace_config()]
+            )
+            logger.info(
+                f"HTTP client started (limit={settings.HTTP_POOL_LIMIT}, "
+                f"limit_per_host={settings.HTTP_POOL_LIMIT_PER_HOST})"
+            )
+
+    async def close(self) -> None:
+        """Close the shared session and its connections"""
+        async with self._lock:
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+                logger.info("HTTP client closed")
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Not started via app startup (e.g. scripts) - start lazily
+            await self.start()
+        return self._session
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        json: Any = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Send a request, retrying connection errors and retryable statuses
+
+        Args:
+            method: HTTP method
+            url: Target URL
+            json: Optional JSON body
+            timeout: Optional total timeout in seconds (default: the session's HTTP_DEFAULT_TIMEOUT)
+            retries: Optional retry count (default from settings)
+
+        Yields:
+            The response; its body has not been read yet
+        """
+        session = await self._get_session()
+        host = urlparse(url).hostname
+        stats = self._host_stats(host)
+        retries = settings.HTTP_MAX_RETRIES if retries is None else retries
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        request_kwargs = {'json': json, 'trace_request_ctx': {'host': host}}
+        if timeout is not None:
+            # Passing timeout=None would disable the session's default timeout
+            request_kwargs['timeout'] = aiohttp.ClientTimeout(
+                total=timeout,
+                sock_connect=settings.HTTP_CONNECT_TIMEOUT
+            )
+
+        attempt = 0
+        while True:
+            stats.requests += 1
+            try:
+                response = await session.request(method, url, **request_kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                retryable = isinstance(e, CONNECT_ERRORS) or (
+                    idempotent and not isinstance(e, asyncio.TimeoutError)
+                )
+                if not retryable or attempt >= retries:
+                    stats.failures += 1
+                    raise
+                logger.warning(f"HTTP {method} {url} failed ({type(e).__name__}), retrying")
+            else:
+                if response.status not in RETRYABLE_STATUSES or attempt >= retries:
+                    break
+                logger.warning(f"HTTP {method} {url} returned {response.status}, retrying")
+                response.release()
+
+            attempt += 1
+            stats.retries += 1
+            backoff = settings.HTTP_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
+            await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+
+        try:
+            yield response
+        finally:
+            response.release()
+
+    def post(self, url: str, **kwargs):
+        """Shorthand for request('POST', ...)"""
+        return self.request('POST', url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return per-host request, retry and connection-reuse counters"""
+        connector = self._session.connector if self._session is not None else None
+        hosts = {}
+        for host, stats in self._hosts.items():
+            acquired = stats.connections_created + stats.connections_reused
+            hosts[host] = {
+                'requests': stats.requests,
+                'retries': stats.retries,
+                'failures': stats.failures,
+                'connections_created': stats.connections_created,
+                'connections_reused': stats.connections_reused,
+                'reuse_rate': stats.connections_reused / acquired if acquired else 0.0
+            }
+        return {
+            'started': self._session is not None and not self._session.closed,
+            'limit': settings.HTTP_POOL_LIMIT,
+            'limit_per_host': settings.HTTP_POOL_LIMIT_PER_HOST,
+            'idle_connections': (
+                sum(len(conns) for conns in connector._conns.values()) if connector is not None else 0
+            ),
+            'hosts': hosts
+        }
+
+
+# Global client instance
+http_client = HttpClient()
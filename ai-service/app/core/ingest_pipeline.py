@@ -0,0 +1,153 @@
+"""Streaming ingestion: extract -> chunk -> embed -> insert as overlapping stages"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.core.answer_cache import answer_cache
+from app.core.embedding_cache import embedding_cache
+from app.core.embeddings import IncrementalChunker
+from app.core.job_queue import job_queue
+from app.core.vector_store import insert_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+def segment_text(segment: Dict[str, Any]) -> str:
+    """Segment text prefixed with its page, slide or time range for better context"""
+    text = segment.get('text', '')
+    if not text:
+        return ''
+    if 'page_number' in segment:
+        return f"[Page {segment['page_number']}] {text}"
+    if 'slide_number' in segment:
+        return f"[Slide {segment['slide_number']}] {text}"
+    if 'start_time' in segment:
+        return f"[{segment['start_time']:.1f}s - {segment['end_time']:.1f}s] {text}"
+    return text
+
+
+def segment_position(segment: Dict[str, Any]) -> Optional[float]:
+    """
+    How far into its file a segment is (0-1), from the position hints
+    extractors put in its metadata; None when the file gives no hint
+    """
+    metadata = segment.get('metadata') or {}
+    if metadata.get('read_fraction') is not None:
+        return metadata['read_fraction']
+    for position, total in (('page_number', 'total_pages'), ('slide_number', 'total_slides')):
+        if metadata.get(total) and segment.get(position) is not None:
+            return min(1.0, segment[position] / metadata[total])
+    if metadata.get('total_duration') and segment.get('end_time') is not None:
+        return min(1.0, segment['end_time'] / metadata['total_duration'])
+    return None
+
+
+async def ingest_segments(
+    segments: AsyncIterator[Dict[str, Any]],
+    file_id: int,
+    user_id: Optional[int] = None,
+    course_id: Optional[int] = None,
+    module_id: Optional[int] = None,
+    metadata: Optional[Dict] = None,
+    on_progress: Optional[Callable[[int, int, Optional[float]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    Chunk, embed and store segments as they are extracted
+
+    Extraction and chunking, embedding, and inserts run as separate tasks
+    connected by queues of INGEST_QUEUE_DEPTH batches, so every stage works
+    on a different batch at the same time and memory is bounded by the
+    queues rather than the document. Each batch is searchable as soon as it
+    is inserted.
+
+    Args:
+        segments: Extracted segments ({text, page_number | slide_number | start_time, ...})
+        file_id: ID of the file
+        user_id: Optional user ID for scoping
+        course_id: Optional course ID for scoping
+        module_id: Optional module ID for scoping
+        metadata: Metadata stored on every row
+        on_progress: Optional coroutine called after each insert with (segments read,
+            chunks stored, fraction of the file extracted or None if unknown)
+
+    Returns:
+        Dict with segments, chunks, embeddings_created and first_batch_seconds
+    """
+    batch_size = settings.EMBEDDING_INSERT_BATCH_SIZE
+    chunk_batches: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.INGEST_QUEUE_DEPTH))
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.INGEST_QUEUE_DEPTH))
+    chunker = IncrementalChunker()
+    started = time.perf_counter()
+    stats = {'segments': 0, 'chunks': 0, 'embeddings_created': 0, 'first_batch_seconds': None}
+    position: Dict[str, Optional[float]] = {'extracted': None}
+
+    async def extract() -> None:
+        pending: List[str] = []
+        async for segment in segments:
+            text = segment_text(segment)
+            if not text:
+                continue
+            stats['segments'] += 1
+            fraction = segment_position(segment)
+            if fraction is not None:
+                position['extracted'] = fraction
+            pending.extend(chunker.feed(text))
+            while len(pending) >= batch_size:
+                await chunk_batches.put(pending[:batch_size])
+                del pending[:batch_size]
+        pending.extend(chunker.finish())
+        for start in range(0, len(pending), batch_size):
+            await chunk_batches.put(pending[start:start + batch_size])
+        stats['chunks'] = chunker.emitted
+        await chunk_batches.put(_DONE)
+
+    async def embed() -> None:
+        while True:
+            batch = await chunk_batches.get()
+            if batch is _DONE:
+                await embedded.put(_DONE)
+                return
+            # Shared embedding lane; taken per batch so a long file never holds it while extracting
+            async with job_queue.stage('embedding'):
+                embeddings = await embedding_cache.embed(batch)
+            await embedded.put((batch, embeddings))
+
+    async def insert() -> None:
+        while True:
+            item = await embedded.get()
+            if item is _DONE:
+                return
+            batch, embeddings = item
+            stats['embeddings_created'] += await insert_embeddings(
+                file_id, batch, embeddings, user_id, course_id, module_id, metadata
+            )
+            if stats['first_batch_seconds'] is None:
+                stats['first_batch_seconds'] = round(time.perf_counter() - started, 3)
+            if on_progress is not None:
+                await on_progress(stats['segments'], stats['embeddings_created'], position['extracted'])
+
+    tasks = [asyncio.create_task(stage()) for stage in (extract, embed, insert)]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if hasattr(segments, 'aclose'):
+            await segments.aclose()
+        # Answers citing the file are stale, also when only part of it was stored
+        if stats['embeddings_created']:
+            await answer_cache.bump_files([file_id])
+
+    logger.info(
+        f"Ingested file_id={file_id}: {stats['segments']} segments, {stats['chunks']} chunks, "
+        f"first batch searchable after {stats['first_batch_seconds']}s"
+    )
+    return stats
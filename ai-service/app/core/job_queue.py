@@ -0,0 +1,528 @@
+"""Durable background job queue backed by Postgres (SELECT ... FOR UPDATE SKIP LOCKED)"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+from app.core.config import settings
+from app.core.database import acquire
+from app.core.executors import cpu_lane, lane_slot
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed')
+
+# Worker lanes: jobs are routed to a lane by media class so short documents
+# never queue behind long transcriptions, and LLM-bound follow-up work (e.g.
+# file summaries) never holds an ingestion worker. 'embedding' is a stage
+# lane: jobs of any lane enter it (via JobQueue.stage) for their embedding step.
+JOB_LANES = ('text', 'ocr', 'media', 'llm')
+STAGE_LANES = ('embedding',)
+LANES = JOB_LANES + STAGE_LANES
+
+# Recent queue waits kept per lane for latency percentiles
+LATENCY_WINDOW = 512
+
+JOB_COLUMNS = """
+    id, kind, lane, file_id, payload, status, attempts, max_attempts, progress, stage,
+    error, result, run_after, created_at, started_at, finished_at
+"""
+
+
+class PermanentJobError(Exception):
+    """Raised by handlers for failures a retry cannot fix (e.g. unsupported input)"""
+
+
+class Job:
+    """A claimed job, handed to its handler"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id = row['id']
+        self.kind = row['kind']
+        self.lane = row['lane']
+        self.file_id = row['file_id']
+        self.payload = row['payload']
+        self.attempts = row['attempts']
+        self.max_attempts = row['max_attempts']
+        # Lease token of this claim; every update of the job is guarded by it
+        self.locked_by = row['locked_by']
+        self.lease_lost = False
+
+    async def report(self, progress: float, stage: Optional[str] = None) -> None:
+        """
+        Record progress (0-1) and the current stage
+
+        Also renews the job's lease, so long steps should report regularly.
+        Ignored once the lease was lost to another worker.
+        """
+        async with acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE ingest_jobs
+                SET progress = $2, stage = COALESCE($3, stage), locked_at = NOW(), updated_at = NOW()
+                WHERE id = $1 AND locked_by = $4
+                """,
+                self.id, max(0.0, min(1.0, progress)), stage, self.locked_by
+            )
+
+
+def lane_workers(lane: str) -> int:
+    """Configured worker (or stage slot) count for a lane, at least 1"""
+    return max(1, int(settings.JOB_LANE_WORKERS.get(lane, 1)))
+
+
+def latency_stats(waits: Deque[float]) -> Dict[str, Any]:
+    """Count, mean, p95 and max of recent queue waits in seconds"""
+    if not waits:
+        return {'samples': 0, 'avg_seconds': 0.0, 'p95_seconds': 0.0, 'max_seconds': 0.0}
+    ordered = sorted(waits)
+    return {
+        'samples': len(ordered),
+        'avg_seconds': round(sum(ordered) / len(ordered), 3),
+        'p95_seconds': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max_seconds': round(ordered[-1], 3)
+    }
+
+
+JobHandler = Callable[[Job], Awaitable[Optional[Dict[str, Any]]]]
+TransitionListener = Callable[[Job, str, Optional[str]], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Jobs live in the ingest_jobs table, so they survive restarts and can be
+    processed by any replica.
+
+    Workers claim the oldest runnable job with FOR UPDATE SKIP LOCKED, hold a
+    lease renewed by progress reports and a heartbeat, and retry failures with
+    exponential backoff up to max_attempts. Jobs whose lease expired (the
+    worker died) are claimed again while attempts remain, and failed
+    otherwise.
+
+    Each lane has its own workers (JOB_LANE_WORKERS) and CPU pool slots
+    (JOB_LANE_CPU_SLOTS). A worker with nothing to do in its lane steals the
+    oldest runnable job of another lane, except each lane's first worker,
+    which stays dedicated so its lane is never blocked by stolen work.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._listeners: Dict[str, TransitionListener] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._running = False
+        self._stage_slots: Dict[str, asyncio.Semaphore] = {}
+        self._last_sweep = 0.0
+
+        # Stats
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=LATENCY_WINDOW) for lane in LANES}
+        self._lane_busy: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._stolen = 0
+        self._claimed = 0
+        self._completed = 0
+        self._retried = 0
+        self._leases_lost = 0
+        self._heartbeat_errors = 0
+        self._failed = 0
+        self._busy = 0
+
+    def register(self, kind: str, handler: JobHandler, on_transition: Optional[TransitionListener] = None) -> None:
+        """
+        Register the handler for a job kind
+
+        Args:
+            kind: Job kind
+            handler: Coroutine run with the claimed Job; its return value is stored as the result
+            on_transition: Optional coroutine called with (job, status, error) on
+                running / completed / failed transitions
+        """
+        self._handlers[kind] = handler
+        if on_transition is not None:
+            self._listeners[kind] = on_transition
+
+    async def start(self) -> None:
+        """Start the worker pool"""
+        if self._running:
+            return
+        self._running = True
+        self._workers = [
+            asyncio.create_task(self._work(lane, index))
+            for lane in JOB_LANES
+            for index in range(lane_workers(lane))
+        ]
+        logger.info(
+            f"Job queue started with {len(self._workers)} workers "
+            f"({', '.join(f'{lane}={lane_workers(lane)}' for lane in JOB_LANES)}; {self.worker_id})"
+        )
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running are re-claimed after their lease expires"""
+        self._running = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        file_id: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        lane: str = 'text'
+    ) -> Dict[str, Any]:
+        """
+        Add a job to the queue
+
+        Args:
+            kind: Job kind (a registered handler)
+            payload: JSON-serializable handler input
+            file_id: Optional file the job belongs to
+            max_attempts: Override JOB_MAX_ATTEMPTS
+            lane: Worker lane, one of JOB_LANES
+
+        Returns:
+            The new job row
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        if lane not in JOB_LANES:
+            raise ValueError(f"Unknown job lane: {lane}")
+
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                f"""
+                INSERT INTO ingest_jobs (kind, lane, file_id, payload, max_attempts)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING {JOB_COLUMNS}
+                """,
+                kind, lane, file_id, payload, max_attempts or settings.JOB_MAX_ATTEMPTS
+            )
+        self._wakeup.set()
+        logger.info(f"Enqueued {kind} job {row['id']} in lane {lane} for file_id={file_id}")
+        return dict(row)
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Load a job by id"""
+        async with acquire() as conn:
+            row = await conn.fetchrow(f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE id = $1", job_id)
+        return dict(row) if row else None
+
+    async def list_for_file(self, file_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs for a file"""
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE file_id = $1 ORDER BY id DESC LIMIT $2",
+                file_id, limit
+            )
+        return [dict(row) for row in rows]
+
+    @asynccontextmanager
+    async def stage(self, lane: str) -> AsyncIterator[None]:
+        """
+        Run a step of a job inside a stage lane (e.g. embedding)
+
+        Limits how many jobs run the step at once to the lane's
+        JOB_LANE_WORKERS and records the wait as that lane's queue latency.
+        The step also holds one of the lane's JOB_LANE_CPU_SLOTS: its CPU
+        work (e.g. encoding) runs in shared tasks such as the embedding
+        batcher, which never see this task's cpu_lane.
+        """
+        slots = self._stage_slots.get(lane)
+        if slots is None:
+            slots = self._stage_slots[lane] = asyncio.Semaphore(lane_workers(lane))
+
+        started = time.perf_counter()
+        async with slots:
+            self._waits[lane].append(time.perf_counter() - started)
+            self._lane_busy[lane] += 1
+            # Pool work submitted directly from the step is covered by the held slot,
+            # not charged again to the job's own lane
+            token = cpu_lane.set(None)
+            try:
+                async with lane_slot(lane):
+                    yield
+            finally:
+                cpu_lane.reset(token)
+                self._lane_busy[lane] -= 1
+
+    async def _claim(self, lanes: List[str]) -> Optional[Job]:
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE ingest_jobs
+                SET status = 'running',
+                    attempts = attempts + 1,
+                    locked_by = $1,
+                    locked_at = NOW(),
+                    started_at = NOW(),
+                    updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM ingest_jobs
+                    WHERE lane = ANY($3::text[])
+                      AND ((status = 'queued' AND run_after <= NOW())
+                           OR (status = 'running' AND locked_at < NOW() - make_interval(secs => $2)
+                               AND attempts < max_attempts))
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, lane, file_id, payload, attempts, max_attempts, locked_by,
+                          EXTRACT(EPOCH FROM NOW() - GREATEST(run_after, created_at)) AS waited
+                """,
+                # A fresh lease token per claim, so sibling workers of this process are told apart
+                f"{self.worker_id}:{uuid.uuid4().hex}",
+                float(settings.JOB_LEASE_SECONDS),
+                lanes
+            )
+        if row is None:
+            return None
+        self._waits[row['lane']].append(max(0.0, float(row['waited'])))
+        return Job(dict(row))
+
+    async def _sweep_expired(self) -> None:
+        """
+        Fail running jobs whose lease expired after their last attempt
+
+        Such a job took its worker down with it (e.g. OOM-killed on a huge
+        file) on every attempt, so it is never re-claimed and _fail never runs.
+        """
+        if time.monotonic() - self._last_sweep < settings.JOB_LEASE_SECONDS:
+            return
+        self._last_sweep = time.monotonic()
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE ingest_jobs
+                SET status = 'failed',
+                    error = 'Worker lost the job (lease expired) on its last attempt',
+                    locked_by = NULL, finished_at = NOW(), updated_at = NOW()
+                WHERE status = 'running'
+                  AND locked_at < NOW() - make_interval(secs => $1)
+                  AND attempts >= max_attempts
+                RETURNING id, kind, lane, file_id, payload, attempts, max_attempts, locked_by, error
+                """,
+                float(settings.JOB_LEASE_SECONDS)
+            )
+        for row in rows:
+            job = Job(dict(row))
+            self._failed += 1
+            logger.error(f"Job {job.id} failed permanently: {row['error']}")
+            await self._notify(job, 'failed', row['error'])
+
+    async def _heartbeat(self, job: Job, work: asyncio.Task) -> None:
+        """Renew the job's lease until cancelled; cancel the handler if the lease was lost"""
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                async with acquire() as conn:
+                    status = await conn.execute(
+                        "UPDATE ingest_jobs SET locked_at = NOW() WHERE id = $1 AND locked_by = $2",
+                        job.id, job.locked_by
+                    )
+            except Exception as e:
+                # A missed tick is fine; the lease outlasts three of them
+                self._heartbeat_errors += 1
+                logger.warning(f"Heartbeat for job {job.id} failed: {str(e)}")
+                continue
+            if self._lease_lost(job, status):
+                job.lease_lost = True
+                work.cancel()
+                return
+
+    async def _notify(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        listener = self._listeners.get(job.kind)
+        if listener is None:
+            return
+        try:
+            await listener(job, status, error)
+        except Exception as e:
+            logger.warning(f"Transition listener failed for job {job.id}: {str(e)}")
+
+    def _lease_lost(self, job: Job, status: str) -> bool:
+        """True (and logged) when an UPDATE guarded by locked_by matched no row"""
+        if status.endswith(' 0'):
+            self._leases_lost += 1
+            logger.warning(f"Job {job.id} lease was lost to another worker; dropping this attempt's outcome")
+            return True
+        return False
+
+    async def _finish(self, job: Job, result: Optional[Dict[str, Any]]) -> None:
+        async with acquire() as conn:
+            status = await conn.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = 'completed', progress = 1, result = $2, error = NULL,
+                    locked_by = NULL, finished_at = NOW(), updated_at = NOW()
+                WHERE id = $1 AND locked_by = $3
+                """,
+                job.id, result, job.locked_by
+            )
+        if self._lease_lost(job, status):
+            return
+        self._completed += 1
+        await self._notify(job, 'completed')
+
+    async def _fail(self, job: Job, error: str, permanent: bool) -> None:
+        if not permanent and job.attempts < job.max_attempts:
+            backoff = settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (job.attempts - 1))
+            async with acquire() as conn:
+                status = await conn.execute(
+                    """
+                    UPDATE ingest_jobs
+                    SET status = 'queued', error = $2, locked_by = NULL,
+                        run_after = NOW() + make_interval(secs => $3), updated_at = NOW()
+                    WHERE id = $1 AND locked_by = $4
+                    """,
+                    job.id, error, float(backoff), job.locked_by
+                )
+            if self._lease_lost(job, status):
+                return
+            self._retried += 1
+            logger.warning(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {backoff:.0f}s: {error}")
+            return
+
+        async with acquire() as conn:
+            status = await conn.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = 'failed', error = $2, locked_by = NULL, finished_at = NOW(), updated_at = NOW()
+                WHERE id = $1 AND locked_by = $3
+                """,
+                job.id, error, job.locked_by
+            )
+        if self._lease_lost(job, status):
+            return
+        self._failed += 1
+        logger.error(f"Job {job.id} failed permanently: {error}")
+        await self._notify(job, 'failed', error)
+
+    async def _run(self, job: Job) -> None:
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            await self._fail(job, f"No handler registered for job kind: {job.kind}", permanent=True)
+            return
+
+        await self._notify(job, 'running')
+        # The handler runs in its own task so a lost lease can stop it
+        work = asyncio.create_task(handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, work))
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            if job.lease_lost:
+                # Another worker owns the job now; drop this attempt
+                return
+            # Shutdown: leave the job running; its lease expires and it is re-claimed
+            raise
+        except PermanentJobError as e:
+            await self._fail(job, str(e), permanent=True)
+        except Exception as e:
+            await self._fail(job, str(e), permanent=False)
+        else:
+            await self._finish(job, result)
+        finally:
+            heartbeat.cancel()
+
+    async def _work(self, lane: str, index: int) -> None:
+        name = f"{lane}-{index}"
+        # The first worker of each lane never steals
+        steal_from = [other for other in JOB_LANES if other != lane] if index > 0 and settings.JOB_WORK_STEALING else []
+
+        while self._running:
+            try:
+                await self._sweep_expired()
+                job = await self._claim([lane])
+                if job is None and steal_from:
+                    job = await self._claim(steal_from)
+                    if job is not None:
+                        self._stolen += 1
+                        logger.info(f"Job worker {name} stole job {job.id} from lane {job.lane}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {name} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                # Idle: wait for a local enqueue or poll for jobs from other replicas
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._claimed += 1
+            self._busy += 1
+            self._lane_busy[job.lane] += 1
+            # CPU pool work is charged to the job's lane, also when stolen
+            token = cpu_lane.set(job.lane)
+            started = time.perf_counter()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {name} crashed on job {job.id}: {str(e)}")
+            finally:
+                cpu_lane.reset(token)
+                self._busy -= 1
+                self._lane_busy[job.lane] -= 1
+            logger.info(f"Job {job.id} ({job.kind}) finished in {time.perf_counter() - started:.1f}s")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Return worker counters, job counts by status and per-lane queue latency"""
+        counts = {status: 0 for status in JOB_STATUSES}
+        lanes = {
+            lane: {
+                'workers': lane_workers(lane),
+                'busy': self._lane_busy[lane],
+                'queued': 0,
+                'oldest_queued_seconds': 0.0,
+                'queue_latency': latency_stats(self._waits[lane])
+            }
+            for lane in LANES
+        }
+        try:
+            async with acquire() as conn:
+                for row in await conn.fetch("SELECT status, count(*) AS n FROM ingest_jobs GROUP BY status"):
+                    counts[row['status']] = row['n']
+                for row in await conn.fetch(
+                    """
+                    SELECT lane, count(*) AS n,
+                           EXTRACT(EPOCH FROM NOW() - min(GREATEST(run_after, created_at))) AS oldest
+                    FROM ingest_jobs
+                    WHERE status = 'queued' AND run_after <= NOW()
+                    GROUP BY lane
+                    """
+                ):
+                    if row['lane'] in lanes:
+                        lanes[row['lane']]['queued'] = row['n']
+                        lanes[row['lane']]['oldest_queued_seconds'] = round(float(row['oldest']), 3)
+        except Exception as e:
+            logger.warning(f"Failed to count jobs: {str(e)}")
+        return {
+            'worker_id': self.worker_id,
+            'workers': len(self._workers),
+            'busy_workers': self._busy,
+            'work_stealing': settings.JOB_WORK_STEALING,
+            'stolen': self._stolen,
+            'claimed': self._claimed,
+            'completed': self._completed,
+            'retried': self._retried,
+            'leases_lost': self._leases_lost,
+            'heartbeat_errors': self._heartbeat_errors,
+            'failed': self._failed,
+            'jobs_by_status': counts,
+            'lanes': lanes
+        }
+
+
+# Global queue instance
+job_queue = JobQueue()
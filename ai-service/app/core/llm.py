@@ -1,6 +1,10 @@
-import aiohttp
-from typing import List, Dict, Optional, Any
+from contextlib import nullcontext
+from typing import AsyncIterator, List, Dict, Optional, Any, Tuple
 from app.core.config import settings
+from app.core.context_packer import context_packer
+from app.core.http_client import http_client
+from app.core.llm_scheduler import llm_scheduler
+from app.core.quiz_parser import QUIZ_SCHEMA, QuizStreamParser
 import logging
 import json
 
@@ -12,7 +16,10 @@ async def query_ollama(
     model: str = None,
     system_prompt: Optional[str] = None,
     temperature: float = 0.7,
-    max_tokens: int = 2000
+    max_tokens: int = 2000,
+    priority: str = 'chat',
+    user_id: Optional[int] = None,
+    format: Optional[Any] = None
 ) -> str:
     """
     Send a prompt to Ollama API and get a response
@@ -23,6 +30,9 @@ async def query_ollama(
         system_prompt: Optional system prompt
         temperature: Sampling temperature
         max_tokens: Maximum tokens to generate
+        priority: Scheduling class (chat, summary, quiz, batch)
+        user_id: Requesting user, for fair queuing
+        format: Optional output constraint ("json" or a JSON schema)
         
     Returns:
         Generated text response
@@ -46,8 +56,12 @@ async def query_ollama(
         if system_prompt:
             payload["system"] = system_prompt
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
+        if format is not None:
+            payload["format"] = format
+        
+        # Wait for a generation slot; raises LLMOverloadedError when overloaded
+        async with llm_scheduler.slot(priority, user_id):
+            async with http_client.post(url, json=payload, timeout=settings.OLLAMA_TIMEOUT) as response:
                 if response.status != 200:
                     error_text = await response.text()
                     raise Exception(f"Ollama API error: {error_text}")
@@ -59,11 +73,122 @@ async def query_ollama(
         raise
 
 
+async def stream_ollama(
+    prompt: str,
+    model: str = None,
+    system_prompt: Optional[str] = None,
+    temperature: float = 0.7,
+    max_tokens: int = 2000,
+    priority: str = 'chat',
+    user_id: Optional[int] = None,
+    format: Optional[Any] = None,
+    slot_held: bool = False
+) -> AsyncIterator[str]:
+    """
+    Send a prompt to Ollama and yield response tokens as they are generated
+    
+    Closing the generator early (e.g. the client disconnected) drops the
+    connection to Ollama, which aborts the generation.
+    
+    Args:
+        prompt: User prompt
+        model: Model name (default from settings)
+        system_prompt: Optional system prompt
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        priority: Scheduling class (chat, summary, quiz, batch)
+        user_id: Requesting user, for fair queuing
+        format: Optional output constraint ("json" or a JSON schema)
+        slot_held: The caller already holds a scheduler slot and releases it
+        
+    Yields:
+        Generated text fragments
+    """
+    if model is None:
+        model = settings.OLLAMA_MODEL
+    
+    url = f"{settings.ollama_base_url}/api/generate"
+    
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "options": {
+            "temperature": temperature,
+            "num_predict": max_tokens
+        }
+    }
+    
+    if system_prompt:
+        payload["system"] = system_prompt
+    
+    if format is not None:
+        payload["format"] = format
+    
+    # The slot is held until the stream finishes or is closed
+    async with (nullcontext() if slot_held else llm_scheduler.slot(priority, user_id)):
+        async with http_client.post(url, json=payload, timeout=settings.OLLAMA_TIMEOUT) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Ollama API error: {error_text}")
+            
+            done = False
+            try:
+                # Ollama streams one JSON object per line
+                async for line in response.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise Exception(f"Ollama API error: {chunk['error']}")
+                    if chunk.get('response'):
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        done = True
+                        break
+            finally:
+                if not done:
+                    # Abandoned mid-generation: close the socket so Ollama stops
+                    response.close()
+
+
+RAG_SYSTEM_PROMPT = """You are a helpful AI assistant for an e-learning platform. 
+Your task is to answer questions based on the provided context from course materials.
+Always cite your sources by mentioning the file_id when referencing information.
+If the context doesn't contain enough information to answer the question, say so clearly."""
+
+
+def build_rag_prompt(query: str, context_chunks: List[Dict]) -> Tuple[str, str]:
+    """
+    Build the RAG prompt and system prompt for a query and its retrieved context
+    
+    Args:
+        query: User query
+        context_chunks: List of relevant chunks from vector search
+        
+    Returns:
+        Tuple of (prompt, system_prompt)
+    """
+    # Format context with sources
+    context_text = format_context_with_sources(context_chunks)
+    
+    prompt = f"""Context from course materials:
+{context_text}
+
+Question: {query}
+
+Please provide a comprehensive answer based on the context above. Include citations to the source materials (file_id) when relevant."""
+    
+    return prompt, RAG_SYSTEM_PROMPT
+
+
 async def query_ollama_with_context(
     query: str,
     context_chunks: List[Dict],
     model: str = None,
-    temperature: float = 0.7
+    temperature: float = 0.7,
+    user_id: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Query Ollama with retrieved context from vector search
@@ -73,48 +198,87 @@ async def query_ollama_with_context(
         context_chunks: List of relevant chunks from vector search
         model: Model name
         temperature: Sampling temperature
+        user_id: Requesting user, for fair LLM queuing
         
     Returns:
         Dict with answer and sources
     """
     try:
-        # Format context with sources
-        context_text = format_context_with_sources(context_chunks)
-        
-        # Build prompt
-        system_prompt = """You are a helpful AI assistant for an e-learning platform. 
-Your task is to answer questions based on the provided context from course materials.
-Always cite your sources by mentioning the file_id when referencing information.
-If the context doesn't contain enough information to answer the question, say so clearly."""
-        
-        prompt = f"""Context from course materials:
-{context_text}
-
-Question: {query}
-
-Please provide a comprehensive answer based on the context above. Include citations to the source materials (file_id) when relevant."""
+        # Fit the retrieved chunks into the model's context token budget
+        packed = context_packer.pack(context_chunks, model)
+        prompt, system_prompt = build_rag_prompt(query, packed['chunks'])
         
         # Query Ollama
         answer = await query_ollama(
             prompt=prompt,
             model=model,
             system_prompt=system_prompt,
-            temperature=temperature
+            temperature=temperature,
+            user_id=user_id
         )
         
         # Extract unique sources
-        sources = extract_sources(context_chunks)
+        sources = extract_sources(packed['chunks'])
         
         return {
             'answer': answer,
             'sources': sources,
-            'context_used': len(context_chunks)
+            'context_used': len(packed['chunks']),
+            'context_stats': packed['stats']
         }
     except Exception as e:
         logger.error(f"Error in query_ollama_with_context: {str(e)}")
         raise
 
 
+async def stream_ollama_with_context(
+    query: str,
+    context_chunks: List[Dict],
+    model: str = None,
+    temperature: float = 0.7,
+    user_id: Optional[int] = None,
+    slot_held: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of query_ollama_with_context
+    
+    Args:
+        query: User query
+        context_chunks: List of relevant chunks from vector search
+        model: Model name
+        temperature: Sampling temperature
+        user_id: Requesting user, for fair LLM queuing
+        slot_held: The caller already holds a scheduler slot and releases it
+        
+    Yields:
+        Events: {'event': 'sources', ...} first, then {'event': 'token', 'text': ...}
+        for each fragment, then {'event': 'done', ...}
+    """
+    packed = context_packer.pack(context_chunks, model)
+    prompt, system_prompt = build_rag_prompt(query, packed['chunks'])
+    
+    yield {
+        'event': 'sources',
+        'sources': extract_sources(packed['chunks']),
+        'context_used': len(packed['chunks']),
+        'context_stats': packed['stats']
+    }
+    
+    tokens = 0
+    async for text in stream_ollama(
+        prompt=prompt,
+        model=model,
+        system_prompt=system_prompt,
+        temperature=temperature,
+        user_id=user_id,
+        slot_held=slot_held
+    ):
+        tokens += 1
+        yield {'event': 'token', 'text': text}
+    
+    yield {'event': 'done', 'tokens': tokens}
+
+
 def format_context_with_sources(chunks: List[Dict]) -> str:
     """
     Format context chunks with source information
@@ -160,13 +324,20 @@ def extract_sources(chunks: List[Dict]) -> List[Dict]:
     return list(sources.values())
 
 
-async def generate_summary(text: str, model: str = None) -> str:
+async def generate_summary(
+    text: str,
+    model: str = None,
+    priority: str = 'summary',
+    user_id: Optional[int] = None
+) -> str:
     """
     Generate a summary of the given text
     
     Args:
         text: Text to summarize
         model: Model name
+        priority: LLM scheduling class
+        user_id: Requesting user, for fair LLM queuing
         
     Returns:
         Summary text
@@ -185,25 +356,63 @@ Summary:"""
         prompt=prompt,
         model=model,
         system_prompt=system_prompt,
-        temperature=0.5
+        temperature=0.5,
+        priority=priority,
+        user_id=user_id
     )
 
 
-async def generate_quiz_questions(
-    text: str,
-    num_questions: int = 5,
-    model: str = None
-) -> List[Dict]:
+async def combine_summaries(
+    summaries: List[str],
+    model: str = None,
+    priority: str = 'summary',
+    user_id: Optional[int] = None
+) -> str:
     """
-    Generate quiz questions from text content
+    Combine summaries of consecutive sections into one summary
+    
+    Args:
+        summaries: Partial summaries, in document order
+        model: Model name
+        priority: LLM scheduling class
+        user_id: Requesting user, for fair LLM queuing
+        
+    Returns:
+        Combined summary text
+    """
+    system_prompt = "You are a helpful assistant that creates concise summaries of educational content."
+    
+    sections = "\n\n".join(f"Section {idx}:\n{summary}" for idx, summary in enumerate(summaries, 1))
+    
+    prompt = f"""The following are summaries of consecutive sections of the same educational content.
+Combine them into one comprehensive summary. Keep the key concepts, main ideas and important details,
+remove repetition, and preserve the order in which topics appear.
+
+Section summaries:
+{sections}
+
+Summary:"""
+    
+    return await query_ollama(
+        prompt=prompt,
+        model=model,
+        system_prompt=system_prompt,
+        temperature=0.5,
+        priority=priority,
+        user_id=user_id
+    )
+
+
+def build_quiz_prompt(text: str, num_questions: int) -> Tuple[str, str]:
+    """
+    Build the quiz generation prompt and system prompt
     
     Args:
         text: Source text
         num_questions: Number of questions to generate
-        model: Model name
         
     Returns:
-        List of quiz questions with options and answers
+        Tuple of (prompt, system_prompt)
     """
     system_prompt = "You are an expert educator creating quiz questions from educational content."
     
@@ -215,31 +424,97 @@ For each question, provide:
 4. A brief explanation
 
 Format your response as JSON with this structure:
-[
-  {{
-    "question": "Question text?",
-    "options": {{"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"}},
-    "correct_answer": "A",
-    "explanation": "Explanation text"
-  }}
-]
+{{
+  "questions": [
+    {{
+      "question": "Question text?",
+      "options": {{"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"}},
+      "correct_answer": "A",
+      "explanation": "Explanation text"
+    }}
+  ]
+}}
 
 Content:
 {text}
 
 Quiz Questions (JSON format):"""
     
-    response = await query_ollama(
+    return prompt, system_prompt
+
+
+async def stream_quiz_questions(
+    text: str,
+    num_questions: int = 5,
+    model: str = None,
+    priority: str = 'quiz',
+    user_id: Optional[int] = None
+) -> AsyncIterator[Dict]:
+    """
+    Generate quiz questions, yielding each one as soon as it is complete
+    
+    Output is constrained to QUIZ_SCHEMA and parsed incrementally, so a
+    truncated or slightly malformed response still yields the questions
+    completed before the problem.
+    
+    Args:
+        text: Source text
+        num_questions: Number of questions to generate
+        model: Model name
+        priority: LLM scheduling class
+        user_id: Requesting user, for fair LLM queuing
+        
+    Yields:
+        Quiz questions with options and answers
+    """
+    prompt, system_prompt = build_quiz_prompt(text, num_questions)
+    parser = QuizStreamParser()
+    produced = 0
+    
+    fragments = stream_ollama(
         prompt=prompt,
         model=model,
         system_prompt=system_prompt,
-        temperature=0.7
+        temperature=0.7,
+        priority=priority,
+        user_id=user_id,
+        format=QUIZ_SCHEMA
     )
-    
     try:
-        # Try to parse JSON response
-        questions = json.loads(response)
-        return questions
-    except json.JSONDecodeError:
-        logger.warning("Failed to parse quiz questions as JSON")
-        return []
+        async for fragment in fragments:
+            for question in parser.feed(fragment):
+                produced += 1
+                yield question
+                if produced >= num_questions:
+                    return
+    finally:
+        await fragments.aclose()
+        if parser.skipped:
+            logger.warning(f"Skipped {parser.skipped} malformed quiz questions")
+
+
+async def generate_quiz_questions(
+    text: str,
+    num_questions: int = 5,
+    model: str = None,
+    priority: str = 'quiz',
+    user_id: Optional[int] = None
+) -> List[Dict]:
+    """
+    Generate quiz questions from text content
+    
+    Args:
+        text: Source text
+        num_questions: Number of questions to generate
+        model: Model name
+        priority: LLM scheduling class
+        user_id: Requesting user, for fair LLM queuing
+        
+    Returns:
+        List of quiz questions with options and answers
+    """
+    return [
+        question async for question in stream_quiz_questions(
+            text, num_questions, model=model, priority=priority, user_id=user_id
+        )
+    ]
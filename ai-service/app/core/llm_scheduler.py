@@ -0,0 +1,218 @@
+"""Admission control and priority scheduling for LLM generations"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first
+PRIORITIES = ('chat', 'summary', 'quiz', 'batch')
+
+# Queue bucket shared by requests without a user_id; only LLM_MAX_QUEUE_DEPTH bounds it
+ANONYMOUS = 'anonymous'
+
+
+class LLMOverloadedError(Exception):
+    """Raised when a generation is rejected instead of queued or run"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('future', 'user_key', 'priority', 'enqueued_at')
+
+    def __init__(self, user_key: Hashable, priority: str):
+        self.future = asyncio.get_running_loop().create_future()
+        self.user_key = user_key
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+
+
+class _PriorityStats:
+    __slots__ = ('admitted', 'rejected', 'timed_out', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class LLMScheduler:
+    """
+    Bounds concurrent generations and decides who runs next.
+
+    Waiting requests are served strictly by priority class (chat > summary >
+    quiz > batch) and round-robin across users within a class, so one user
+    queueing many requests cannot starve others. Requests are rejected with
+    429 when their user already has too many queued (requests without a user
+    share one bucket that is exempt), with 503 when the queue is full, and
+    with 503 when they wait longer than their class's limit.
+    """
+
+    def __init__(self):
+        self._in_flight = 0
+        self._queues: Dict[str, "OrderedDict[Hashable, Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        self._queued = 0
+        self._queued_per_user: Dict[Hashable, int] = {}
+        self._stats = {priority: _PriorityStats() for priority in PRIORITIES}
+        self._max_in_flight_seen = 0
+
+    @property
+    def max_concurrency(self) -> int:
+        return max(1, settings.LLM_MAX_CONCURRENCY)
+
+    def _queue_timeout(self, priority: str) -> float:
+        return float(settings.LLM_QUEUE_TIMEOUT_SECONDS.get(priority, 30))
+
+    def _admit(self, priority: str, waited: float) -> None:
+        self._in_flight += 1
+        self._max_in_flight_seen = max(self._max_in_flight_seen, self._in_flight)
+        stats = self._stats[priority]
+        stats.admitted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        self._queues[waiter.priority].setdefault(waiter.user_key, deque()).append(waiter)
+        self._queued += 1
+        self._queued_per_user[waiter.user_key] = self._queued_per_user.get(waiter.user_key, 0) + 1
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        users = self._queues[waiter.priority]
+        waiters = users.get(waiter.user_key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user_key]
+        self._queued -= 1
+        remaining = self._queued_per_user[waiter.user_key] - 1
+        if remaining:
+            self._queued_per_user[waiter.user_key] = remaining
+        else:
+            del self._queued_per_user[waiter.user_key]
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            if users:
+                # Round-robin: take the head user's oldest request, then rotate the user to the back
+                user_key, waiters = next(iter(users.items()))
+                waiter = waiters[0]
+                self._dequeue(waiter)
+                if user_key in users:
+                    users.move_to_end(user_key)
+                return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self._admit(waiter.priority, time.perf_counter() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    async def acquire(self, priority: str = 'chat', user_id: Optional[Any] = None) -> None:
+        """
+        Wait for a generation slot
+
+        Args:
+            priority: One of PRIORITIES
+            user_id: Requesting user, for fair queuing (None = shared anonymous bucket)
+
+        Raises:
+            LLMOverloadedError: If the request is rejected or waits too long
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unsupported LLM priority: {priority}")
+        user_key = user_id if user_id is not None else ANONYMOUS
+        stats = self._stats[priority]
+
+        if self._in_flight < self.max_concurrency and not self._queued:
+            self._admit(priority, 0.0)
+            return
+
+        if user_key != ANONYMOUS and self._queued_per_user.get(user_key, 0) >= settings.LLM_MAX_QUEUED_PER_USER:
+            stats.rejected += 1
+            raise LLMOverloadedError("Too many pending generations for this user", 429)
+        if self._queued >= settings.LLM_MAX_QUEUE_DEPTH:
+            stats.rejected += 1
+            raise LLMOverloadedError("LLM queue is full", 503)
+
+        waiter = _Waiter(user_key, priority)
+        self._enqueue(waiter)
+        timeout = self._queue_timeout(priority)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted just as the timeout fired
+                return
+            self._dequeue(waiter)
+            waiter.future.cancel()
+            stats.timed_out += 1
+            raise LLMOverloadedError(
+                f"Timed out after {timeout:.0f}s waiting for an LLM slot", 503, retry_after=int(timeout) or 1
+            )
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted but the caller went away: hand the slot on
+                self.release()
+            else:
+                self._dequeue(waiter)
+                waiter.future.cancel()
+            raise
+
+    def release(self) -> None:
+        """Give a generation slot back and admit the next waiter"""
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = 'chat', user_id: Optional[Any] = None) -> AsyncIterator[None]:
+        """Hold a generation slot for the duration of the block"""
+        await self.acquire(priority, user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return in-flight, queue depth and per-priority wait statistics"""
+        priorities = {}
+        for priority, stats in self._stats.items():
+            priorities[priority] = {
+                'queued': sum(len(waiters) for waiters in self._queues[priority].values()),
+                'admitted': stats.admitted,
+                'rejected': stats.rejected,
+                'timed_out': stats.timed_out,
+                'avg_wait_ms': stats.total_wait / stats.admitted * 1000 if stats.admitted else 0.0,
+                'max_wait_ms': stats.max_wait * 1000,
+                'queue_timeout_seconds': self._queue_timeout(priority)
+            }
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self._in_flight,
+            'max_in_flight_seen': self._max_in_flight_seen,
+            'queued': self._queued,
+            'queued_users': len(self._queued_per_user),
+            'priorities': priorities
+        }
+
+
+# Global scheduler instance
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,245 @@
+"""Shared Tesseract OCR engine: preprocessing, single-pass OCR and batch / multi-frame OCR"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from PIL import Image
+import pytesseract
+from app.core.config import settings
+from app.core.executors import run_cpu, run_in_process
+
+logger = logging.getLogger(__name__)
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """Gray level that best separates foreground from background (Otsu's method)"""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    weight_bg = 0
+    sum_bg = 0
+    best = 0.0
+    threshold = 127
+
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += level * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best = between
+            threshold = level
+    return threshold
+
+
+def prepare_image(image: Image.Image, max_dimension: int = None, binarize: bool = None) -> Image.Image:
+    """
+    Preprocess an image for OCR
+
+    Flattens transparency onto white, converts to grayscale, downscales so
+    the longest side is at most max_dimension and optionally binarizes.
+
+    Args:
+        image: Source image
+        max_dimension: Longest side in pixels (default OCR_MAX_DIMENSION, 0 = no limit)
+        binarize: Apply an Otsu threshold (default OCR_BINARIZE)
+
+    Returns:
+        Grayscale image ready for Tesseract
+    """
+    max_dimension = settings.OCR_MAX_DIMENSION if max_dimension is None else max_dimension
+    binarize = settings.OCR_BINARIZE if binarize is None else binarize
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, rgba)
+    gray = image.convert('L')
+
+    width, height = gray.size
+    if max_dimension and max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        gray = gray.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+    if binarize:
+        threshold = _otsu_threshold(gray.histogram())
+        gray = gray.point(lambda value: 255 if value > threshold else 0)
+    return gray
+
+
+def ocr_image(image: Image.Image, prepare: bool = True) -> Dict[str, Any]:
+    """
+    OCR one image with a single image_to_data pass (blocking)
+
+    Text is rebuilt from the word boxes (lines joined by newlines,
+    paragraphs by blank lines), so no second Tesseract run is needed for
+    the confidence.
+
+    Args:
+        image: Image to read
+        prepare: Run prepare_image first
+
+    Returns:
+        Dict with text, confidence (mean word confidence, None without words),
+        words and ocr_seconds
+    """
+    started = time.perf_counter()
+    if prepare:
+        image = prepare_image(image)
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for index, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word:
+            continue
+        key = (data['page_num'][index], data['block_num'][index], data['par_num'][index], data['line_num'][index])
+        lines.setdefault(key, []).append(word)
+        confidence = float(data['conf'][index])
+        if confidence > 0:
+            confidences.append(confidence)
+
+    parts = []
+    previous_paragraph = None
+    for key, words in lines.items():
+        paragraph = key[:3]
+        if parts:
+            parts.append('\n\n' if paragraph != previous_paragraph else '\n')
+        parts.append(' '.join(words))
+        previous_paragraph = paragraph
+
+    return {
+        'text': ''.join(parts),
+        'confidence': round(sum(confidences) / len(confidences), 2) if confidences else None,
+        'words': sum(len(words) for words in lines.values()),
+        'ocr_seconds': round(time.perf_counter() - started, 4)
+    }
+
+
+def _ocr_file_frames(file_path: str, frame_indices: List[int]) -> List[Dict[str, Any]]:
+    """Blocking OCR of selected frames of an image file, run in the CPU or process pool"""
+    results = []
+    with Image.open(file_path) as image:
+        for frame_index in frame_indices:
+            image.seek(frame_index)
+            result = ocr_image(image.copy())
+            result['frame_index'] = frame_index
+            results.append(result)
+    return results
+
+
+def _ocr_prepared(images: List[Image.Image]) -> List[Dict[str, Any]]:
+    """Blocking OCR of already prepared images, one process pool task per batch"""
+    return [ocr_image(image, prepare=False) for image in images]
+
+
+def _prepare_images(images: List[Image.Image]) -> List[Image.Image]:
+    """Blocking prepare_image over a batch"""
+    return [prepare_image(image) for image in images]
+
+
+def _decode_frames(image: Image.Image, start: int, stop: int) -> List[Image.Image]:
+    """Blocking decode of frames [start, stop) of an open image, prepared for OCR"""
+    frames = []
+    for frame_index in range(start, stop):
+        # Seeking forward from the previous frame decodes each frame once
+        image.seek(frame_index)
+        frames.append(prepare_image(image))
+    return frames
+
+
+async def ocr_images(images: List[Image.Image], prepared: bool = False) -> List[Dict[str, Any]]:
+    """
+    Batch OCR of in-memory images (e.g. video frames) across the process pool
+
+    Images are sent OCR_FRAMES_PER_TASK per task, prepared here first so
+    only the small grayscale images are pickled to the workers.
+
+    Args:
+        images: Images to read
+        prepared: The images already went through prepare_image
+
+    Returns:
+        One OCR result per image, in order
+    """
+    if not prepared:
+        images = await run_cpu(_prepare_images, images)
+    batch_size = max(1, settings.OCR_FRAMES_PER_TASK)
+    shards = await asyncio.gather(*(
+        run_in_process(_ocr_prepared, images[start:start + batch_size])
+        for start in range(0, len(images), batch_size)
+    ))
+    return [result for shard in shards for result in shard]
+
+
+def image_info(file_path: str) -> Dict[str, Any]:
+    """Blocking read of an image's size, format and frame count"""
+    with Image.open(file_path) as image:
+        return {
+            'width': image.size[0],
+            'height': image.size[1],
+            'format': image.format,
+            'frames': getattr(image, 'n_frames', 1)
+        }
+
+
+async def ocr_file(
+    file_path: str,
+    max_frames: Optional[int] = None,
+    info: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    OCR every frame of an image file
+
+    Single images run in the CPU pool. Multi-page TIFFs and multi-frame GIFs
+    are decoded once, front to back, and OCRed across the process pool in
+    batches of OCR_FRAMES_PER_TASK frames, with a bounded number of batches
+    in flight.
+
+    Args:
+        file_path: Path to the image
+        max_frames: At most this many frames (default OCR_MAX_FRAMES)
+        info: image_info() of the file, if already read
+
+    Returns:
+        One OCR result per frame, in frame order, with frame_index
+    """
+    if info is None:
+        info = await run_cpu(image_info, file_path)
+    frames = min(info['frames'], max_frames or settings.OCR_MAX_FRAMES)
+    if info['frames'] > frames:
+        logger.warning(f"OCR limited to the first {frames} of {info['frames']} frames: {file_path}")
+
+    if frames <= 1:
+        return await run_cpu(_ocr_file_frames, file_path, [0])
+
+    batch_size = max(1, settings.OCR_FRAMES_PER_TASK)
+    window = os.cpu_count() or 1
+    results: List[Dict[str, Any]] = []
+    batches: Deque[asyncio.Task] = deque()
+    image = await run_cpu(Image.open, file_path)
+    try:
+        for start in range(0, frames, batch_size):
+            decoded = await run_cpu(_decode_frames, image, start, min(frames, start + batch_size))
+            batches.append(asyncio.create_task(ocr_images(decoded, prepared=True)))
+            if len(batches) >= window:
+                results.extend(await batches.popleft())
+        while batches:
+            results.extend(await batches.popleft())
+    finally:
+        for batch in batches:
+            batch.cancel()
+        await asyncio.gather(*batches, return_exceptions=True)
+        image.close()
+
+    for frame_index, result in enumerate(results):
+        result['frame_index'] = frame_index
+    return results
@@ -0,0 +1,195 @@
+"""In-process LRU caches for query embeddings and retrieval results"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which predicate(key, value) is true"""
+        stale = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in stale:
+            del self._data[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+
+class _CachedResults:
+    """Retrieval rows plus what is needed to invalidate them precisely"""
+    __slots__ = ('rows', 'scope', 'file_ids', 'user_ids')
+
+    def __init__(self, rows: List[Dict], scope: Dict[str, Any]):
+        self.rows = rows
+        self.scope = scope
+        self.file_ids = {row['file_id'] for row in rows}
+        self.user_ids = {row['user_id'] for row in rows}
+
+
+def scope_matches(scope: Dict[str, Any], file_id: int, user_id, course_id, module_id) -> bool:
+    """Whether rows with these ids could be returned by a query with this scope"""
+    if scope['user_id'] is not None and scope['user_id'] != user_id:
+        return False
+    if scope['course_id'] is not None and scope['course_id'] != course_id:
+        return False
+    if scope['module_id'] is not None and scope['module_id'] != module_id:
+        return False
+    if scope['file_ids'] and file_id not in scope['file_ids']:
+        return False
+    return True
+
+
+class RetrievalCache:
+    """
+    Two-level cache in front of `search_similar`.
+
+    Level 1 maps normalized query text to its embedding, skipping the model.
+    Level 2 maps (embedding, scope filters, limit) to result rows, skipping
+    pgvector. Level 2 is invalidated when a cited file or user is deleted and
+    when new embeddings land in a matching scope. The caches are per process,
+    so the TTL bounds staleness across uvicorn workers.
+    """
+
+    def __init__(self):
+        self.embeddings = TTLCache(
+            settings.QUERY_EMBEDDING_CACHE_SIZE,
+            settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS
+        )
+        self.results = TTLCache(
+            settings.RETRIEVAL_CACHE_SIZE,
+            settings.RETRIEVAL_CACHE_TTL_SECONDS
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return settings.QUERY_CACHE_ENABLED
+
+    @staticmethod
+    def _results_key(embedding: np.ndarray, scope: Dict[str, Any], limit: int) -> Hashable:
+        digest = hashlib.blake2b(embedding.tobytes(), digest_size=16).digest()
+        file_ids = tuple(sorted(scope['file_ids'])) if scope['file_ids'] else None
+        return (
+            digest, scope['user_id'], scope['course_id'], scope['module_id'],
+            file_ids, scope.get('mode'), limit
+        )
+
+    def get_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        return self.embeddings.get(normalize_text(query))
+
+    def put_query_embedding(self, query: str, embedding: np.ndarray) -> None:
+        if self.enabled:
+            self.embeddings.set(normalize_text(query), embedding)
+
+    def get_results(self, embedding: np.ndarray, scope: Dict[str, Any], limit: int) -> Optional[List[Dict]]:
+        if not self.enabled:
+            return None
+        cached = self.results.get(self._results_key(embedding, scope, limit))
+        if cached is None:
+            return None
+        # Callers may mutate rows; hand out copies
+        return [dict(row) for row in cached.rows]
+
+    def put_results(self, embedding: np.ndarray, scope: Dict[str, Any], limit: int, rows: List[Dict]) -> None:
+        if self.enabled:
+            self.results.set(
+                self._results_key(embedding, scope, limit),
+                _CachedResults([dict(row) for row in rows], scope)
+            )
+
+    def invalidate_file(self, file_id: int) -> int:
+        """Drop results that cite a deleted file"""
+        return self.results.invalidate_where(lambda _, cached: file_id in cached.file_ids)
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drop results that cite rows owned by a deleted user"""
+        return self.results.invalidate_where(lambda _, cached: user_id in cached.user_ids)
+
+    def invalidate_new_rows(
+        self,
+        file_id: int,
+        user_id: Optional[int],
+        course_id: Optional[int],
+        module_id: Optional[int]
+    ) -> int:
+        """Drop results whose scope could now include newly stored rows"""
+        return self.results.invalidate_where(
+            lambda _, cached: scope_matches(cached.scope, file_id, user_id, course_id, module_id)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'query_embeddings': self.embeddings.get_stats(),
+            'results': self.results.get_stats()
+        }
+
+
+# Global cache instance
+retrieval_cache = RetrievalCache()
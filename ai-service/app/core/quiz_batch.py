@@ -0,0 +1,136 @@
+"""Course-wide quiz generation: one generation per module, run in parallel and deduplicated"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.context_packer import estimate_tokens
+from app.core.database import acquire
+from app.core.embedding_batcher import embedding_batcher
+from app.core.llm import stream_quiz_questions
+
+logger = logging.getLogger(__name__)
+
+# Chunks sampled per module when no stored file summaries exist
+MODULE_SAMPLE_CHUNKS = 16
+
+
+async def load_module_sources(course_id: int) -> Dict[int, str]:
+    """
+    Source text per module of a course
+
+    Uses the file summaries stored at ingest where available, otherwise the
+    module's first chunks; each source is clipped to QUIZ_SOURCE_MAX_TOKENS.
+    """
+    sources: Dict[int, List[str]] = {}
+    async with acquire() as conn:
+        for row in await conn.fetch(
+            """
+            SELECT module_id, summary FROM file_artifacts
+            WHERE course_id = $1 AND module_id IS NOT NULL
+            ORDER BY module_id, file_id
+            """,
+            course_id
+        ):
+            sources.setdefault(row['module_id'], []).append(row['summary'])
+
+        modules = await conn.fetch(
+            "SELECT DISTINCT module_id FROM embeddings WHERE course_id = $1 AND module_id IS NOT NULL",
+            course_id
+        )
+        for row in modules:
+            if row['module_id'] in sources:
+                continue
+            chunks = await conn.fetch(
+                """
+                SELECT chunk_text FROM embeddings
+                WHERE course_id = $1 AND module_id = $2
+                ORDER BY file_id, id
+                LIMIT $3
+                """,
+                course_id, row['module_id'], MODULE_SAMPLE_CHUNKS
+            )
+            sources[row['module_id']] = [chunk['chunk_text'] for chunk in chunks]
+
+    max_chars = settings.QUIZ_SOURCE_MAX_TOKENS * 4
+    clipped = {}
+    for module_id, parts in sorted(sources.items()):
+        text = '\n\n'.join(parts)
+        if estimate_tokens(text) > settings.QUIZ_SOURCE_MAX_TOKENS:
+            text = text[:max_chars]
+        clipped[module_id] = text
+    return clipped
+
+
+async def stream_course_quiz(
+    course_id: int,
+    num_questions: int = 5,
+    user_id: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate questions for every module of a course in parallel
+
+    Questions are yielded as soon as they are parsed, minus those whose
+    embedding is within QUIZ_DEDUPE_THRESHOLD (cosine) of one already sent.
+
+    Args:
+        course_id: Course to generate questions for
+        num_questions: Questions per module
+        user_id: Requesting user, for fair LLM queuing
+
+    Yields:
+        Events: {'event': 'question', 'module_id', 'question'} per question,
+        {'event': 'module_done', ...} or {'event': 'module_error', ...} per
+        module, then {'event': 'done', ...}
+    """
+    sources = await load_module_sources(course_id)
+    queue: asyncio.Queue = asyncio.Queue()
+    # Fan out no wider than the scheduler admits
+    limit = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENCY))
+
+    async def generate(module_id: int, text: str) -> None:
+        count = 0
+        try:
+            async with limit:
+                async for question in stream_quiz_questions(
+                    text, num_questions, priority='batch', user_id=user_id
+                ):
+                    count += 1
+                    await queue.put({'event': 'question', 'module_id': module_id, 'question': question})
+            await queue.put({'event': 'module_done', 'module_id': module_id, 'generated': count})
+        except Exception as e:
+            logger.error(f"Error generating quiz for module_id={module_id}: {str(e)}")
+            await queue.put({'event': 'module_error', 'module_id': module_id, 'detail': str(e)})
+
+    tasks = [asyncio.create_task(generate(module_id, text)) for module_id, text in sources.items() if text]
+    accepted: List[np.ndarray] = []
+    sent = 0
+    duplicates = 0
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            event = await queue.get()
+            if event['event'] != 'question':
+                remaining -= 1
+                yield event
+                continue
+
+            embedding = np.asarray((await embedding_batcher.embed([event['question']['question']]))[0], dtype=np.float32)
+            norm = np.linalg.norm(embedding)
+            if norm:
+                embedding = embedding / norm
+            if accepted and float(np.max(np.stack(accepted) @ embedding)) >= settings.QUIZ_DEDUPE_THRESHOLD:
+                duplicates += 1
+                continue
+
+            accepted.append(embedding)
+            sent += 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    logger.info(f"Generated {sent} quiz questions for course_id={course_id} ({duplicates} duplicates dropped)")
+    yield {'event': 'done', 'modules': len(tasks), 'questions': sent, 'duplicates': duplicates}
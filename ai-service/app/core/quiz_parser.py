@@ -0,0 +1,147 @@
+"""Output schema and tolerant incremental parser for generated quiz questions"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OPTION_KEYS = ('A', 'B', 'C', 'D')
+
+# Passed to Ollama as `format` to constrain decoding to this shape
+QUIZ_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'questions': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'question': {'type': 'string'},
+                    'options': {
+                        'type': 'object',
+                        'properties': {key: {'type': 'string'} for key in OPTION_KEYS},
+                        'required': list(OPTION_KEYS)
+                    },
+                    'correct_answer': {'type': 'string', 'enum': list(OPTION_KEYS)},
+                    'explanation': {'type': 'string'}
+                },
+                'required': ['question', 'options', 'correct_answer', 'explanation']
+            }
+        }
+    },
+    'required': ['questions']
+}
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+def normalize_question(item: Any) -> Optional[Dict[str, Any]]:
+    """
+    Validate a parsed object as a quiz question and coerce it to the canonical shape
+
+    Accepts options as a list or dict and answers like "B) ...". Returns None
+    for objects that are not usable questions.
+    """
+    if not isinstance(item, dict):
+        return None
+    question = item.get('question')
+    options = item.get('options')
+    if not isinstance(question, str) or not question.strip():
+        return None
+
+    if isinstance(options, list):
+        options = dict(zip(OPTION_KEYS, options))
+    if not isinstance(options, dict) or len(options) < 2:
+        return None
+    options = {str(key).strip().upper()[:1]: str(value) for key, value in options.items()}
+
+    answer = str(item.get('correct_answer', '')).strip().upper()[:1]
+    if answer not in options:
+        return None
+
+    return {
+        'question': question.strip(),
+        'options': options,
+        'correct_answer': answer,
+        'explanation': str(item.get('explanation') or '')
+    }
+
+
+class QuizStreamParser:
+    """
+    Extracts complete question objects from (possibly streamed) model output.
+
+    Tracks brace depth outside of strings and tries to decode every object as
+    it closes, so questions are available before the response is finished and
+    a truncated or slightly malformed response still yields the questions
+    that were completed. Wrapping (an object, a bare array, code fences) is
+    ignored.
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0
+        self._starts: List[int] = []
+        self._in_string = False
+        self._escape = False
+        self.skipped = 0
+
+    def feed(self, fragment: str) -> List[Dict[str, Any]]:
+        """
+        Add output text
+
+        Returns:
+            Questions completed by this fragment
+        """
+        self._text += fragment
+        questions = []
+
+        while self._pos < len(self._text):
+            char = self._text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._starts.append(self._pos)
+            elif char == '}' and self._starts:
+                start = self._starts.pop()
+                question = self._decode(self._text[start:self._pos + 1])
+                if question is not None:
+                    questions.append(question)
+            self._pos += 1
+
+        if not self._starts:
+            # Nothing open: drop consumed text
+            self._text = ''
+            self._pos = 0
+        return questions
+
+    def _decode(self, candidate: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(candidate)
+        except json.JSONDecodeError:
+            try:
+                item = json.loads(_TRAILING_COMMA.sub(r'\1', candidate))
+            except json.JSONDecodeError:
+                self.skipped += 1
+                return None
+
+        # Nested option objects and the outer wrapper are not questions
+        if not isinstance(item, dict) or 'question' not in item:
+            return None
+        question = normalize_question(item)
+        if question is None:
+            self.skipped += 1
+        return question
+
+
+def parse_quiz_questions(text: str) -> List[Dict[str, Any]]:
+    """Parse every complete question in a full model response"""
+    return QuizStreamParser().feed(text)
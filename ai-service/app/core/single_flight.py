@@ -0,0 +1,100 @@
+"""Single-flight coalescing of identical concurrent calls"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from app.core.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same
+    key await the in-flight call and share its result (or exception).
+
+    The call is cancelled only when every caller waiting on it has gone away.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+
+        # Stats
+        self._calls = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._max_waiters = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `func()` unless a call with the same key is already in flight
+
+        Args:
+            key: Hashable identity of the call
+            func: Zero-argument coroutine function performing the call
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        self._calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            self._executions += 1
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self._coalesced += 1
+
+        flight.waiters += 1
+        self._max_waiters = max(self._max_waiters, flight.waiters)
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return call, execution and coalescing counters"""
+        return {
+            'in_flight': len(self._flights),
+            'calls': self._calls,
+            'executions': self._executions,
+            'coalesced': self._coalesced,
+            'coalesced_rate': self._coalesced / self._calls if self._calls else 0.0,
+            'max_waiters': self._max_waiters
+        }
+
+
+def chat_flight_key(
+    query: str,
+    user_id: Optional[int],
+    course_id: Optional[int],
+    module_id: Optional[int],
+    file_ids: Optional[List[int]],
+    **options: Any
+) -> Hashable:
+    """Key identical chat requests: normalized query, retrieval scope and generation options"""
+    return (
+        normalize_text(query),
+        user_id,
+        course_id,
+        module_id,
+        tuple(sorted(set(file_ids))) if file_ids else None,
+        tuple(sorted(options.items()))
+    )
+
+
+# Global coalescer for /api/chat/query
+chat_single_flight = SingleFlight('chat')
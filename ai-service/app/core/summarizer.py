@@ -0,0 +1,206 @@
+"""Hierarchical (map-reduce) summarization of long content"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.context_packer import estimate_tokens
+from app.core.database import acquire
+from app.core.embedding_cache import normalize_text
+from app.core.embeddings import chunk_text
+from app.core.llm import generate_summary, combine_summaries
+
+logger = logging.getLogger(__name__)
+
+MAP = 'map'
+REDUCE = 'reduce'
+
+
+def summary_hash(kind: str, sections: List[str]) -> str:
+    """SHA-256 of the step kind and its normalized input sections"""
+    digest = hashlib.sha256(kind.encode('utf-8'))
+    for section in sections:
+        digest.update(b'\0')
+        digest.update(normalize_text(section).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _group_for_reduce(summaries: List[str]) -> List[List[str]]:
+    """Group consecutive partial summaries so each reduce prompt fits the token budget"""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for summary in summaries:
+        cost = estimate_tokens(summary)
+        # Every group takes at least two summaries so each level shrinks the list
+        if len(current) >= 2 and used + cost > settings.SUMMARY_REDUCE_MAX_TOKENS:
+            groups.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += cost
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+class Summarizer:
+    """
+    Summarizes text directly when it fits one prompt, otherwise map-reduce:
+    split on chunk_text boundaries, summarize the sections concurrently
+    (bounded by the LLM concurrency limit) and combine partial summaries
+    level by level until one remains.
+
+    Every map and reduce result is cached in Postgres by (model, content
+    hash), so unchanged sections are never summarized twice.
+    """
+
+    def __init__(self):
+        # Stats
+        self._requests = 0
+        self._direct = 0
+        self._map_calls = 0
+        self._reduce_calls = 0
+        self._max_levels = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_errors = 0
+
+    async def summarize(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        priority: str = 'summary',
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        Summarize text of any length
+
+        Args:
+            text: Text to summarize
+            model: Model name (default from settings)
+            priority: LLM scheduling class
+            user_id: Requesting user, for fair LLM queuing
+
+        Returns:
+            Summary text
+        """
+        model = model or settings.OLLAMA_MODEL
+        self._requests += 1
+
+        if estimate_tokens(text) <= settings.SUMMARY_DIRECT_MAX_TOKENS:
+            self._direct += 1
+            summaries = await self._run(MAP, [[text]], model, priority, user_id)
+            return summaries[0]
+
+        sections = chunk_text(text, settings.SUMMARY_SECTION_SIZE, 0)
+        summaries = await self._run(MAP, [[section] for section in sections], model, priority, user_id)
+
+        levels = 0
+        while len(summaries) > 1:
+            levels += 1
+            summaries = await self._run(REDUCE, _group_for_reduce(summaries), model, priority, user_id)
+
+        self._max_levels = max(self._max_levels, levels)
+        logger.info(f"Summarized {len(sections)} sections in {levels} reduce levels")
+        return summaries[0]
+
+    async def _run(
+        self,
+        kind: str,
+        inputs: List[List[str]],
+        model: str,
+        priority: str,
+        user_id: Optional[int]
+    ) -> List[str]:
+        """Run one map or reduce level, reusing cached results"""
+        keys = [summary_hash(kind, sections) for sections in inputs]
+        found = await self._lookup(model, list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, sections in zip(keys, inputs):
+            if key not in found and key not in missing:
+                missing[key] = sections
+        self._cache_hits += len(keys) - len(missing)
+        self._cache_misses += len(missing)
+
+        if missing:
+            # Fan out no wider than the scheduler admits, so one long document
+            # does not fill the LLM queue (or its per-user allowance)
+            limit = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENCY))
+
+            async def summarize_one(sections: List[str]) -> str:
+                async with limit:
+                    if kind == MAP:
+                        self._map_calls += 1
+                        return await generate_summary(sections[0], model=model, priority=priority, user_id=user_id)
+                    self._reduce_calls += 1
+                    return await combine_summaries(sections, model=model, priority=priority, user_id=user_id)
+
+            results = await asyncio.gather(*(summarize_one(sections) for sections in missing.values()))
+            computed = dict(zip(missing.keys(), results))
+            found.update(computed)
+            await self._store(model, computed)
+
+        return [found[key] for key in keys]
+
+    async def _lookup(self, model: str, keys: List[str]) -> Dict[str, str]:
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return {}
+        try:
+            async with acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    UPDATE summary_cache
+                    SET last_used_at = NOW()
+                    WHERE model_name = $1 AND content_hash = ANY($2::text[])
+                    RETURNING content_hash, summary
+                    """,
+                    model,
+                    keys
+                )
+            return {row['content_hash']: row['summary'] for row in rows}
+        except Exception as e:
+            # Cache trouble must never block summarization
+            self._cache_errors += 1
+            logger.warning(f"Summary cache lookup failed: {str(e)}")
+            return {}
+
+    async def _store(self, model: str, summaries: Dict[str, str]) -> None:
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return
+        try:
+            async with acquire() as conn:
+                await conn.executemany(
+                    """
+                    INSERT INTO summary_cache (model_name, content_hash, summary)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (model_name, content_hash) DO NOTHING
+                    """,
+                    [(model, key, summary) for key, summary in summaries.items()]
+                )
+        except Exception as e:
+            self._cache_errors += 1
+            logger.warning(f"Failed to write {len(summaries)} summaries to cache: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return map/reduce call and cache counters"""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            'requests': self._requests,
+            'direct': self._direct,
+            'map_calls': self._map_calls,
+            'reduce_calls': self._reduce_calls,
+            'max_reduce_levels': self._max_levels,
+            'cache_enabled': settings.SUMMARY_CACHE_ENABLED,
+            'cache_hits': self._cache_hits,
+            'cache_misses': self._cache_misses,
+            'cache_hit_rate': self._cache_hits / lookups if lookups else 0.0,
+            'cache_errors': self._cache_errors
+        }
+
+
+# Global summarizer instance
+summarizer = Summarizer()
@@ -0,0 +1,243 @@
+"""Segmented transcription of long recordings: split at pauses, transcribe in parallel, stitch and checkpoint"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple, Union
+import numpy as np
+from app.core.audio import SAMPLE_RATE, probe_duration, stream_pcm, stream_pieces
+from app.core.config import settings
+from app.core.database import acquire
+from app.core.executors import run_cpu, run_io, run_transcription
+from app.core.whisper import resolve_backend, transcribe_file, transcription_stats
+
+logger = logging.getLogger(__name__)
+
+# Expired checkpoints are purged at most this often
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def piece_hash(samples: np.ndarray) -> str:
+    """SHA-256 of a piece's PCM samples"""
+    return hashlib.sha256(np.ascontiguousarray(samples, dtype=np.float32).tobytes()).hexdigest()
+
+
+def _shift(segment: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """Move a piece-relative segment (and its words) onto the recording's timeline"""
+    shifted = dict(segment, start=segment['start'] + offset, end=segment['end'] + offset)
+    if segment.get('words'):
+        shifted['words'] = [
+            dict(word, start=word['start'] + offset, end=word['end'] + offset)
+            for word in segment['words']
+        ]
+    return shifted
+
+
+async def _blocks(samples: np.ndarray) -> AsyncIterator[np.ndarray]:
+    """Present an in-memory recording as a single block"""
+    yield samples
+
+
+class SegmentedTranscriber:
+    """
+    Transcribes long recordings as independent pieces: the audio is decoded
+    over a pipe, split in pauses found by a lightweight energy VAD as it
+    arrives, and each piece is transcribed in the transcription worker
+    processes while decoding continues. Segments are shifted back onto the
+    recording's timeline.
+
+    Every finished piece is checkpointed in Postgres by (PCM hash,
+    transcription settings), so a retried job only transcribes the pieces
+    that did not finish before the crash.
+    """
+
+    def __init__(self):
+        self._last_purge = 0.0
+
+        # Stats
+        self._recordings = 0
+        self._pieces = 0
+        self._checkpoint_hits = 0
+        self._checkpoint_errors = 0
+        self._audio_seconds = 0.0
+        self._processing_seconds = 0.0
+
+    def config_key(self, model_name: str, word_timestamps: bool) -> str:
+        """Settings that change a piece's transcript"""
+        return ':'.join(str(value) for value in (
+            resolve_backend(),
+            model_name,
+            settings.WHISPER_COMPUTE_TYPE,
+            settings.WHISPER_BEAM_SIZE,
+            'word' if word_timestamps else 'segment'
+        ))
+
+    async def stream(
+        self,
+        audio: Union[str, np.ndarray],
+        model_name: str = None,
+        word_timestamps: bool = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Transcribe a recording, yielding segments in order as pieces finish
+
+        At most 2 x TRANSCRIBE_PARALLEL_SEGMENTS pieces are held in memory;
+        decoding pauses while the caller or the workers catch up.
+
+        Args:
+            audio: Path to an audio/video file or 16 kHz mono float32 samples
+            model_name: Whisper model size (default WHISPER_MODEL)
+            word_timestamps: Word-level timestamps (default: WHISPER_TIMESTAMPS == 'word')
+
+        Yields:
+            Dicts with start, end, text[, words] on the recording's timeline,
+            plus language, backend and rtf of the piece they came from and
+            the recording's total_duration (None if it cannot be probed)
+        """
+        model_name = model_name or settings.WHISPER_MODEL
+        if word_timestamps is None:
+            word_timestamps = settings.WHISPER_TIMESTAMPS == 'word'
+        started = time.perf_counter()
+        await self._purge_expired()
+        config_key = self.config_key(model_name, word_timestamps)
+        self._recordings += 1
+        if isinstance(audio, str):
+            total_duration = await run_io(probe_duration, audio)
+        else:
+            total_duration = len(audio) / SAMPLE_RATE
+
+        decoded = 0
+        pieces = 0
+
+        async def blocks() -> AsyncIterator[np.ndarray]:
+            nonlocal decoded
+            async for block in (stream_pcm(audio) if isinstance(audio, str) else _blocks(audio)):
+                decoded += len(block)
+                yield block
+
+        async def whole() -> AsyncIterator[Tuple[int, np.ndarray]]:
+            yield 0, np.concatenate([block async for block in blocks()] or [np.zeros(0, dtype=np.float32)])
+
+        async def transcribe_piece(piece: np.ndarray) -> Dict[str, Any]:
+            key = await run_cpu(piece_hash, piece)
+            found = await self._lookup(config_key, [key])
+            if key in found:
+                self._checkpoint_hits += 1
+                return found[key]
+            if settings.TRANSCRIBE_SEGMENTED:
+                result = await run_transcription(transcribe_file, piece, model_name, word_timestamps)
+            else:
+                result = await run_cpu(transcribe_file, piece, model_name, word_timestamps)
+            transcription_stats.record(result)
+            await self._store(config_key, key, result)
+            return result
+
+        def stitch(start: int, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+            offset = start / SAMPLE_RATE
+            return [
+                {
+                    **_shift(segment, offset),
+                    'language': result.get('language', 'unknown'),
+                    'backend': result['backend'],
+                    'rtf': result['rtf'],
+                    'total_duration': total_duration
+                }
+                for segment in result.get('segments', [])
+            ]
+
+        window = max(2, 2 * settings.TRANSCRIBE_PARALLEL_SEGMENTS)
+        in_flight: Deque[Tuple[int, asyncio.Task]] = deque()
+        try:
+            async for start, piece in (stream_pieces(blocks()) if settings.TRANSCRIBE_SEGMENTED else whole()):
+                pieces += 1
+                self._pieces += 1
+                in_flight.append((start, asyncio.create_task(transcribe_piece(piece))))
+                if len(in_flight) >= window:
+                    start, task = in_flight.popleft()
+                    for segment in stitch(start, await task):
+                        yield segment
+            while in_flight:
+                start, task = in_flight.popleft()
+                for segment in stitch(start, await task):
+                    yield segment
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in in_flight), return_exceptions=True)
+
+        elapsed = time.perf_counter() - started
+        duration = decoded / SAMPLE_RATE
+        self._audio_seconds += duration
+        self._processing_seconds += elapsed
+        rtf = round(elapsed / duration, 4) if duration else None
+        logger.info(f"Transcribed {duration:.0f}s of audio in {elapsed:.0f}s (RTF {rtf}, {pieces} pieces)")
+
+    async def _lookup(self, config_key: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not keys:
+            return {}
+        try:
+            async with acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT piece_hash, result FROM transcription_checkpoints
+                    WHERE config_key = $1 AND piece_hash = ANY($2::text[])
+                    """,
+                    config_key,
+                    keys
+                )
+            return {row['piece_hash']: row['result'] for row in rows}
+        except Exception as e:
+            # Checkpoint trouble must never block transcription
+            self._checkpoint_errors += 1
+            logger.warning(f"Transcription checkpoint lookup failed: {str(e)}")
+            return {}
+
+    async def _store(self, config_key: str, key: str, result: Dict[str, Any]) -> None:
+        try:
+            async with acquire() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO transcription_checkpoints (piece_hash, config_key, result)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (piece_hash, config_key) DO NOTHING
+                    """,
+                    key,
+                    config_key,
+                    result
+                )
+        except Exception as e:
+            self._checkpoint_errors += 1
+            logger.warning(f"Failed to checkpoint transcribed piece: {str(e)}")
+
+    async def _purge_expired(self) -> None:
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            async with acquire() as conn:
+                await conn.execute(
+                    "DELETE FROM transcription_checkpoints WHERE created_at < NOW() - make_interval(hours => $1)",
+                    settings.TRANSCRIBE_CHECKPOINT_TTL_HOURS
+                )
+        except Exception as e:
+            self._checkpoint_errors += 1
+            logger.warning(f"Failed to purge transcription checkpoints: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return piece, checkpoint and real-time factor counters"""
+        return {
+            'segmented': settings.TRANSCRIBE_SEGMENTED,
+            'parallel_segments': settings.TRANSCRIBE_PARALLEL_SEGMENTS,
+            'recordings': self._recordings,
+            'pieces': self._pieces,
+            'checkpoint_hits': self._checkpoint_hits,
+            'checkpoint_errors': self._checkpoint_errors,
+            'audio_seconds': round(self._audio_seconds, 1),
+            'processing_seconds': round(self._processing_seconds, 1),
+            'rtf': round(self._processing_seconds / self._audio_seconds, 4) if self._audio_seconds else None
+        }
+
+
+# Global transcriber instance
+segmented_transcriber = SegmentedTranscriber()
@@ -0,0 +1,365 @@
+"""Vector index management: HNSW/IVFFlat selection, sizing and search tuning"""
+import asyncio
+import logging
+import math
+import re
+import time
+import uuid
+from typing import Any, Dict, Optional
+import asyncpg
+from app.core.config import settings
+from app.core.database import acquire, open_connection
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'embeddings_vector_idx'
+# Builds use a unique temporary name under this prefix, then are renamed to INDEX_NAME
+BUILD_NAME_PREFIX = f'{INDEX_NAME}_new'
+# Session advisory lock held for a whole build, so replicas never build at once
+BUILD_LOCK_ID = 7_306_211_009
+BUILD_LOCK_POLL_SECONDS = 5
+INDEX_TYPES = ('hnsw', 'ivfflat')
+BUILD_PARAM_NAMES = {'hnsw': {'m', 'ef_construction'}, 'ivfflat': {'lists'}}
+
+# pgvector's accepted ranges for each build parameter
+BUILD_PARAM_RANGES = {'m': (2, 100), 'ef_construction': (4, 1000), 'lists': (1, 32768)}
+
+# Recall target -> HNSW ef_search floor, and multiple of sqrt(lists) for IVFFlat probes
+_RECALL_TIERS = [
+    (0.90, 40, 1.0),
+    (0.95, 64, 2.0),
+    (0.98, 128, 4.0),
+    (1.00, 256, 8.0),
+]
+
+
+def compute_build_params(
+    index_type: str,
+    row_count: int,
+    overrides: Optional[Dict[str, int]] = None
+) -> Dict[str, int]:
+    """
+    Choose index build parameters from the table size
+
+    Explicit parameters (overrides, then HNSW_M, HNSW_EF_CONSTRUCTION,
+    IVFFLAT_LISTS) win over the size-based defaults; unset ones are derived
+    from the explicit ones, e.g. ef_construction from an overridden m.
+
+    Args:
+        index_type: 'hnsw' or 'ivfflat'
+        row_count: Number of rows in the embeddings table
+        overrides: Optional explicit parameters
+
+    Returns:
+        Dict of WITH (...) parameters for CREATE INDEX
+    """
+    overrides = overrides or {}
+    if index_type == 'hnsw':
+        # pgvector defaults suit small/medium corpora; larger graphs need more links
+        m = overrides.get('m') or settings.HNSW_M or (16 if row_count < 1_000_000 else 24)
+        ef_construction = overrides.get('ef_construction') or settings.HNSW_EF_CONSTRUCTION or max(64, 4 * m)
+        return {'m': m, 'ef_construction': ef_construction}
+
+    if index_type == 'ivfflat':
+        # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+        if overrides.get('lists'):
+            lists = overrides['lists']
+        elif settings.IVFFLAT_LISTS:
+            lists = settings.IVFFLAT_LISTS
+        elif row_count <= 1_000_000:
+            lists = max(1, row_count // 1000)
+        else:
+            lists = int(math.sqrt(row_count))
+        return {'lists': lists}
+
+    raise ValueError(f"Unsupported vector index type: {index_type}")
+
+
+def validate_build_params(index_type: str, params: Dict[str, int]) -> None:
+    """
+    Check build parameters against pgvector's limits
+
+    Raises:
+        ValueError: Unknown parameter, value out of range, or ef_construction < 2 * m
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported vector index type: {index_type}")
+    unknown = set(params) - BUILD_PARAM_NAMES[index_type]
+    if unknown:
+        raise ValueError(f"Unsupported {index_type} parameters: {', '.join(sorted(unknown))}")
+    for key, value in params.items():
+        low, high = BUILD_PARAM_RANGES[key]
+        if not low <= int(value) <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+    if 'm' in params and 'ef_construction' in params and params['ef_construction'] < 2 * params['m']:
+        raise ValueError("ef_construction must be at least 2 * m")
+
+
+def compute_search_params(index_type: str, limit: int, build_params: Dict[str, int]) -> Dict[str, int]:
+    """
+    Choose per-query search parameters from the recall target and result limit
+
+    Args:
+        index_type: 'hnsw' or 'ivfflat'
+        limit: Number of results requested
+        build_params: Parameters the current index was built with
+
+    Returns:
+        Dict of setting name -> value, e.g. {'hnsw.ef_search': 64}
+    """
+    target = settings.VECTOR_SEARCH_RECALL_TARGET
+    ef_floor, probe_factor = next(
+        ((ef, factor) for tier, ef, factor in _RECALL_TIERS if target <= tier),
+        _RECALL_TIERS[-1][1:]
+    )
+
+    if index_type == 'hnsw':
+        ef_search = settings.HNSW_EF_SEARCH or ef_floor
+        # ef_search bounds the candidate list, so it must cover the limit
+        return {'hnsw.ef_search': min(1000, max(ef_search, limit))}
+
+    lists = build_params.get('lists', 1)
+    probes = settings.IVFFLAT_PROBES or math.ceil(probe_factor * math.sqrt(lists))
+    return {'ivfflat.probes': max(1, min(lists, probes))}
+
+
+class VectorIndexManager:
+    """
+    Tracks the live vector index, applies per-query search settings and
+    rebuilds the index concurrently (without blocking writes).
+    """
+
+    def __init__(self):
+        self.index_type: Optional[str] = None
+        self.build_params: Dict[str, int] = {}
+        self._build_lock = asyncio.Lock()
+        self._build_task: Optional[asyncio.Task] = None
+        self._last_build: Dict[str, Any] = {}
+
+    @property
+    def building(self) -> bool:
+        return self._build_task is not None and not self._build_task.done()
+
+    async def _row_count(self, conn: asyncpg.Connection) -> int:
+        # Planner estimate is free; fall back to count(*) before the first ANALYZE
+        estimate = await conn.fetchval(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'embeddings'"
+        )
+        if estimate and estimate > 0:
+            return int(estimate)
+        return await conn.fetchval("SELECT count(*) FROM embeddings")
+
+    async def _inspect(self, conn: asyncpg.Connection) -> bool:
+        """Load type and parameters of the existing index; False if there is none"""
+        row = await conn.fetchrow(
+            """
+            SELECT am.amname, c.reloptions
+            FROM pg_class c
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE c.relname = $1
+            """,
+            INDEX_NAME
+        )
+        if row is None:
+            return False
+
+        self.index_type = row['amname']
+        params = {}
+        for option in row['reloptions'] or []:
+            key, _, value = option.partition('=')
+            if value.isdigit():
+                params[key] = int(value)
+        self.build_params = params
+        return True
+
+    async def ensure_index(self) -> None:
+        """
+        Load the vector index on startup, building it in the background if none exists
+
+        Queries run without the index (exact scan) until the build finishes.
+        When several replicas start at once, one builds and the others wait
+        on the build lock and then load its result.
+        """
+        async with acquire() as conn:
+            if await self._inspect(conn):
+                logger.info(f"Vector index {INDEX_NAME} exists ({self.index_type}, {self.build_params})")
+                if self.index_type != settings.VECTOR_INDEX_TYPE:
+                    logger.warning(
+                        f"Vector index is {self.index_type} but VECTOR_INDEX_TYPE="
+                        f"{settings.VECTOR_INDEX_TYPE}; use the admin rebuild endpoint to switch"
+                    )
+                return
+        logger.info(f"Vector index {INDEX_NAME} is missing; building it in the background")
+        self.start_rebuild(if_missing=True)
+
+    async def apply_search_params(self, conn: asyncpg.Connection, limit: int) -> None:
+        """
+        Set ef_search / probes on a pooled connection before a similarity query
+
+        The pool runs RESET ALL when the connection is released, so the
+        setting only applies to this query.
+        """
+        if self.index_type not in INDEX_TYPES:
+            return
+        params = compute_search_params(self.index_type, limit, self.build_params)
+        statements = '; '.join(f"SET {name} = {int(value)}" for name, value in params.items())
+        await conn.execute(statements)
+
+    async def plan_build(
+        self,
+        index_type: Optional[str] = None,
+        build_params: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Resolve and validate the parameters a rebuild would use now
+
+        Raises:
+            ValueError: Invalid index type or parameters
+        """
+        index_type = (index_type or settings.VECTOR_INDEX_TYPE).lower()
+        validate_build_params(index_type, build_params or {})
+        async with acquire() as conn:
+            row_count = await self._row_count(conn)
+        params = compute_build_params(index_type, row_count, build_params)
+        validate_build_params(index_type, params)
+        return {'index_type': index_type, 'params': params, 'row_count': row_count}
+
+    async def _drop_leftover_builds(self, conn: asyncpg.Connection) -> None:
+        """Drop temporary indexes of interrupted builds (INVALID); call with the build lock held"""
+        rows = await conn.fetch(
+            "SELECT relname FROM pg_class WHERE relkind = 'i' AND left(relname, length($1)) = $1",
+            BUILD_NAME_PREFIX
+        )
+        for row in rows:
+            logger.warning(f"Dropping leftover vector index build {row['relname']}")
+            await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["relname"]}"')
+
+    async def rebuild(
+        self,
+        index_type: Optional[str] = None,
+        build_params: Optional[Dict[str, int]] = None,
+        if_missing: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Build a new index with CREATE INDEX CONCURRENTLY and swap it in
+
+        Builds hold a Postgres advisory lock. An explicit rebuild fails while
+        another instance is building; with if_missing it waits for that build
+        and loads its index instead of building again.
+
+        Args:
+            index_type: 'hnsw' or 'ivfflat' (default from settings)
+            build_params: Optional explicit parameters; unset ones are sized from the row count
+            if_missing: Only build if no index exists once the lock is held
+
+        Returns:
+            Summary of the build
+        """
+        index_type = (index_type or settings.VECTOR_INDEX_TYPE).lower()
+        validate_build_params(index_type, build_params or {})
+
+        async with self._build_lock:
+            # A dedicated connection: builds can take minutes and must not
+            # hold a pooled connection or run inside a transaction. The
+            # advisory lock is released when it closes.
+            async with open_connection() as conn:
+                if if_missing:
+                    # Poll rather than block in pg_advisory_lock: a session waiting in a
+                    # statement holds a snapshot that CREATE INDEX CONCURRENTLY waits out
+                    while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", BUILD_LOCK_ID):
+                        await asyncio.sleep(BUILD_LOCK_POLL_SECONDS)
+                    if await self._inspect(conn):
+                        logger.info(f"Vector index {INDEX_NAME} was built by another instance ({self.index_type}, {self.build_params})")
+                        return {'index_type': self.index_type, 'params': self.build_params, 'built': False}
+                elif not await conn.fetchval("SELECT pg_try_advisory_lock($1)", BUILD_LOCK_ID):
+                    raise RuntimeError("A vector index build is already running on another instance")
+
+                started = time.perf_counter()
+                new_name = f"{BUILD_NAME_PREFIX}_{uuid.uuid4().hex[:12]}"
+                row_count = await self._row_count(conn)
+                params = compute_build_params(index_type, row_count, build_params)
+                validate_build_params(index_type, params)
+                with_sql = ', '.join(f"{key} = {int(value)}" for key, value in params.items())
+
+                logger.info(f"Building {index_type} vector index over {row_count} rows ({with_sql})")
+                work_mem = settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM
+                if not re.fullmatch(r'\d+\s*[kMG]B', work_mem):
+                    raise ValueError(f"Invalid VECTOR_INDEX_MAINTENANCE_WORK_MEM: {work_mem}")
+                await conn.execute(f"SET maintenance_work_mem = '{work_mem}'")
+                await self._drop_leftover_builds(conn)
+                try:
+                    await conn.execute(f"""
+                        CREATE INDEX CONCURRENTLY {new_name}
+                        ON embeddings USING {index_type} (embedding vector_cosine_ops)
+                        WITH ({with_sql})
+                    """)
+                except Exception:
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}")
+                    raise
+
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+                await conn.execute(f"ALTER INDEX {new_name} RENAME TO {INDEX_NAME}")
+
+            self.index_type = index_type
+            self.build_params = {key: int(value) for key, value in params.items()}
+            self._last_build = {
+                'index_type': index_type,
+                'params': self.build_params,
+                'row_count': row_count,
+                'duration_seconds': round(time.perf_counter() - started, 2),
+                'finished_at': time.time(),
+                'error': None
+            }
+            logger.info(f"Vector index rebuilt in {self._last_build['duration_seconds']}s")
+            return self._last_build
+
+    def start_rebuild(
+        self,
+        index_type: Optional[str] = None,
+        build_params: Optional[Dict[str, int]] = None,
+        if_missing: bool = False
+    ) -> bool:
+        """
+        Start a rebuild in the background
+
+        Returns:
+            False if a build is already running
+        """
+        if self.building:
+            return False
+
+        async def run():
+            try:
+                await self.rebuild(index_type, build_params, if_missing)
+            except Exception as e:
+                logger.error(f"Vector index rebuild failed: {str(e)}")
+                self._last_build = {
+                    'index_type': index_type,
+                    'params': build_params,
+                    'finished_at': time.time(),
+                    'error': str(e)
+                }
+
+        self._build_task = asyncio.create_task(run())
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return the live index configuration and last build result"""
+        search_params = (
+            compute_search_params(self.index_type, 5, self.build_params)
+            if self.index_type in INDEX_TYPES else {}
+        )
+        return {
+            'index_name': INDEX_NAME,
+            'index_type': self.index_type,
+            'configured_type': settings.VECTOR_INDEX_TYPE,
+            'build_params': self.build_params,
+            'recall_target': settings.VECTOR_SEARCH_RECALL_TARGET,
+            'search_params_for_limit_5': search_params,
+            'building': self.building,
+            'last_build': self._last_build
+        }
+
+
+# Global manager instance
+vector_index = VectorIndexManager()
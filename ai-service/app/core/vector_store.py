@@ -1,16 +1,242 @@
-from sqlalchemy import text
-from typing import List, Dict, Optional
-from app.core.database import engine
-from app.core.embeddings import generate_embeddings
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.database import acquire
+from app.core.embedding_batcher import embedding_batcher
+from app.core.embedding_cache import embedding_cache
+from app.core.query_cache import retrieval_cache
+from app.core.answer_cache import answer_cache
+from app.core.vector_index import vector_index
 import logging
-import json
+import re
 
 logger = logging.getLogger(__name__)
 
+INSERT_COLUMNS = ['file_id', 'user_id', 'course_id', 'module_id', 'chunk_text', 'embedding', 'metadata']
 
-async def store_embeddings(
+RETRIEVAL_MODES = ('vector', 'hybrid')
+
+# Upper bound on OR-ed terms in the lexical half of hybrid queries
+MAX_LEXICAL_TERMS = 32
+
+INSERT_SQL = f"""
+    INSERT INTO embeddings ({', '.join(INSERT_COLUMNS)})
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+"""
+
+
+def _iter_batches(items: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_LEXICAL_TOKEN = re.compile(r'\w+')
+
+
+def _lexical_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an OR-of-terms tsquery string
+
+    Returns None when the query has no searchable terms.
+    """
+    tokens = list(dict.fromkeys(token.lower() for token in _LEXICAL_TOKEN.findall(query)))
+    if not tokens:
+        return None
+    return ' | '.join(tokens[:MAX_LEXICAL_TERMS])
+
+
+def _scope_filters(
+    param,
+    user_id: Optional[int],
+    course_id: Optional[int],
+    module_id: Optional[int],
+    file_ids: Optional[List[int]]
+) -> List[str]:
+    where_clauses = []
+    
+    if user_id is not None:
+        where_clauses.append(f"user_id = {param(user_id)}")
+    
+    if course_id is not None:
+        where_clauses.append(f"course_id = {param(course_id)}")
+    
+    if module_id is not None:
+        where_clauses.append(f"module_id = {param(module_id)}")
+    
+    if file_ids:
+        where_clauses.append(f"file_id = ANY({param(list(file_ids))}::int[])")
+    
+    return where_clauses
+
+
+def _build_similarity_query(
+    limit: int,
+    user_id: Optional[int],
+    course_id: Optional[int],
+    module_id: Optional[int],
+    file_ids: Optional[List[int]],
+    lexical_query: Optional[str] = None
+) -> Tuple[str, list]:
+    """
+    Build the similarity query for the given filters.
+
+    With `lexical_query`, the query runs the ANN and full-text candidate
+    searches as CTEs in one statement and fuses them with reciprocal rank
+    fusion; `similarity` stays the cosine similarity.
+
+    The SQL text only depends on which filters are present, so each variant
+    is prepared once per pooled connection and reused from asyncpg's
+    statement cache. $1 is always the query vector.
+    """
+    args = []
+    
+    def param(value) -> str:
+        args.append(value)
+        return f"${len(args) + 1}"
+    
+    where_clauses = _scope_filters(param, user_id, course_id, module_id, file_ids)
+    
+    if lexical_query is None:
+        where_sql = ""
+        if where_clauses:
+            where_sql = "WHERE " + " AND ".join(where_clauses)
+        
+        limit_param = param(limit)
+        
+        sql = f"""
+            SELECT 
+                id,
+                file_id,
+                user_id,
+                course_id,
+                module_id,
+                chunk_text,
+                metadata,
+                1 - (embedding <=> $1) as similarity
+            FROM embeddings
+            {where_sql}
+            ORDER BY embedding <=> $1
+            LIMIT {limit_param}
+        """
+        return sql, args
+    
+    filter_sql = "".join(f" AND {clause}" for clause in where_clauses)
+    vector_where = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+    tsquery_param = param(lexical_query)
+    candidates_param = param(max(limit * settings.HYBRID_CANDIDATE_MULTIPLIER, limit))
+    rrf_k_param = param(settings.HYBRID_RRF_K)
+    limit_param = param(limit)
+    ts_config = settings.HYBRID_TEXT_SEARCH_CONFIG
+    if not re.fullmatch(r'[a-z_]+', ts_config):
+        raise ValueError(f"Invalid HYBRID_TEXT_SEARCH_CONFIG: {ts_config}")
+    
+    sql = f"""
+        WITH vector_hits AS (
+            SELECT id, row_number() OVER (ORDER BY embedding <=> $1) AS rank
+            FROM embeddings
+            {vector_where}
+            ORDER BY embedding <=> $1
+            LIMIT {candidates_param}
+        ),
+        lexical_hits AS (
+            SELECT id, row_number() OVER (ORDER BY ts_rank_cd(chunk_tsv, q) DESC) AS rank
+            FROM embeddings, to_tsquery('{ts_config}', {tsquery_param}) q
+            WHERE chunk_tsv @@ q{filter_sql}
+            ORDER BY ts_rank_cd(chunk_tsv, q) DESC
+            LIMIT {candidates_param}
+        ),
+        fused AS (
+            SELECT
+                COALESCE(v.id, l.id) AS id,
+                COALESCE(1.0 / ({rrf_k_param} + v.rank), 0)
+                    + COALESCE(1.0 / ({rrf_k_param} + l.rank), 0) AS rrf_score,
+                v.rank AS vector_rank,
+                l.rank AS lexical_rank
+            FROM vector_hits v
+            FULL OUTER JOIN lexical_hits l ON v.id = l.id
+        )
+        SELECT 
+            e.id,
+            e.file_id,
+            e.user_id,
+            e.course_id,
+            e.module_id,
+            e.chunk_text,
+            e.metadata,
+            1 - (e.embedding <=> $1) as similarity,
+            f.rrf_score,
+            f.vector_rank,
+            f.lexical_rank
+        FROM fused f
+        JOIN embeddings e ON e.id = f.id
+        ORDER BY f.rrf_score DESC
+        LIMIT {limit_param}
+    """
+    return sql, args
+
+
+async def _delete_where(column: str, value: int) -> Dict[int, int]:
+    """Delete matching embeddings; returns the number deleted per file_id"""
+    async with acquire() as conn:
+        rows = await conn.fetch(
+            f"""
+            WITH deleted AS (DELETE FROM embeddings WHERE {column} = $1 RETURNING file_id)
+            SELECT file_id, count(*) AS n FROM deleted GROUP BY file_id
+            """,
+            value
+        )
+    return {row['file_id']: row['n'] for row in rows}
+
+
+async def insert_embeddings(
     file_id: int,
     chunks: List[str],
+    embeddings: List,
+    user_id: Optional[int] = None,
+    course_id: Optional[int] = None,
+    module_id: Optional[int] = None,
+    metadata: Optional[Dict] = None
+) -> int:
+    """
+    Write one batch of already embedded chunks
+    
+    Args:
+        file_id: ID of the file
+        chunks: Text chunks
+        embeddings: One embedding per chunk
+        user_id: Optional user ID for scoping
+        course_id: Optional course ID for scoping
+        module_id: Optional module ID for scoping
+        metadata: Optional metadata dictionary
+        
+    Returns:
+        Number of rows written
+    """
+    rows = [
+        (file_id, user_id, course_id, module_id, chunk, np.asarray(embedding, dtype=np.float32), metadata)
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    async with acquire() as conn:
+        if settings.EMBEDDING_INSERT_MODE == 'copy':
+            # Binary COPY; vectors are sent as float4 via the pgvector codec
+            await conn.copy_records_to_table('embeddings', records=rows, columns=INSERT_COLUMNS)
+        else:
+            await conn.executemany(INSERT_SQL, rows)
+    
+    # New rows may now rank in cached results for a matching scope
+    retrieval_cache.invalidate_new_rows(file_id, user_id, course_id, module_id)
+    return len(rows)
+
+
+async def store_embeddings(
+    file_id: int,
+    chunks: Iterable[str],
     user_id: Optional[int] = None,
     course_id: Optional[int] = None,
     module_id: Optional[int] = None,
@@ -21,7 +247,7 @@ async def store_embeddings(
     
     Args:
         file_id: ID of the file
-        chunks: List of text chunks
+        chunks: Text chunks (any iterable; consumed in batches)
         user_id: Optional user ID for scoping
         course_id: Optional course ID for scoping
         module_id: Optional module ID for scoping
@@ -30,48 +256,53 @@ async def store_embeddings(
     Returns:
         Number of embeddings stored
     """
+    stored = 0
+    
     try:
-        # Generate embeddings for all chunks
-        embeddings = generate_embeddings(chunks)
-        
-        # Insert into database
-        with engine.connect() as conn:
-            for chunk, embedding in zip(chunks, embeddings):
-                embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                metadata_json = json.dumps(metadata) if metadata else None
-                
-                conn.execute(
-                    text("""
-                        INSERT INTO embeddings 
-                        (file_id, user_id, course_id, module_id, chunk_text, embedding, metadata)
-                        VALUES (:file_id, :user_id, :course_id, :module_id, :chunk_text, :embedding::vector, :metadata::jsonb)
-                    """),
-                    {
-                        'file_id': file_id,
-                        'user_id': user_id,
-                        'course_id': course_id,
-                        'module_id': module_id,
-                        'chunk_text': chunk,
-                        'embedding': embedding_str,
-                        'metadata': metadata_json
-                    }
-                )
-            conn.commit()
-        
-        logger.info(f"Stored {len(chunks)} embeddings for file_id={file_id}")
-        return len(chunks)
+        # Embed and write one batch at a time so the full file never sits in memory
+        try:
+            for batch in _iter_batches(chunks, settings.EMBEDDING_INSERT_BATCH_SIZE):
+                # Reuse cached vectors for content seen before; only misses hit the model
+                embeddings = await embedding_cache.embed(batch)
+                stored += await insert_embeddings(file_id, batch, embeddings, user_id, course_id, module_id, metadata)
+        finally:
+            # Answers citing the file are stale, also when only part of it was stored
+            if stored:
+                await answer_cache.bump_files([file_id])
+        
+        logger.info(f"Stored {stored} embeddings for file_id={file_id}")
+        return stored
     except Exception as e:
         logger.error(f"Error storing embeddings: {str(e)}")
         raise
 
 
+async def embed_query(query: str) -> np.ndarray:
+    """
+    Embed a search query, reusing the embedding of the same normalized query
+    
+    Args:
+        query: Query text
+        
+    Returns:
+        Query embedding as float32
+    """
+    query_embedding = retrieval_cache.get_query_embedding(query)
+    if query_embedding is None:
+        query_embeddings = await embedding_batcher.embed([query])
+        query_embedding = np.asarray(query_embeddings[0], dtype=np.float32)
+        retrieval_cache.put_query_embedding(query, query_embedding)
+    return query_embedding
+
+
 async def search_similar(
     query: str,
     limit: int = 5,
     user_id: Optional[int] = None,
     course_id: Optional[int] = None,
     module_id: Optional[int] = None,
-    file_ids: Optional[List[int]] = None
+    file_ids: Optional[List[int]] = None,
+    mode: Optional[str] = None
 ) -> List[Dict]:
     """
     Search for similar text chunks using vector similarity
@@ -83,77 +314,63 @@ async def search_similar(
         course_id: Optional filter by course_id
         module_id: Optional filter by module_id
         file_ids: Optional filter by list of file_ids
+        mode: 'vector' or 'hybrid' (vector + full-text, rank-fused); default from settings
         
     Returns:
         List of matching chunks with metadata
     """
+    mode = (mode or settings.RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unsupported retrieval mode: {mode}")
+    
     try:
-        # Generate query embedding
-        query_embeddings = generate_embeddings([query])
-        query_embedding = query_embeddings[0]
-        embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-        
-        # Build WHERE clause for filtering
-        where_clauses = []
-        params = {
-            'query_embedding': embedding_str,
-            'limit': limit
-        }
-        
-        if user_id is not None:
-            where_clauses.append("user_id = :user_id")
-            params['user_id'] = user_id
-        
-        if course_id is not None:
-            where_clauses.append("course_id = :course_id")
-            params['course_id'] = course_id
+        query_embedding = await embed_query(query)
         
-        if module_id is not None:
-            where_clauses.append("module_id = :module_id")
-            params['module_id'] = module_id
-        
-        if file_ids:
-            where_clauses.append("file_id = ANY(:file_ids)")
-            params['file_ids'] = file_ids
+        scope = {
+            'user_id': user_id,
+            'course_id': course_id,
+            'module_id': module_id,
+            'file_ids': set(file_ids) if file_ids else None,
+            'mode': mode
+        }
+        cached = retrieval_cache.get_results(query_embedding, scope, limit)
+        if cached is not None:
+            logger.info(f"Found {len(cached)} similar chunks for query (cached)")
+            return cached
         
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+        lexical_query = _lexical_query(query) if mode == 'hybrid' else None
+        sql, args = _build_similarity_query(
+            limit, user_id, course_id, module_id, file_ids, lexical_query
+        )
+        # The ANN half of a hybrid query fetches more candidates than `limit`
+        candidates = limit * settings.HYBRID_CANDIDATE_MULTIPLIER if lexical_query else limit
         
         # Execute similarity search
-        with engine.connect() as conn:
-            result = conn.execute(
-                text(f"""
-                    SELECT 
-                        id,
-                        file_id,
-                        user_id,
-                        course_id,
-                        module_id,
-                        chunk_text,
-                        metadata,
-                        1 - (embedding <=> :query_embedding::vector) as similarity
-                    FROM embeddings
-                    {where_sql}
-                    ORDER BY embedding <=> :query_embedding::vector
-                    LIMIT :limit
-                """),
-                params
-            )
-            
-            results = []
-            for row in result:
-                results.append({
-                    'id': row[0],
-                    'file_id': row[1],
-                    'user_id': row[2],
-                    'course_id': row[3],
-                    'module_id': row[4],
-                    'chunk_text': row[5],
-                    'metadata': row[6],
-                    'similarity': float(row[7])
+        async with acquire() as conn:
+            await vector_index.apply_search_params(conn, candidates)
+            rows = await conn.fetch(sql, query_embedding, *args)
+        
+        results = []
+        for row in rows:
+            results.append({
+                'id': row['id'],
+                'file_id': row['file_id'],
+                'user_id': row['user_id'],
+                'course_id': row['course_id'],
+                'module_id': row['module_id'],
+                'chunk_text': row['chunk_text'],
+                'metadata': row['metadata'],
+                'similarity': float(row['similarity'])
+            })
+            if lexical_query:
+                results[-1].update({
+                    'rrf_score': float(row['rrf_score']),
+                    'vector_rank': row['vector_rank'],
+                    'lexical_rank': row['lexical_rank']
                 })
         
+        retrieval_cache.put_results(query_embedding, scope, limit, results)
+        
         logger.info(f"Found {len(results)} similar chunks for query")
         return results
     except Exception as e:
@@ -172,13 +389,10 @@ async def delete_embeddings_by_file(file_id: int) -> int:
         Number of embeddings deleted
     """
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("DELETE FROM embeddings WHERE file_id = :file_id"),
-                {'file_id': file_id}
-            )
-            conn.commit()
-            deleted_count = result.rowcount
+        deleted = await _delete_where('file_id', file_id)
+        deleted_count = sum(deleted.values())
+        retrieval_cache.invalidate_file(file_id)
+        await answer_cache.bump_files(deleted)
         
         logger.info(f"Deleted {deleted_count} embeddings for file_id={file_id}")
         return deleted_count
@@ -198,13 +412,10 @@ async def delete_embeddings_by_user(user_id: int) -> int:
         Number of embeddings deleted
     """
     try:
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("DELETE FROM embeddings WHERE user_id = :user_id"),
-                {'user_id': user_id}
-            )
-            conn.commit()
-            deleted_count = result.rowcount
+        deleted = await _delete_where('user_id', user_id)
+        deleted_count = sum(deleted.values())
+        retrieval_cache.invalidate_user(user_id)
+        await answer_cache.bump_files(deleted)
         
         logger.info(f"Deleted {deleted_count} embeddings for user_id={user_id}")
         return deleted_count
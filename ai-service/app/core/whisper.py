@@ -1,34 +1,235 @@
-"""Shared Whisper model management"""
+"""Shared speech-to-text models: pluggable backends and a registry of loaded models"""
 import logging
 import threading
-import whisper
+import time
+from typing import Any, Dict, Tuple, Union
+import numpy as np
+from app.core.audio import SAMPLE_RATE
 from app.core.config import settings
 
+# Backends are optional; at least one must be installed
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+try:
+    import whisper
+except ImportError:
+    whisper = None
+
 logger = logging.getLogger(__name__)
 
-# Global Whisper model instance
-_whisper_model = None
+FASTER_WHISPER = 'faster-whisper'    # CTranslate2 engine, int8 on CPU
+OPENAI_WHISPER = 'openai-whisper'    # Reference PyTorch implementation
+BACKENDS = (FASTER_WHISPER, OPENAI_WHISPER)
+
+# Loaded models keyed by (backend, size, compute type)
+_models: Dict[Tuple[str, str, str], Any] = {}
 _model_lock = threading.Lock()
 
 
-def get_whisper_model(model_name: str = None):
+def resolve_backend(backend: str = None) -> str:
+    """
+    Pick the transcription backend
+
+    Args:
+        backend: 'auto' or one of BACKENDS (default from settings)
+
+    Returns:
+        The requested backend, or for 'auto' faster-whisper when installed
+    """
+    backend = (backend or settings.WHISPER_BACKEND).lower()
+    installed = [name for name, module in ((FASTER_WHISPER, WhisperModel), (OPENAI_WHISPER, whisper)) if module is not None]
+    if not installed:
+        raise RuntimeError("No transcription backend installed (faster-whisper or openai-whisper)")
+    if backend == 'auto':
+        return installed[0]
+    if backend not in installed:
+        logger.warning(f"Transcription backend '{backend}' is not installed, using {installed[0]}")
+        return installed[0]
+    return backend
+
+
+def get_whisper_model(model_name: str = None, backend: str = None, compute_type: str = None):
     """
-    Get or load Whisper model (thread-safe)
-    
+    Get or load a Whisper model (thread-safe)
+
+    Models stay loaded per (backend, size, compute type), so different sizes
+    can be used side by side.
+
     Args:
-        model_name: Whisper model name (tiny, base, small, medium, large)
-        
+        model_name: Whisper model size (tiny, base, small, medium, large-v3, ...)
+        backend: 'auto' or one of BACKENDS
+        compute_type: CTranslate2 compute type for faster-whisper (int8, int8_float16, float16, float32);
+            openai-whisper uses float16 or float32
+
     Returns:
-        Loaded Whisper model
+        Loaded model
     """
-    global _whisper_model
-    
-    if model_name is None:
-        model_name = settings.WHISPER_MODEL
-    
+    model_name = model_name or settings.WHISPER_MODEL
+    backend = resolve_backend(backend)
+    compute_type = compute_type or settings.WHISPER_COMPUTE_TYPE
+    key = (backend, model_name, compute_type)
+
     with _model_lock:
-        if _whisper_model is None:
-            logger.info(f"Loading Whisper model: {model_name}")
-            _whisper_model = whisper.load_model(model_name)
+        model = _models.get(key)
+        if model is None:
+            logger.info(f"Loading Whisper model: {model_name} ({backend}, {compute_type})")
+            if backend == FASTER_WHISPER:
+                model = WhisperModel(
+                    model_name,
+                    device=settings.WHISPER_DEVICE,
+                    compute_type=compute_type,
+                    cpu_threads=settings.WHISPER_CPU_THREADS
+                )
+            else:
+                model = whisper.load_model(model_name)
+            _models[key] = model
             logger.info("Whisper model loaded successfully")
-        return _whisper_model
+        return model
+
+
+def loaded_models() -> list:
+    """Keys of the loaded models"""
+    with _model_lock:
+        return [
+            {'backend': backend, 'model': model_name, 'compute_type': compute_type}
+            for backend, model_name, compute_type in _models
+        ]
+
+
+def _transcribe_faster(model, audio, beam_size: int, word_timestamps: bool) -> Dict[str, Any]:
+    segments, info = model.transcribe(audio, beam_size=max(1, beam_size), word_timestamps=word_timestamps)
+    result_segments = []
+    for segment in segments:
+        item = {'start': segment.start, 'end': segment.end, 'text': segment.text}
+        if word_timestamps and segment.words:
+            item['words'] = [
+                {'word': word.word, 'start': word.start, 'end': word.end, 'probability': word.probability}
+                for word in segment.words
+            ]
+        result_segments.append(item)
+    return {
+        'text': ''.join(segment['text'] for segment in result_segments),
+        'segments': result_segments,
+        'language': info.language,
+        'duration': info.duration
+    }
+
+
+def _transcribe_openai(model, audio, beam_size: int, word_timestamps: bool, compute_type: str) -> Dict[str, Any]:
+    if isinstance(audio, str):
+        audio = whisper.load_audio(audio)
+    result = model.transcribe(
+        audio,
+        # beam_size=None is greedy decoding; a beam of 1 would still run the slower beam decoder
+        beam_size=beam_size if beam_size > 1 else None,
+        word_timestamps=word_timestamps,
+        fp16=compute_type == 'float16',
+        verbose=False
+    )
+    return {
+        'text': result['text'],
+        'segments': [
+            {
+                'start': segment['start'],
+                'end': segment['end'],
+                'text': segment['text'],
+                **({'words': segment['words']} if word_timestamps and segment.get('words') else {})
+            }
+            for segment in result.get('segments', [])
+        ],
+        'language': result.get('language', 'unknown'),
+        'duration': len(audio) / SAMPLE_RATE
+    }
+
+
+def transcribe_file(
+    audio: Union[str, np.ndarray],
+    model_name: str = None,
+    word_timestamps: bool = None,
+    backend: str = None,
+    beam_size: int = None,
+    compute_type: str = None
+) -> Dict[str, Any]:
+    """
+    Transcribe audio (blocking - run via the CPU executor pool)
+
+    Args:
+        audio: Path to an audio file or 16 kHz mono float32 samples
+        model_name: Whisper model size
+        word_timestamps: Word-level timestamps (default: WHISPER_TIMESTAMPS == 'word')
+        backend: 'auto' or one of BACKENDS
+        beam_size: Beam width (1 = greedy)
+        compute_type: Model compute type
+
+    Returns:
+        Dict with text, segments ({start, end, text[, words]}), language,
+        duration, and backend, model, compute_type, processing_seconds and
+        rtf (processing time / audio duration)
+    """
+    model_name = model_name or settings.WHISPER_MODEL
+    backend = resolve_backend(backend)
+    compute_type = compute_type or settings.WHISPER_COMPUTE_TYPE
+    beam_size = settings.WHISPER_BEAM_SIZE if beam_size is None else beam_size
+    if word_timestamps is None:
+        word_timestamps = settings.WHISPER_TIMESTAMPS == 'word'
+
+    model = get_whisper_model(model_name, backend, compute_type)
+    started = time.perf_counter()
+    if backend == FASTER_WHISPER:
+        result = _transcribe_faster(model, audio, beam_size, word_timestamps)
+    else:
+        result = _transcribe_openai(model, audio, beam_size, word_timestamps, compute_type)
+    elapsed = time.perf_counter() - started
+
+    result.update({
+        'backend': backend,
+        'model': model_name,
+        'compute_type': compute_type,
+        'processing_seconds': round(elapsed, 3),
+        'rtf': round(elapsed / result['duration'], 4) if result['duration'] else None
+    })
+    return result
+
+
+class TranscriptionStats:
+    """Audio duration, processing time and real-time factor per backend"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_backend: Dict[str, Dict[str, float]] = {}
+        self._last: Dict[str, Any] = {}
+
+    def record(self, result: Dict[str, Any]) -> None:
+        """Record a transcribe_file() result"""
+        with self._lock:
+            totals = self._by_backend.setdefault(
+                result['backend'], {'jobs': 0, 'audio_seconds': 0.0, 'processing_seconds': 0.0}
+            )
+            totals['jobs'] += 1
+            totals['audio_seconds'] += result['duration'] or 0.0
+            totals['processing_seconds'] += result['processing_seconds']
+            self._last = {key: result[key] for key in ('backend', 'model', 'compute_type', 'duration', 'processing_seconds', 'rtf')}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return totals and the average real-time factor per backend"""
+        with self._lock:
+            return {
+                'backends': {
+                    backend: {
+                        'jobs': totals['jobs'],
+                        'audio_seconds': round(totals['audio_seconds'], 1),
+                        'processing_seconds': round(totals['processing_seconds'], 1),
+                        'rtf': round(totals['processing_seconds'] / totals['audio_seconds'], 4) if totals['audio_seconds'] else None
+                    }
+                    for backend, totals in self._by_backend.items()
+                },
+                'last': dict(self._last),
+                'loaded_models': loaded_models()
+            }
+
+
+# Global stats instance
+transcription_stats = TranscriptionStats()
@@ -2,8 +2,9 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.core.config import settings
-from app.core.database import init_db
-from app.api import process, chat, files
+from app.core.database import init_db, init_pool, close_pool
+from app.core.executors import run_io, run_cpu, shutdown_executors
+from app.api import process, chat, files, metrics, admin, jobs
 import logging
 import sys
 
@@ -55,14 +56,35 @@ async def startup_event():
     logger.info("Starting AI Service...")
     try:
         # Initialize database
-        init_db()
+        await run_io(init_db)
+        await init_pool()
         logger.info("Database initialized")
         
+        # Load the vector index search parameters (a missing index is built in the background)
+        from app.core.vector_index import vector_index
+        await vector_index.ensure_index()
+        
         # Preload embedding model
         from app.core.embeddings import get_embedding_model
-        get_embedding_model()
+        await run_cpu(get_embedding_model)
         logger.info("Embedding model loaded")
         
+        # Start shared HTTP client
+        from app.core.http_client import http_client
+        await http_client.start()
+        
+        # Start cross-request embedding batcher
+        from app.core.embedding_batcher import embedding_batcher
+        await embedding_batcher.start()
+        
+        # Start embedding cache eviction
+        from app.core.embedding_cache import embedding_cache
+        await embedding_cache.start()
+        
+        # Start ingestion job workers
+        from app.core.job_queue import job_queue
+        await job_queue.start()
+        
         logger.info("AI Service started successfully")
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
@@ -74,6 +96,19 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down AI Service...")
+    
+    from app.core.job_queue import job_queue
+    await job_queue.stop()
+    
+    from app.core.embedding_batcher import embedding_batcher
+    from app.core.embedding_cache import embedding_cache
+    await embedding_cache.stop()
+    await embedding_batcher.stop()
+    
+    from app.core.http_client import http_client
+    await http_client.close()
+    await close_pool()
+    shutdown_executors()
 
 
 # Health check endpoint
@@ -98,6 +133,9 @@ async def root():
             "health": "/health",
             "process": "/api/process",
             "chat": "/api/chat",
+            "metrics": "/api/metrics",
+            "admin": "/api/admin",
+            "jobs": "/api/ai/jobs",
             "docs": "/docs"
         }
     }
@@ -107,6 +145,9 @@ async def root():
 app.include_router(process.router)
 app.include_router(chat.router)
 app.include_router(files.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
+app.include_router(jobs.router)
 
 
 if __name__ == "__main__":
@@ -1,18 +1,22 @@
 """File processors for various file types"""
-from .pdf_processor import extract_text_from_pdf
+from .pdf_processor import extract_text_from_pdf, stream_text_from_pdf
 from .document_processor import (
     extract_text_from_docx,
     extract_text_from_pptx,
     extract_text_from_txt,
-    extract_text_from_xlsx
+    extract_text_from_xlsx,
+    stream_text_from_docx,
+    stream_text_from_pptx,
+    stream_text_from_txt,
+    stream_text_from_xlsx
 )
 from .video_processor import (
-    extract_audio_from_video,
     transcribe_audio_with_timestamps,
-    process_video
+    process_video,
+    stream_video
 )
-from .audio_processor import transcribe_audio
-from .image_processor import extract_text_from_image
+from .audio_processor import transcribe_audio, stream_audio
+from .image_processor import extract_text_from_image, stream_text_from_image
 
 __all__ = [
     'extract_text_from_pdf',
@@ -20,9 +24,16 @@ __all__ = [
     'extract_text_from_pptx',
     'extract_text_from_txt',
     'extract_text_from_xlsx',
-    'extract_audio_from_video',
     'transcribe_audio_with_timestamps',
     'process_video',
     'transcribe_audio',
     'extract_text_from_image',
+    'stream_text_from_pdf',
+    'stream_text_from_docx',
+    'stream_text_from_pptx',
+    'stream_text_from_txt',
+    'stream_text_from_xlsx',
+    'stream_video',
+    'stream_audio',
+    'stream_text_from_image',
 ]
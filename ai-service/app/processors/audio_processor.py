@@ -1,12 +1,30 @@
 """Audio processing and transcription"""
 import logging
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 from app.core.config import settings
-from app.core.whisper import get_whisper_model
+from app.core.transcription import segmented_transcriber
 
 logger = logging.getLogger(__name__)
 
 
+def transcript_segment(segment: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a stitched transcription segment into a content segment"""
+    return {
+        'text': segment['text'].strip(),
+        'start_time': segment['start'],
+        'end_time': segment['end'],
+        **({'words': segment['words']} if 'words' in segment else {}),
+        'metadata': {
+            'source_type': 'audio_transcription',
+            'duration': segment['end'] - segment['start'],
+            'total_duration': segment.get('total_duration'),
+            'language': segment.get('language', 'unknown'),
+            'transcription_backend': segment['backend'],
+            'transcription_rtf': segment['rtf']
+        }
+    }
+
+
 async def transcribe_audio(
     audio_path: str,
     model_name: str = None,
@@ -29,43 +47,32 @@ async def transcribe_audio(
     try:
         logger.info(f"Transcribing audio file: {audio_path}")
         
-        model = get_whisper_model(model_name)
-        
-        # Transcribe audio
-        result = model.transcribe(
-            audio_path,
-            word_timestamps=include_timestamps,
-            verbose=False
-        )
+        # Split at pauses and transcribe the pieces in parallel
+        segments_data = [segment async for segment in stream_audio(audio_path, model_name)]
         
         if not include_timestamps:
             # Return full text as single segment
+            first = segments_data[0]['metadata'] if segments_data else {}
             return [{
-                'text': result['text'].strip(),
+                'text': ' '.join(segment['text'] for segment in segments_data if segment['text']),
                 'metadata': {
                     'source_type': 'audio_transcription',
-                    'language': result.get('language', 'unknown'),
-                    'full_transcription': True
+                    'language': first.get('language', 'unknown'),
+                    'full_transcription': True,
+                    'transcription_backend': first.get('transcription_backend'),
+                    'transcription_rtf': first.get('transcription_rtf')
                 }
             }]
         
-        # Extract segments with timestamps
-        segments_data = []
-        for segment in result.get('segments', []):
-            segments_data.append({
-                'text': segment['text'].strip(),
-                'start_time': segment['start'],
-                'end_time': segment['end'],
-                'metadata': {
-                    'source_type': 'audio_transcription',
-                    'duration': segment['end'] - segment['start'],
-                    'language': result.get('language', 'unknown')
-                }
-            })
-        
         logger.info(f"Transcribed {len(segments_data)} segments from audio")
         return segments_data
         
     except Exception as e:
         logger.error(f"Error transcribing audio {audio_path}: {str(e)}")
         raise Exception(f"Failed to transcribe audio: {str(e)}")
+
+
+async def stream_audio(audio_path: str, model_name: str = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield transcription segments of an audio file as its pieces finish"""
+    async for segment in segmented_transcriber.stream(audio_path, model_name):
+        yield transcript_segment(segment)
@@ -1,25 +1,63 @@
 """Document processors for DOCX, PPTX, TXT, XLSX files"""
+import asyncio
+import codecs
 import logging
-from typing import List, Dict, Any
+import os
+import re
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import docx
 from pptx import Presentation
 import pandas as pd
 from openpyxl import load_workbook
+from app.core.config import settings
+from app.core.executors import run_io, run_in_process
 
 logger = logging.getLogger(__name__)
 
+# Characters read per block when streaming text files
+TXT_BLOCK_CHARS = 1 << 20
 
-async def extract_text_from_docx(file_path: str) -> List[Dict[str, Any]]:
+_TRAILING_WORD = re.compile(r'\S*$')
+
+
+async def _stream_shards(
+    extract: Callable[[str, int, Optional[int]], Tuple[int, List[Dict[str, Any]]]],
+    file_path: str
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Extract text from DOCX file
-    
-    Args:
-        file_path: Path to DOCX file
-        
-    Returns:
-        List of dicts with {text, metadata}
+    Run extract(file_path, start, stop) -> (total units, segments) over
+    OFFICE_UNITS_PER_SHARD slides/sheets at a time in the process pool
+
+    The first shard also reports the unit count; the rest run in parallel
+    (one shard per CPU at a time) and are yielded in order as they finish.
     """
+    shard_size = max(1, settings.OFFICE_UNITS_PER_SHARD)
+    window = os.cpu_count() or 1
+
+    total, segments = await run_in_process(extract, file_path, 0, shard_size)
+    for segment in segments:
+        yield segment
+
+    ranges = deque(range(shard_size, total, shard_size))
+    shards: Deque[asyncio.Task] = deque()
+    try:
+        while ranges or shards:
+            while ranges and len(shards) < window:
+                start = ranges.popleft()
+                shards.append(asyncio.create_task(run_in_process(extract, file_path, start, start + shard_size)))
+            _, segments = await shards.popleft()
+            for segment in segments:
+                yield segment
+    finally:
+        for shard in shards:
+            shard.cancel()
+        await asyncio.gather(*shards, return_exceptions=True)
+
+
+def _extract_docx(file_path: str) -> List[Dict[str, Any]]:
+    """Blocking python-docx parsing, run in the process pool"""
     try:
         doc = docx.Document(file_path)
         paragraphs = []
@@ -66,23 +104,45 @@ async def extract_text_from_docx(file_path: str) -> List[Dict[str, Any]]:
         raise Exception(f"Failed to process DOCX: {str(e)}")
 
 
-async def extract_text_from_pptx(file_path: str) -> List[Dict[str, Any]]:
+async def extract_text_from_docx(file_path: str) -> List[Dict[str, Any]]:
     """
-    Extract text from PPTX file with slide numbers
+    Extract text from DOCX file
     
     Args:
-        file_path: Path to PPTX file
+        file_path: Path to DOCX file
         
     Returns:
-        List of dicts with {text, slide_number, metadata}
+        List of dicts with {text, metadata}
+    """
+    return await run_in_process(_extract_docx, file_path)
+
+
+async def stream_text_from_docx(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield DOCX segments
+
+    Not sharded like PPTX/XLSX: the body is a single XML part, so every
+    shard would re-parse the whole document.
     """
+    for segment in await extract_text_from_docx(file_path):
+        yield segment
+
+
+def _extract_pptx(file_path: str, start: int = 0, stop: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """Blocking python-pptx parsing of slides [start, stop), run in the process pool"""
     try:
         prs = Presentation(file_path)
+        total_slides = len(prs.slides)
         slides_data = []
         
-        logger.info(f"Processing PPTX with {len(prs.slides)} slides: {file_path}")
+        if start == 0:
+            logger.info(f"Processing PPTX with {total_slides} slides: {file_path}")
         
         for slide_num, slide in enumerate(prs.slides, start=1):
+            if slide_num <= start:
+                continue
+            if stop is not None and slide_num > stop:
+                break
             slide_text = []
             
             # Extract text from all shapes
@@ -95,30 +155,42 @@ async def extract_text_from_pptx(file_path: str) -> List[Dict[str, Any]]:
                     'text': '\n'.join(slide_text),
                     'slide_number': slide_num,
                     'metadata': {
-                        'total_slides': len(prs.slides),
+                        'total_slides': total_slides,
                         'slide_number': slide_num,
                         'source_type': 'pptx'
                     }
                 })
         
         logger.info(f"Extracted text from {len(slides_data)} slides")
-        return slides_data
+        return total_slides, slides_data
         
     except Exception as e:
         logger.error(f"Error processing PPTX file {file_path}: {str(e)}")
         raise Exception(f"Failed to process PPTX: {str(e)}")
 
 
-async def extract_text_from_txt(file_path: str) -> List[Dict[str, Any]]:
+async def extract_text_from_pptx(file_path: str) -> List[Dict[str, Any]]:
     """
-    Extract text from plain text file
+    Extract text from PPTX file with slide numbers
     
     Args:
-        file_path: Path to TXT file
+        file_path: Path to PPTX file
         
     Returns:
-        List with single dict containing {text, metadata}
+        List of dicts with {text, slide_number, metadata}
     """
+    _, slides = await run_in_process(_extract_pptx, file_path)
+    return slides
+
+
+async def stream_text_from_pptx(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield PPTX slides as shards of OFFICE_UNITS_PER_SHARD slides finish"""
+    async for segment in _stream_shards(_extract_pptx, file_path):
+        yield segment
+
+
+def _extract_txt(file_path: str) -> List[Dict[str, Any]]:
+    """Blocking file read, run in the IO pool"""
     try:
         logger.info(f"Processing TXT file: {file_path}")
         
@@ -159,24 +231,102 @@ async def extract_text_from_txt(file_path: str) -> List[Dict[str, Any]]:
         raise Exception(f"Failed to process TXT: {str(e)}")
 
 
-async def extract_text_from_xlsx(file_path: str) -> List[Dict[str, Any]]:
+async def extract_text_from_txt(file_path: str) -> List[Dict[str, Any]]:
     """
-    Extract text from XLSX file
+    Extract text from plain text file
     
     Args:
-        file_path: Path to XLSX file
+        file_path: Path to TXT file
         
     Returns:
-        List of dicts with {text, sheet_name, metadata}
+        List with single dict containing {text, metadata}
     """
+    return await run_io(_extract_txt, file_path)
+
+
+def _detect_txt_encoding(file_path: str) -> str:
+    """Blocking UTF-8 check without loading the file, run in the IO pool"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
     try:
-        logger.info(f"Processing XLSX file: {file_path}")
+        with open(file_path, 'rb') as file:
+            while True:
+                block = file.read(TXT_BLOCK_CHARS)
+                if not block:
+                    break
+                decoder.decode(block)
+        decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+async def stream_text_from_txt(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Extract text from plain text file block by block
+    
+    Blocks end on whitespace so no word is split between segments.
+    
+    Args:
+        file_path: Path to TXT file
+        
+    Yields:
+        Dicts with {text, metadata}
+    """
+    try:
+        logger.info(f"Processing TXT file: {file_path}")
+        
+        encoding = await run_io(_detect_txt_encoding, file_path)
+        total_bytes = max(1, os.path.getsize(file_path))
+        chars_read = 0
+        block_index = 0
+        carry = ''
+        
+        with open(file_path, 'r', encoding=encoding) as file:
+            while True:
+                block = await run_io(file.read, TXT_BLOCK_CHARS)
+                chars_read += len(block)
+                text = carry + block
+                if block:
+                    # Hold back a trailing partial word for the next block
+                    cut = _TRAILING_WORD.search(text).start()
+                    text, carry = text[:cut], text[cut:]
+                
+                if text.strip():
+                    yield {
+                        'text': text.strip(),
+                        'metadata': {
+                            'source_type': 'txt',
+                            'encoding': encoding,
+                            'block_index': block_index,
+                            # Approximate for multi-byte encodings
+                            'read_fraction': round(min(1.0, chars_read / total_bytes), 4)
+                        }
+                    }
+                    block_index += 1
+                
+                if not block:
+                    break
+        
+        if not block_index:
+            logger.warning(f"Empty text file: {file_path}")
+        
+    except Exception as e:
+        logger.error(f"Error processing TXT file {file_path}: {str(e)}")
+        raise Exception(f"Failed to process TXT: {str(e)}")
+
+
+def _extract_xlsx(file_path: str, start: int = 0, stop: Optional[int] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """Blocking openpyxl parsing of sheets [start, stop), run in the process pool"""
+    try:
+        if start == 0:
+            logger.info(f"Processing XLSX file: {file_path}")
         
         # Load workbook
         wb = load_workbook(file_path, read_only=True)
+        total_sheets = len(wb.sheetnames)
         sheets_data = []
         
-        for sheet_name in wb.sheetnames:
+        for sheet_index, sheet_name in enumerate(wb.sheetnames[start:stop], start=start):
             ws = wb[sheet_name]
             
             # Read sheet data
@@ -191,16 +341,37 @@ async def extract_text_from_xlsx(file_path: str) -> List[Dict[str, Any]]:
                     'text': '\n'.join(sheet_text),
                     'sheet_name': sheet_name,
                     'metadata': {
-                        'total_sheets': len(wb.sheetnames),
+                        'total_sheets': total_sheets,
                         'sheet_name': sheet_name,
-                        'source_type': 'xlsx'
+                        'source_type': 'xlsx',
+                        'read_fraction': round((sheet_index + 1) / total_sheets, 4)
                     }
                 })
         
         wb.close()
         logger.info(f"Extracted text from {len(sheets_data)} sheets")
-        return sheets_data
+        return total_sheets, sheets_data
         
     except Exception as e:
         logger.error(f"Error processing XLSX file {file_path}: {str(e)}")
         raise Exception(f"Failed to process XLSX: {str(e)}")
+
+
+async def extract_text_from_xlsx(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Extract text from XLSX file
+    
+    Args:
+        file_path: Path to XLSX file
+        
+    Returns:
+        List of dicts with {text, sheet_name, metadata}
+    """
+    _, sheets = await run_in_process(_extract_xlsx, file_path)
+    return sheets
+
+
+async def stream_text_from_xlsx(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield XLSX sheets as shards of OFFICE_UNITS_PER_SHARD sheets finish"""
+    async for segment in _stream_shards(_extract_xlsx, file_path):
+        yield segment
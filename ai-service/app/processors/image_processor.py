@@ -1,8 +1,8 @@
 """Image OCR text extraction"""
 import logging
-from typing import List, Dict, Any
-from PIL import Image
-import pytesseract
+from typing import AsyncIterator, List, Dict, Any
+from app.core.ocr import ocr_file, image_info
+from app.core.executors import run_cpu
 
 logger = logging.getLogger(__name__)
 
@@ -10,53 +10,59 @@ logger = logging.getLogger(__name__)
 async def extract_text_from_image(file_path: str) -> List[Dict[str, Any]]:
     """
     Extract text from image using Tesseract OCR
-    
+
+    Multi-page TIFFs and multi-frame GIFs yield one segment per frame with
+    text (consecutive frames with identical text are skipped).
+
     Args:
         file_path: Path to image file
-        
+
     Returns:
-        List with dict containing {text, metadata}
+        List of dicts containing {text, metadata} (and page_number for multi-frame images)
     """
     try:
         logger.info(f"Processing image with OCR: {file_path}")
-        
-        # Open image
-        image = Image.open(file_path)
-        
-        # Get image info
-        width, height = image.size
-        format_name = image.format
-        
-        # Perform OCR
-        text = pytesseract.image_to_string(image)
-        
-        if not text.strip():
-            logger.warning(f"No text extracted from image: {file_path}")
-            return []
-        
-        # Get OCR data with confidence scores
-        try:
-            ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            avg_confidence = sum(
-                int(conf) for conf in ocr_data['conf'] if int(conf) > 0
-            ) / len([conf for conf in ocr_data['conf'] if int(conf) > 0])
-        except Exception:
-            avg_confidence = None
-        
-        result = [{
-            'text': text.strip(),
-            'metadata': {
-                'source_type': 'image_ocr',
-                'image_width': width,
-                'image_height': height,
-                'image_format': format_name,
-                'ocr_confidence': avg_confidence
+
+        info = await run_cpu(image_info, file_path)
+        results = await ocr_file(file_path, info=info)
+
+        segments = []
+        previous_text = None
+        for result in results:
+            text = result['text'].strip()
+            if not text or text == previous_text:
+                continue
+            previous_text = text
+
+            segment = {
+                'text': text,
+                'metadata': {
+                    'source_type': 'image_ocr',
+                    'image_width': info['width'],
+                    'image_height': info['height'],
+                    'image_format': info['format'],
+                    'ocr_confidence': result['confidence'],
+                    'ocr_seconds': result['ocr_seconds']
+                }
             }
-        }]
-        
-        logger.info(f"Extracted {len(text)} characters from image")
-        return result
-        
+            if info['frames'] > 1:
+                segment['page_number'] = result['frame_index'] + 1
+                segment['metadata']['page_number'] = result['frame_index'] + 1
+                segment['metadata']['total_pages'] = info['frames']
+            segments.append(segment)
+
+        if not segments:
+            logger.warning(f"No text extracted from image: {file_path}")
+        else:
+            logger.info(f"Extracted {sum(len(segment['text']) for segment in segments)} characters from {len(results)} frame(s)")
+        return segments
+
     except Exception as e:
         logger.error(f"Error processing image {file_path}: {str(e)}")
         raise Exception(f"Failed to process image: {str(e)}")
+
+
+async def stream_text_from_image(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the OCR result of an image"""
+    for segment in await extract_text_from_image(file_path):
+        yield segment
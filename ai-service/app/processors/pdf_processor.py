@@ -1,54 +1,264 @@
 """PDF text extraction processor"""
+import asyncio
+import io
 import logging
-from typing import List, Dict, Any
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Dict, Any
 from pathlib import Path
 import PyPDF2
+from PIL import Image
+from app.core.config import settings
+from app.core.ocr import ocr_image
+from app.core.executors import run_in_process
+
+# Optional faster backends, used when installed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
 
 logger = logging.getLogger(__name__)
 
+PDF_BACKENDS = ('pdfium', 'mupdf', 'pypdf2')
 
-async def extract_text_from_pdf(file_path: str) -> List[Dict[str, Any]]:
+
+def available_backends() -> List[str]:
+    """Installed extraction backends, fastest first"""
+    installed = {'pdfium': pdfium is not None, 'mupdf': fitz is not None, 'pypdf2': True}
+    return [backend for backend in PDF_BACKENDS if installed[backend]]
+
+
+def resolve_backend(name: str = None) -> str:
     """
-    Extract text from PDF file with page numbers
-    
+    Pick the extraction backend
+
     Args:
-        file_path: Path to PDF file
-        
+        name: 'auto' or one of PDF_BACKENDS (default from settings)
+
     Returns:
-        List of dicts with {text, page_number, metadata}
+        The requested backend if installed, else the fastest installed one
     """
-    try:
-        pages_data = []
-        
+    name = (name or settings.PDF_BACKEND).lower()
+    backends = available_backends()
+    if name == 'auto':
+        return backends[0]
+    if name not in backends:
+        logger.warning(f"PDF backend '{name}' is not installed, using {backends[0]}")
+        return backends[0]
+    return name
+
+
+def _count_pdf_pages(file_path: str, backend: str) -> int:
+    """Blocking page count, run in the process pool"""
+    if backend == 'pdfium':
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if backend == 'mupdf':
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int, backend: str) -> List[Dict[str, Any]]:
+    """
+    Blocking text extraction of pages [start, end), run in the process pool
+
+    Returns every page, including empty ones, with its extraction time.
+    """
+    pages = []
+
+    def add(page_number: int, extract) -> None:
+        started = time.perf_counter()
+        try:
+            text = extract() or ''
+        except Exception as e:
+            logger.error(f"Error extracting text from page {page_number}: {str(e)}")
+            text = ''
+        pages.append({
+            'page_number': page_number,
+            'text': text.strip(),
+            'extract_seconds': round(time.perf_counter() - started, 4)
+        })
+
+    if backend == 'pdfium':
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for index in range(start, min(end, len(pdf))):
+                def extract(index=index):
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    try:
+                        return textpage.get_text_range()
+                    finally:
+                        textpage.close()
+                        page.close()
+                add(index + 1, extract)
+        finally:
+            pdf.close()
+    elif backend == 'mupdf':
+        with fitz.open(file_path) as doc:
+            for index in range(start, min(end, doc.page_count)):
+                add(index + 1, lambda index=index: doc.load_page(index).get_text())
+    else:
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            total_pages = len(pdf_reader.pages)
-            
-            logger.info(f"Processing PDF with {total_pages} pages: {file_path}")
-            
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                try:
-                    text = page.extract_text()
-                    
-                    if text and text.strip():
-                        pages_data.append({
-                            'text': text.strip(),
-                            'page_number': page_num,
-                            'metadata': {
-                                'total_pages': total_pages,
-                                'page_number': page_num,
-                                'source_type': 'pdf'
-                            }
-                        })
-                        logger.debug(f"Extracted {len(text)} characters from page {page_num}")
-                except Exception as e:
-                    logger.error(f"Error extracting text from page {page_num}: {str(e)}")
-                    # Continue with next page
-                    continue
-            
-            logger.info(f"Successfully extracted text from {len(pages_data)} pages")
-            return pages_data
-            
+            for index in range(start, min(end, len(pdf_reader.pages))):
+                add(index + 1, lambda index=index: pdf_reader.pages[index].extract_text())
+
+    return pages
+
+
+def _render_pdf_page(file_path: str, page_number: int, backend: str, dpi: int) -> List[Image.Image]:
+    """Rasterize a page (pdfium / MuPDF) or, with PyPDF2, return its embedded images"""
+    if backend == 'pdfium':
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            page = pdf[page_number - 1]
+            try:
+                return [page.render(scale=dpi / 72).to_pil()]
+            finally:
+                page.close()
+        finally:
+            pdf.close()
+    if backend == 'mupdf':
+        with fitz.open(file_path) as doc:
+            pixmap = doc.load_page(page_number - 1).get_pixmap(dpi=dpi)
+            return [Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)]
+
+    # PyPDF2 cannot render; scanned pages are normally a single embedded image
+    with open(file_path, 'rb') as file:
+        page = PyPDF2.PdfReader(file).pages[page_number - 1]
+        return [Image.open(io.BytesIO(image.data)) for image in page.images]
+
+
+def _ocr_pdf_page(file_path: str, page_number: int, backend: str, dpi: int) -> Dict[str, Any]:
+    """Blocking rasterize-and-OCR of one page, run in the process pool"""
+    started = time.perf_counter()
+    try:
+        results = [ocr_image(image) for image in _render_pdf_page(file_path, page_number, backend, dpi)]
+    except Exception as e:
+        logger.error(f"Error running OCR on page {page_number}: {str(e)}")
+        results = []
+    confidences = [result['confidence'] for result in results if result['confidence'] is not None]
+    return {
+        'page_number': page_number,
+        'text': '\n\n'.join(result['text'] for result in results if result['text']).strip(),
+        'confidence': round(sum(confidences) / len(confidences), 2) if confidences else None,
+        'ocr_seconds': round(time.perf_counter() - started, 4)
+    }
+
+
+async def _process_shard(file_path: str, start: int, end: int, backend: str) -> List[Dict[str, Any]]:
+    """Extract a page range, then OCR its empty pages in parallel"""
+    pages = await run_in_process(_extract_pdf_pages, file_path, start, end, backend)
+
+    if settings.PDF_OCR_ENABLED:
+        empty = [page for page in pages if len(page['text']) < settings.PDF_OCR_MIN_CHARS]
+        if empty:
+            ocr_results = await asyncio.gather(*(
+                run_in_process(_ocr_pdf_page, file_path, page['page_number'], backend, settings.PDF_OCR_DPI)
+                for page in empty
+            ))
+            for page, ocr in zip(empty, ocr_results):
+                page['ocr_seconds'] = ocr['ocr_seconds']
+                if ocr['text']:
+                    page['text'] = ocr['text']
+                    page['ocr'] = True
+                    page['ocr_confidence'] = ocr['confidence']
+    return pages
+
+
+async def stream_text_from_pdf(file_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Extract text from PDF file page by page
+
+    Page ranges of PDF_PAGES_PER_SHARD are extracted in parallel in the
+    process pool (PDF_PARALLEL_SHARDS at a time); pages without a text
+    layer are rasterized and OCRed. Pages are yielded in order as soon as
+    their shard is done, with per-page timings in their metadata.
+
+    Args:
+        file_path: Path to PDF file
+
+    Yields:
+        Dicts with {text, page_number, metadata}
+    """
+    try:
+        logger.info(f"Processing PDF: {file_path}")
+
+        backend = resolve_backend()
+        try:
+            total_pages = await run_in_process(_count_pdf_pages, file_path, backend)
+        except Exception as e:
+            if backend == 'pypdf2':
+                raise
+            logger.warning(f"PDF backend {backend} failed to open {file_path} ({str(e)}), using pypdf2")
+            backend = 'pypdf2'
+            total_pages = await run_in_process(_count_pdf_pages, file_path, backend)
+
+        shard_size = max(1, settings.PDF_PAGES_PER_SHARD)
+        window = settings.PDF_PARALLEL_SHARDS if settings.PDF_PARALLEL_SHARDS > 0 else (os.cpu_count() or 1)
+        ranges = deque(range(0, total_pages, shard_size))
+        shards: Deque[asyncio.Task] = deque()
+        extracted = 0
+        ocr_pages = 0
+
+        try:
+            while ranges or shards:
+                # Keep a bounded number of shards in flight; yield in page order
+                while ranges and len(shards) < window:
+                    start = ranges.popleft()
+                    shards.append(asyncio.create_task(_process_shard(file_path, start, start + shard_size, backend)))
+
+                for page in await shards.popleft():
+                    if not page['text']:
+                        continue
+                    extracted += 1
+                    ocr_pages += page.get('ocr', False)
+                    yield {
+                        'text': page['text'],
+                        'page_number': page['page_number'],
+                        'metadata': {
+                            'total_pages': total_pages,
+                            'page_number': page['page_number'],
+                            'source_type': 'pdf_ocr' if page.get('ocr') else 'pdf',
+                            'backend': backend,
+                            'extract_seconds': page['extract_seconds'],
+                            'ocr_seconds': page.get('ocr_seconds'),
+                            'ocr_confidence': page.get('ocr_confidence')
+                        }
+                    }
+        finally:
+            for shard in shards:
+                shard.cancel()
+            await asyncio.gather(*shards, return_exceptions=True)
+
+        logger.info(f"Successfully extracted text from {extracted} of {total_pages} pages ({ocr_pages} by OCR, backend={backend})")
+
     except Exception as e:
         logger.error(f"Error processing PDF file {file_path}: {str(e)}")
         raise Exception(f"Failed to process PDF: {str(e)}")
+
+
+async def extract_text_from_pdf(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Extract text from PDF file with page numbers
+
+    Args:
+        file_path: Path to PDF file
+
+    Returns:
+        List of dicts with {text, page_number, metadata}
+    """
+    return [page async for page in stream_text_from_pdf(file_path)]
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+pytest.importorskip('sentence_transformers')
+
+from app.core.embeddings import IncrementalChunker, chunk_text
+
+
+def feed_all(pieces, chunk_size, overlap):
+    chunker = IncrementalChunker(chunk_size, overlap)
+    chunks = []
+    for piece in pieces:
+        chunks.extend(chunker.feed(piece))
+    chunks.extend(chunker.finish())
+    assert chunker.emitted == len(chunks)
+    return chunks
+
+
+def split_words(words, rng):
+    """Split a word list into random pieces, including empty ones"""
+    pieces = []
+    start = 0
+    while start < len(words):
+        stop = start + rng.randint(0, 25)
+        pieces.append(' '.join(words[start:stop]))
+        start = stop
+    return pieces
+
+
+@pytest.mark.parametrize('chunk_size, overlap', [(10, 2), (10, 0), (7, 6), (50, 10), (1, 0)])
+@pytest.mark.parametrize('word_count', [1, 5, 9, 10, 11, 18, 19, 100, 333])
+def test_matches_chunk_text(chunk_size, overlap, word_count):
+    rng = random.Random(chunk_size * 1000 + overlap * 100 + word_count)
+    words = [f"w{index}" for index in range(word_count)]
+
+    expected = chunk_text(' '.join(words), chunk_size, overlap)
+
+    assert feed_all([' '.join(words)], chunk_size, overlap) == expected
+    assert feed_all(words, chunk_size, overlap) == expected
+    for _ in range(5):
+        assert feed_all(split_words(words, rng), chunk_size, overlap) == expected
+
+
+def test_emits_chunks_as_soon_as_they_are_complete():
+    chunker = IncrementalChunker(chunk_size=4, overlap=1)
+
+    assert chunker.feed('a b c') == []
+    assert chunker.feed('d e') == ['a b c d']
+    assert chunker.feed('f g h i j') == ['d e f g', 'g h i j']
+    assert chunker.finish() == ['j']
+    assert chunker.emitted == 4
+
+
+def test_holds_at_most_one_chunk_of_words():
+    chunker = IncrementalChunker(chunk_size=8, overlap=2)
+    for index in range(1000):
+        chunker.feed(f"w{index}")
+        assert len(chunker._words) < 8
@@ -0,0 +1,120 @@
+import pytest
+
+from app.core.config import settings
+from app.core.context_packer import ContextPacker, SOURCE_HEADER_TOKENS, estimate_tokens
+
+
+@pytest.fixture(autouse=True)
+def packer_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'CONTEXT_PACKING_ENABLED', True)
+    monkeypatch.setattr(settings, 'CONTEXT_TOKEN_BUDGET', 2048)
+    monkeypatch.setattr(settings, 'CONTEXT_TOKEN_BUDGETS', {})
+    monkeypatch.setattr(settings, 'CONTEXT_SIMILARITY_FLOOR', 0.25)
+    monkeypatch.setattr(settings, 'CONTEXT_MMR_LAMBDA', 0.7)
+    monkeypatch.setattr(settings, 'CHUNK_OVERLAP', 4)
+
+
+def words(prefix, start, stop):
+    return ' '.join(f"{prefix}{index}" for index in range(start, stop))
+
+
+def chunk(id, file_id, text, similarity):
+    return {'id': id, 'file_id': file_id, 'chunk_text': text, 'similarity': similarity}
+
+
+def test_merges_adjacent_chunks_without_repeating_the_overlap():
+    chunks = [
+        chunk(2, 1, words('w', 16, 36), 0.8),
+        chunk(1, 1, words('w', 0, 20), 0.9),
+    ]
+
+    result = ContextPacker().pack(chunks)
+
+    assert len(result['chunks']) == 1
+    segment = result['chunks'][0]
+    assert segment['chunk_text'] == words('w', 0, 36)
+    assert segment['chunk_ids'] == [1, 2]
+    assert segment['similarity'] == 0.9
+    assert result['stats']['merged_chunks'] == 1
+
+
+def test_keeps_distant_chunks_of_one_file_apart():
+    chunks = [
+        chunk(1, 1, words('a', 0, 20), 0.9),
+        chunk(5, 1, words('b', 0, 20), 0.8),
+    ]
+
+    result = ContextPacker().pack(chunks)
+
+    assert [segment['chunk_ids'] for segment in result['chunks']] == [[1], [5]]
+
+
+def test_merges_distant_chunks_only_on_a_long_overlap():
+    chunks = [
+        chunk(1, 1, words('w', 0, 20), 0.9),
+        chunk(5, 1, words('w', 10, 30), 0.8),
+    ]
+
+    result = ContextPacker().pack(chunks)
+
+    assert [segment['chunk_text'] for segment in result['chunks']] == [words('w', 0, 30)]
+
+
+def test_drops_chunks_below_the_similarity_floor_but_keeps_the_best():
+    result = ContextPacker().pack([
+        chunk(1, 1, words('a', 0, 10), 0.2),
+        chunk(2, 2, words('b', 0, 10), 0.1),
+    ])
+    assert [segment['file_id'] for segment in result['chunks']] == [1]
+    assert result['stats']['dropped_low_similarity'] == 1
+
+
+def test_orders_redundant_evidence_after_diverse_evidence():
+    chunks = [
+        chunk(1, 1, words('a', 0, 20), 0.90),
+        chunk(1, 2, words('a', 0, 20) + ' copy', 0.89),
+        chunk(1, 3, words('c', 0, 20), 0.80),
+    ]
+
+    result = ContextPacker().pack(chunks)
+
+    assert [segment['file_id'] for segment in result['chunks']] == [1, 3, 2]
+
+
+def test_fills_the_token_budget(monkeypatch):
+    chunks = [chunk(1, file_id, words(f'f{file_id}x', 0, 40), 0.9 - file_id / 100) for file_id in range(4)]
+    cost = estimate_tokens(chunks[0]['chunk_text']) + SOURCE_HEADER_TOKENS
+    monkeypatch.setattr(settings, 'CONTEXT_TOKEN_BUDGET', 2 * cost + 1)
+
+    result = ContextPacker().pack(chunks)
+
+    assert len(result['chunks']) == 2
+    assert result['stats']['tokens_after'] <= 2 * cost + 1
+    assert result['stats']['tokens_saved'] > 0
+
+
+def test_truncates_top_evidence_larger_than_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, 'CONTEXT_TOKEN_BUDGET', SOURCE_HEADER_TOKENS + 10)
+
+    result = ContextPacker().pack([chunk(1, 1, words('w', 0, 200), 0.9)])
+
+    assert len(result['chunks']) == 1
+    assert len(result['chunks'][0]['chunk_text']) == 40
+    assert result['stats']['tokens_after'] == SOURCE_HEADER_TOKENS + 10
+
+
+def test_uses_per_model_budgets(monkeypatch):
+    monkeypatch.setattr(settings, 'CONTEXT_TOKEN_BUDGETS', {'small': SOURCE_HEADER_TOKENS + 10})
+
+    assert ContextPacker().pack([chunk(1, 1, words('w', 0, 200), 0.9)], model='small')['stats']['token_budget'] == 26
+    assert ContextPacker().pack([chunk(1, 1, words('w', 0, 200), 0.9)], model='large')['stats']['token_budget'] == 2048
+
+
+def test_passes_chunks_through_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, 'CONTEXT_PACKING_ENABLED', False)
+    chunks = [chunk(1, 1, 'low', 0.01), chunk(2, 1, 'lower', 0.0)]
+
+    result = ContextPacker().pack(chunks)
+
+    assert result['chunks'] is chunks
+    assert result['stats']['tokens_saved'] == 0
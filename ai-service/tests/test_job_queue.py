@@ -0,0 +1,230 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core import job_queue as job_queue_module
+from app.core.config import settings
+from app.core.job_queue import Job, JobQueue, PermanentJobError
+
+
+class FakeConnection:
+    """Records queries and answers them from scripted results"""
+
+    def __init__(self):
+        self.calls = []
+        self.statuses = []
+        self.rows = []
+        self.row = None
+
+    async def execute(self, query, *args):
+        self.calls.append((query, args))
+        status = self.statuses.pop(0) if self.statuses else 'UPDATE 1'
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+    async def fetch(self, query, *args):
+        self.calls.append((query, args))
+        return self.rows
+
+    async def fetchrow(self, query, *args):
+        self.calls.append((query, args))
+        return self.row(*args) if callable(self.row) else self.row
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    connection = FakeConnection()
+
+    @asynccontextmanager
+    async def acquire():
+        yield connection
+
+    monkeypatch.setattr(job_queue_module, 'acquire', acquire)
+    return connection
+
+
+def make_job(**overrides):
+    row = {
+        'id': 7,
+        'kind': 'ingest',
+        'lane': 'text',
+        'file_id': 3,
+        'payload': {},
+        'attempts': 1,
+        'max_attempts': 3,
+        'locked_by': 'host:1:token-a'
+    }
+    row.update(overrides)
+    return Job(row)
+
+
+def recording_queue(handler=None):
+    queue = JobQueue()
+    transitions = []
+
+    async def on_transition(job, status, error):
+        transitions.append((status, error))
+
+    async def noop(job):
+        return None
+
+    queue.register('ingest', handler or noop, on_transition)
+    return queue, transitions
+
+
+def test_claim_uses_a_fresh_lease_token(conn):
+    def claimed(locked_by, lease_seconds, lanes):
+        return {
+            'id': 1, 'kind': 'ingest', 'lane': lanes[0], 'file_id': None, 'payload': {},
+            'attempts': 1, 'max_attempts': 3, 'locked_by': locked_by, 'waited': 0.5
+        }
+
+    conn.row = claimed
+    queue = JobQueue()
+
+    async def scenario():
+        return await queue._claim(['text']), await queue._claim(['text'])
+
+    first, second = asyncio.run(scenario())
+    assert first.locked_by.startswith(queue.worker_id + ':')
+    assert second.locked_by.startswith(queue.worker_id + ':')
+    assert first.locked_by != second.locked_by
+
+
+def test_claim_only_reclaims_expired_leases_with_attempts_left(conn):
+    asyncio.run(JobQueue()._claim(['text']))
+    query, args = conn.calls[0]
+    assert "status = 'running' AND locked_at < NOW()" in query
+    assert 'attempts < max_attempts' in query
+    assert args[2] == ['text']
+
+
+def test_claim_returns_none_when_nothing_is_runnable(conn):
+    assert asyncio.run(JobQueue()._claim(['text'])) is None
+
+
+def test_lease_lost_parses_update_status():
+    queue = JobQueue()
+    job = make_job()
+    assert queue._lease_lost(job, 'UPDATE 0') is True
+    assert queue._lease_lost(job, 'UPDATE 1') is False
+    assert queue._lease_lost(job, 'UPDATE 10') is False
+    assert queue._leases_lost == 1
+
+
+def test_outcome_updates_are_guarded_by_the_claim_token(conn):
+    queue, transitions = recording_queue()
+    job = make_job(attempts=3, max_attempts=3)
+
+    async def scenario():
+        await job.report(0.5, 'embedding')
+        await queue._finish(job, {'chunks': 2})
+        await queue._fail(job, 'boom', permanent=False)
+
+    asyncio.run(scenario())
+    for query, args in conn.calls:
+        assert 'locked_by = $' in query
+        assert 'host:1:token-a' in args
+    assert transitions == [('completed', None), ('failed', 'boom')]
+
+
+def test_outcome_is_dropped_when_the_lease_was_lost(conn):
+    queue, transitions = recording_queue()
+    job = make_job()
+    conn.statuses = ['UPDATE 0', 'UPDATE 0', 'UPDATE 0']
+
+    async def scenario():
+        await queue._finish(job, None)
+        await queue._fail(job, 'boom', permanent=False)
+        await queue._fail(job, 'boom', permanent=True)
+
+    asyncio.run(scenario())
+    assert transitions == []
+    stats = (queue._completed, queue._retried, queue._failed, queue._leases_lost)
+    assert stats == (0, 0, 0, 3)
+
+
+def test_failures_retry_until_attempts_run_out(conn):
+    queue, transitions = recording_queue()
+
+    async def scenario():
+        await queue._fail(make_job(attempts=1), 'flaky', permanent=False)
+        await queue._fail(make_job(attempts=1), 'unsupported', permanent=True)
+        await queue._fail(make_job(attempts=3), 'flaky', permanent=False)
+
+    asyncio.run(scenario())
+    assert "status = 'queued'" in conn.calls[0][0]
+    assert "status = 'failed'" in conn.calls[1][0]
+    assert "status = 'failed'" in conn.calls[2][0]
+    assert queue._retried == 1
+    assert transitions == [('failed', 'unsupported'), ('failed', 'flaky')]
+
+
+def test_heartbeat_survives_errors_and_cancels_handler_on_lost_lease(conn, monkeypatch):
+    monkeypatch.setattr(settings, 'JOB_LEASE_SECONDS', 0.03)
+    conn.statuses = [ConnectionError('connection reset'), 'UPDATE 1', 'UPDATE 0']
+    cancelled = []
+
+    async def handler(job):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(job.id)
+            raise
+        return {'done': True}
+
+    queue, transitions = recording_queue(handler)
+    job = make_job()
+
+    asyncio.run(asyncio.wait_for(queue._run(job), 5))
+
+    assert cancelled == [7]
+    assert job.lease_lost is True
+    assert queue._heartbeat_errors == 1
+    assert queue._leases_lost == 1
+    assert queue._completed == 0 and queue._failed == 0
+    assert transitions == [('running', None)]
+    # Only heartbeats ran: the outcome was never written
+    assert all('SET locked_at = NOW() WHERE' in query for query, args in conn.calls)
+
+
+def test_run_records_handler_outcomes(conn):
+    async def handler(job):
+        if job.payload.get('unsupported'):
+            raise PermanentJobError('unsupported file type')
+        return {'chunks': 1}
+
+    queue, transitions = recording_queue(handler)
+
+    async def scenario():
+        await queue._run(make_job())
+        await queue._run(make_job(payload={'unsupported': True}))
+
+    asyncio.run(scenario())
+    assert transitions == [
+        ('running', None), ('completed', None),
+        ('running', None), ('failed', 'unsupported file type')
+    ]
+
+
+def test_sweep_fails_exhausted_expired_jobs(conn, monkeypatch):
+    monkeypatch.setattr(settings, 'JOB_LEASE_SECONDS', 60)
+    error = 'Worker lost the job (lease expired) on its last attempt'
+    conn.rows = [{
+        'id': 9, 'kind': 'ingest', 'lane': 'media', 'file_id': 4, 'payload': {},
+        'attempts': 3, 'max_attempts': 3, 'locked_by': None, 'error': error
+    }]
+    queue, transitions = recording_queue()
+
+    async def scenario():
+        await queue._sweep_expired()
+        # Within the lease window the sweep is skipped
+        await queue._sweep_expired()
+
+    asyncio.run(scenario())
+    assert len(conn.calls) == 1
+    assert 'attempts >= max_attempts' in conn.calls[0][0]
+    assert queue._failed == 1
+    assert transitions == [('failed', error)]
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.llm_scheduler import ANONYMOUS, LLMOverloadedError, LLMScheduler
+
+
+@pytest.fixture(autouse=True)
+def scheduler_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_MAX_CONCURRENCY', 1)
+    monkeypatch.setattr(settings, 'LLM_MAX_QUEUE_DEPTH', 8)
+    monkeypatch.setattr(settings, 'LLM_MAX_QUEUED_PER_USER', 2)
+    monkeypatch.setattr(settings, 'LLM_QUEUE_TIMEOUT_SECONDS', {'chat': 5, 'summary': 5, 'quiz': 5, 'batch': 5})
+
+
+async def _admitted_order(scheduler, requests):
+    """Queue (name, priority, user_id) requests behind a held slot and return the order they run in"""
+    await scheduler.acquire('chat', 'holder')
+    order = []
+
+    async def request(name, priority, user_id):
+        await scheduler.acquire(priority, user_id)
+        order.append(name)
+
+    tasks = [asyncio.create_task(request(*spec)) for spec in requests]
+    await asyncio.sleep(0)
+
+    for _ in requests:
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_admits_up_to_max_concurrency():
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 1)
+        waiter = asyncio.create_task(scheduler.acquire('chat', 2))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert scheduler.get_stats()['queued'] == 1
+
+        scheduler.release()
+        await waiter
+        assert scheduler.get_stats()['in_flight'] == 1
+        assert scheduler.get_stats()['max_in_flight_seen'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_serves_higher_priority_first():
+    async def scenario():
+        return await _admitted_order(LLMScheduler(), [
+            ('batch', 'batch', 1),
+            ('quiz', 'quiz', 2),
+            ('chat', 'chat', 3),
+            ('summary', 'summary', 4),
+        ])
+
+    assert asyncio.run(scenario()) == ['chat', 'summary', 'quiz', 'batch']
+
+
+def test_round_robins_users_within_a_priority():
+    async def scenario():
+        return await _admitted_order(LLMScheduler(), [
+            ('a1', 'chat', 'a'),
+            ('a2', 'chat', 'a'),
+            ('b1', 'chat', 'b'),
+            ('c1', 'chat', 'c'),
+        ])
+
+    assert asyncio.run(scenario()) == ['a1', 'b1', 'c1', 'a2']
+
+
+def test_rejects_user_over_queue_cap_with_429():
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 'holder')
+        waiters = [asyncio.create_task(scheduler.acquire('chat', 'greedy')) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMOverloadedError) as error:
+            await scheduler.acquire('chat', 'greedy')
+        assert error.value.status_code == 429
+        assert scheduler.get_stats()['priorities']['chat']['rejected'] == 1
+
+        # Other users are still queued
+        other = asyncio.create_task(scheduler.acquire('chat', 'other'))
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()['queued'] == 3
+
+        for task in waiters + [other]:
+            task.cancel()
+        await asyncio.gather(*waiters, other, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_anonymous_bucket_is_not_capped_per_user():
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 'holder')
+        waiters = [asyncio.create_task(scheduler.acquire('chat')) for _ in range(5)]
+        await asyncio.sleep(0)
+
+        stats = scheduler.get_stats()
+        assert stats['queued'] == 5
+        assert stats['priorities']['chat']['rejected'] == 0
+        assert scheduler._queued_per_user[ANONYMOUS] == 5
+
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_queue_is_full_with_503(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_MAX_QUEUE_DEPTH', 2)
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 'holder')
+        waiters = [asyncio.create_task(scheduler.acquire('chat', user_id)) for user_id in (1, 2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMOverloadedError) as error:
+            await scheduler.acquire('chat')
+        assert error.value.status_code == 503
+
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_times_out_waiters_with_503(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_QUEUE_TIMEOUT_SECONDS', {'chat': 0.05})
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 'holder')
+
+        with pytest.raises(LLMOverloadedError) as error:
+            await scheduler.acquire('chat', 'late')
+        assert error.value.status_code == 503
+        assert error.value.retry_after == 1
+
+        stats = scheduler.get_stats()
+        assert stats['queued'] == 0
+        assert stats['priorities']['chat']['timed_out'] == 1
+
+        # The timed-out waiter does not take the slot when it frees up
+        scheduler.release()
+        assert scheduler.get_stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = LLMScheduler()
+        await scheduler.acquire('chat', 'holder')
+        waiter = asyncio.create_task(scheduler.acquire('chat', 'gone'))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.get_stats()['queued'] == 0
+
+        scheduler.release()
+        assert scheduler.get_stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_releases_on_error():
+    async def scenario():
+        scheduler = LLMScheduler()
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot('summary', 1):
+                assert scheduler.get_stats()['in_flight'] == 1
+                raise RuntimeError("generation failed")
+        assert scheduler.get_stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejects_unknown_priority():
+    with pytest.raises(ValueError):
+        asyncio.run(LLMScheduler().acquire('urgent'))
@@ -1,25 +1,120 @@
 -- Initialize PGVector extension
 CREATE EXTENSION IF NOT EXISTS vector;
 
--- Create embeddings table for vector storage
+-- Create embeddings table for vector storage (columns used by ai-service vector_store)
 CREATE TABLE IF NOT EXISTS embeddings (
   id SERIAL PRIMARY KEY,
-  vector vector(384),
-  content TEXT NOT NULL,
-  course_id INTEGER,
-  lesson_id INTEGER,
+  embedding vector(384),
+  chunk_text TEXT NOT NULL,
   file_id INTEGER,
-  file_type VARCHAR(50),
-  page_number INTEGER,
-  timestamp_seconds FLOAT,
+  user_id INTEGER,
+  course_id INTEGER,
+  module_id INTEGER,
   metadata JSONB,
   created_at TIMESTAMP DEFAULT NOW()
 );
 
--- Create index for vector similarity search
-CREATE INDEX IF NOT EXISTS embeddings_vector_idx ON embeddings USING ivfflat (vector vector_cosine_ops) WITH (lists = 100);
+-- Full-text column and index for hybrid (lexical + vector) retrieval
+ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS chunk_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, chunk_text)) STORED;
+CREATE INDEX IF NOT EXISTS embeddings_chunk_tsv_idx ON embeddings USING gin (chunk_tsv);
+
+-- The vector similarity index (HNSW or IVFFlat) is created and tuned by the
+-- AI service on startup; see VECTOR_INDEX_TYPE in ai-service/.env.example
 
 -- Create additional indexes for filtering
 CREATE INDEX IF NOT EXISTS embeddings_course_id_idx ON embeddings(course_id);
-CREATE INDEX IF NOT EXISTS embeddings_lesson_id_idx ON embeddings(lesson_id);
+CREATE INDEX IF NOT EXISTS embeddings_module_id_idx ON embeddings(module_id);
+CREATE INDEX IF NOT EXISTS embeddings_user_id_idx ON embeddings(user_id);
 CREATE INDEX IF NOT EXISTS embeddings_file_id_idx ON embeddings(file_id);
+
+-- Content-hash embedding cache, keyed by (model name, normalized text hash)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  model_name VARCHAR(255) NOT NULL,
+  text_hash VARCHAR(64) NOT NULL,
+  embedding vector(384) NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW(),
+  last_used_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (model_name, text_hash)
+);
+
+CREATE INDEX IF NOT EXISTS embedding_cache_last_used_idx ON embedding_cache(last_used_at);
+
+-- Partial summary cache for map-reduce summarization, keyed by (model name, content hash)
+CREATE TABLE IF NOT EXISTS summary_cache (
+  model_name VARCHAR(255) NOT NULL,
+  content_hash VARCHAR(64) NOT NULL,
+  summary TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW(),
+  last_used_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (model_name, content_hash)
+);
+
+-- Per-file summaries and digest embeddings built at ingest, keyed by file_id and content hash
+CREATE TABLE IF NOT EXISTS file_artifacts (
+  file_id INTEGER PRIMARY KEY,
+  content_hash VARCHAR(64) NOT NULL,
+  model_name VARCHAR(255) NOT NULL,
+  user_id INTEGER,
+  course_id INTEGER,
+  module_id INTEGER,
+  summary TEXT NOT NULL,
+  digest_embedding vector(384) NOT NULL,
+  quiz JSONB,
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Durable ingestion job queue, claimed by AI service workers with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  kind VARCHAR(64) NOT NULL,
+  lane VARCHAR(16) NOT NULL DEFAULT 'text',
+  file_id INTEGER,
+  payload JSONB NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  progress REAL NOT NULL DEFAULT 0,
+  stage VARCHAR(64),
+  error TEXT,
+  result JSONB,
+  run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+  locked_by VARCHAR(255),
+  locked_at TIMESTAMP,
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW(),
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ingest_jobs_runnable_idx ON ingest_jobs(lane, run_after, id)
+  WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS ingest_jobs_file_id_idx ON ingest_jobs(file_id);
+
+-- Finished pieces of segmented transcriptions, keyed by (PCM hash, transcription settings)
+CREATE TABLE IF NOT EXISTS transcription_checkpoints (
+  piece_hash VARCHAR(64) NOT NULL,
+  config_key VARCHAR(255) NOT NULL,
+  result JSONB NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (piece_hash, config_key)
+);
+
+CREATE INDEX IF NOT EXISTS transcription_checkpoints_created_idx ON transcription_checkpoints(created_at);
+
+-- Corpus clock shared by all AI service processes; advanced once per ingest or delete
+CREATE TABLE IF NOT EXISTS corpus_version (
+  id SMALLINT PRIMARY KEY CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO corpus_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+-- Clock value each file was last ingested or deleted at; cached answers citing it are invalid after that
+CREATE TABLE IF NOT EXISTS file_versions (
+  file_id INTEGER PRIMARY KEY,
+  version BIGINT NOT NULL,
+  updated_at TIMESTAMP DEFAULT NOW()
+);